@@ -24,6 +24,27 @@ const VERSION = "v2.8";
 const logBuffer = [];
 const MAX_LOGS = 100;
 const RATE_LIMIT_MAX = parseInt(process.env.RATE_LIMIT || "3000"); // 50 RPS for t3.micro stability
+const DEPLOY_EVENTS_CHANNEL = process.env.DEPLOY_EVENTS_CHANNEL || "deploy-events";
+// Inputs above this size travel as a claim check (Redis key) instead of inline in SQS
+const PAYLOAD_INLINE_MAX_BYTES = parseInt(process.env.PAYLOAD_INLINE_MAX_BYTES || "131072");
+// Raw (non-JSON) run bodies: stored as-is as a claim check, typed for the Worker
+const RAW_PAYLOAD_TYPES = ['application/x-ndjson', 'application/octet-stream'];
+const RAW_PAYLOAD_MAX_BYTES = process.env.RAW_PAYLOAD_MAX_BYTES || '100mb';
+// Largest micro-batch a function may declare with x-batch-max-size (Worker caps it too)
+const MAX_BATCH_SIZE = parseInt(process.env.MAX_BATCH_SIZE || "50");
+// Largest x-max-concurrency-per-container (invocations sharing one warm container)
+const MAX_CONTAINER_CONCURRENCY = parseInt(process.env.MAX_CONTAINER_CONCURRENCY || "16");
+
+function parseContainerConcurrency(value, runtime) {
+    const concurrency = parseInt(value || "1");
+    if (isNaN(concurrency) || concurrency < 1 || concurrency > MAX_CONTAINER_CONCURRENCY) {
+        return { error: `Invalid maxConcurrencyPerContainer. Must be between 1 and ${MAX_CONTAINER_CONCURRENCY}.` };
+    }
+    if (concurrency > 1 && runtime !== 'python') {
+        return { error: "maxConcurrencyPerContainer above 1 is only supported for the python runtime" };
+    }
+    return { concurrency };
+}
 
 function addLog(level, msg, context = {}) {
     const logEntry = {
@@ -560,7 +581,31 @@ const validateUploadRequest = (req, res, next) => {
         });
     }
 
+    // Optional image variant of the runtime (e.g. python-fat with preinstalled data packages)
+    const RUNTIME_VARIANTS = { "python-fat": "python" };
+    const runtimeVariant = req.headers['x-runtime-variant'] || null;
+    if (runtimeVariant && RUNTIME_VARIANTS[runtimeVariant] !== runtime) {
+        return res.status(400).json({ error: `Invalid runtime variant ${runtimeVariant} for ${runtime}` });
+    }
+
+    // Optional micro-batching: Workers may run up to this many queued
+    // invocations with one handler call (Python; handler takes a list of events)
+    const batchMaxSize = parseInt(req.headers['x-batch-max-size'] || "1");
+    if (isNaN(batchMaxSize) || batchMaxSize < 1 || batchMaxSize > MAX_BATCH_SIZE) {
+        return res.status(400).json({ error: `Invalid batch size. Must be between 1 and ${MAX_BATCH_SIZE}.` });
+    }
+    if (batchMaxSize > 1 && runtime !== 'python') {
+        return res.status(400).json({ error: "Micro-batching is only supported for the python runtime" });
+    }
+
+    // Optional container sharing for I/O-bound handlers (e.g. waiting on LLM calls)
+    const { concurrency, error } = parseContainerConcurrency(req.headers['x-max-concurrency-per-container'], runtime);
+    if (error) return res.status(400).json({ error });
+
     req.validatedRuntime = runtime;
+    req.validatedBatchMaxSize = batchMaxSize;
+    req.validatedConcurrency = concurrency;
+    req.validatedRuntimeVariant = runtimeVariant;
     req.validatedMemoryMb = memoryMb;
     req.functionName = req.headers['x-function-name'] ? decodeURIComponent(req.headers['x-function-name']) : null;
     next();
@@ -570,19 +615,29 @@ app.post(['/upload', '/api/upload'], authenticate, rateLimiter, validateUploadRe
     try {
         if (!req.file) return res.status(400).json({ error: "No file provided" });
         const functionId = req.functionId || uuidv4();
+        const item = {
+            functionId: { S: functionId },
+            name: { S: req.functionName || req.file.originalname },
+            description: { S: req.body.description || "" },
+            s3Key: { S: req.file.key },
+            originalName: { S: req.file.originalname },
+            runtime: { S: req.validatedRuntime },
+            memoryMb: { N: req.validatedMemoryMb.toString() },
+            uploadedAt: { S: new Date().toISOString() },
+            envVars: { S: req.body.envVars || "{}" }
+        };
+        if (req.validatedRuntimeVariant) {
+            item.runtimeVariant = { S: req.validatedRuntimeVariant };
+        }
+        if (req.validatedBatchMaxSize > 1) {
+            item.batchMaxSize = { N: req.validatedBatchMaxSize.toString() };
+        }
+        if (req.validatedConcurrency > 1) {
+            item.maxConcurrencyPerContainer = { N: req.validatedConcurrency.toString() };
+        }
         await db.send(new PutItemCommand({
             TableName: process.env.TABLE_NAME,
-            Item: {
-                functionId: { S: functionId },
-                name: { S: req.functionName || req.file.originalname },
-                description: { S: req.body.description || "" },
-                s3Key: { S: req.file.key },
-                originalName: { S: req.file.originalname },
-                runtime: { S: req.validatedRuntime },
-                memoryMb: { N: req.validatedMemoryMb.toString() },
-                uploadedAt: { S: new Date().toISOString() },
-                envVars: { S: req.body.envVars || "{}" }
-            }
+            Item: item
         }));
         logger.info(`Upload Success`, { functionId });
         res.json({ success: true, functionId });
@@ -597,8 +652,18 @@ app.post(['/upload', '/api/upload'], authenticate, rateLimiter, validateUploadRe
 });
 
 // Run
-app.post(['/run', '/api/run'], authenticate, rateLimiter, async (req, res) => {
-    const { functionId, inputData, modelId } = req.body || {};
+// JSON bodies carry { functionId, inputData, modelId }. An NDJSON or binary body is
+// the input itself; functionId and modelId then come from the query or x- headers.
+const rawPayloadParser = express.raw({ type: RAW_PAYLOAD_TYPES, limit: RAW_PAYLOAD_MAX_BYTES });
+
+app.post(['/run', '/api/run'], authenticate, rateLimiter, rawPayloadParser, async (req, res) => {
+    const rawPayload = Buffer.isBuffer(req.body) ? req.body : null;
+    const { functionId, inputData, modelId } = rawPayload
+        ? {
+            functionId: req.query.functionId || req.headers['x-function-id'],
+            modelId: req.query.modelId || req.headers['x-model-id']
+        }
+        : (req.body || {});
     const isAsync = req.headers['x-async'] === 'true';
     if (!functionId) return res.status(400).json({ error: "functionId is required" });
 
@@ -621,17 +686,39 @@ app.post(['/run', '/api/run'], authenticate, rateLimiter, async (req, res) => {
             }
         }
 
+        // SQS bodies are capped at 256 KB; larger inputs are stored in Redis
+        // and the Worker streams them into the container by reference. Raw
+        // bodies always go by reference, with their content type.
+        let payloadRef = null;
+        let payloadContentType = null;
+        if (rawPayload) {
+            payloadRef = `redis://payload:${requestId}`;
+            payloadContentType = req.headers['content-type'].split(';')[0].trim().toLowerCase();
+            await redis.set(`payload:${requestId}`, rawPayload, 'EX', 3600);
+        } else {
+            const serializedInput = JSON.stringify(inputData || {});
+            if (Buffer.byteLength(serializedInput) > PAYLOAD_INLINE_MAX_BYTES) {
+                payloadRef = `redis://payload:${requestId}`;
+                await redis.set(`payload:${requestId}`, serializedInput, 'EX', 3600);
+            }
+        }
+
         const taskPayload = {
             requestId,
             functionId,
             runtime: Item.runtime ? Item.runtime.S : "python",
+            runtimeVariant: Item.runtimeVariant ? Item.runtimeVariant.S : null,
             memoryMb: Item.memoryMb ? parseInt(Item.memoryMb.N) : 128,
             s3Bucket: process.env.BUCKET_NAME,
             s3Key: Item.s3Key ? Item.s3Key.S : "",
             timeoutMs: 300000,
-            input: inputData || {},
+            input: payloadRef ? {} : (inputData || {}),
+            payloadRef,
+            payloadContentType,
             modelId: modelId || "llama3:8b",
-            envVars: envVars
+            envVars: envVars,
+            batchMaxSize: Item.batchMaxSize ? parseInt(Item.batchMaxSize.N) : 1,
+            maxConcurrencyPerContainer: Item.maxConcurrencyPerContainer ? parseInt(Item.maxConcurrencyPerContainer.N) : 1
         };
 
         const sendMessageParams = {
@@ -664,6 +751,23 @@ app.get(['/status/:jobId', '/api/status/:jobId'], authenticate, async (req, res)
     } catch (error) { res.status(500).json({ error: error.message }); }
 });
 
+// Live log tail (Worker LOG_STREAM_ENABLED): entries after the given stream ID
+app.get(['/logs/:requestId/tail', '/api/logs/:requestId/tail'], cors(), authenticate, async (req, res) => {
+    try {
+        const after = String(req.query.after || '0');
+        if (!/^\d+(-\d+)?$/.test(after)) return res.status(400).json({ error: "Invalid stream ID" });
+        const entries = await redis.xrange(`logs:${req.params.requestId}`, `(${after}`, '+', 'COUNT', 100);
+        let done = false;
+        const chunks = entries.map(([id, fields]) => {
+            const entry = {};
+            for (let i = 0; i < fields.length; i += 2) entry[fields[i]] = fields[i + 1];
+            if (entry.eof !== undefined) done = true;
+            return { id, data: entry.data || "" };
+        });
+        res.json({ entries: chunks, last: entries.length ? entries[entries.length - 1][0] : after, done });
+    } catch (error) { res.status(500).json({ error: error.message }); }
+});
+
 function waitForResult(requestId) {
     return new Promise((resolve) => {
         let completed = false;
@@ -757,6 +861,8 @@ app.get(['/functions/:id', '/api/functions/:id'], cors(), authenticate, async (r
             description: item.description?.S || "",
             runtime: item.runtime?.S || "python",
             memoryMb: item.memoryMb ? parseInt(item.memoryMb.N) : 128,
+            batchMaxSize: item.batchMaxSize ? parseInt(item.batchMaxSize.N) : 1,
+            maxConcurrencyPerContainer: item.maxConcurrencyPerContainer ? parseInt(item.maxConcurrencyPerContainer.N) : 1,
             s3Key: item.s3Key?.S,
             uploadedAt: item.uploadedAt?.S
         });
@@ -906,15 +1012,42 @@ app.put(['/functions/:id', '/api/functions/:id'], authenticate, upload.single('f
             expressionAttributeValues[":m"] = { N: mem.toString() };
         }
 
+        if (req.body.maxConcurrencyPerContainer !== undefined) {
+            const { Item: current } = await db.send(new GetItemCommand({
+                TableName: process.env.TABLE_NAME, Key: { functionId: { S: functionId } }
+            }));
+            if (!current) return res.status(404).json({ error: "Not Found" });
+            const { concurrency, error } = parseContainerConcurrency(
+                String(req.body.maxConcurrencyPerContainer), current.runtime ? current.runtime.S : "python"
+            );
+            if (error) return res.status(400).json({ error });
+            updateExpression += ", maxConcurrencyPerContainer = :c";
+            expressionAttributeValues[":c"] = { N: concurrency.toString() };
+        }
+
         const command = new UpdateItemCommand({
             TableName: process.env.TABLE_NAME,
             Key: { functionId: { S: functionId } },
             UpdateExpression: updateExpression,
-            ExpressionAttributeValues: expressionAttributeValues
+            ExpressionAttributeValues: expressionAttributeValues,
+            ReturnValues: "ALL_NEW"
         });
 
-        await db.send(command);
+        const { Attributes: updated } = await db.send(command);
         logger.info(`Function Updated`, { functionId });
+
+        if (req.file) {
+            // Let Workers prefetch the new artifact and pre-warm containers (best effort)
+            redis.publish(DEPLOY_EVENTS_CHANNEL, JSON.stringify({
+                functionId,
+                runtime: updated?.runtime ? updated.runtime.S : "python",
+                runtimeVariant: updated?.runtimeVariant ? updated.runtimeVariant.S : null,
+                memoryMb: updated?.memoryMb ? parseInt(updated.memoryMb.N) : 128,
+                s3Bucket: process.env.BUCKET_NAME,
+                s3Key: req.file.key
+            })).catch(err => logger.warn("Failed to publish deploy event", { functionId, error: err.message }));
+        }
+
         res.json({ success: true, functionId });
 
     } catch (error) {
@@ -44,6 +44,14 @@ for runtime in PYTHON NODEJS CPP GO; do
       "$local_image" sh -c 'command -v tar >/dev/null && command -v tail >/dev/null'
 done
 
+# Image variants are built from the Worker's Dockerfiles (the docker/ directory
+# is removed below) and must pass the same runtime smoke test.
+docker build -t "$PYTHON_FAT_RUNTIME_IMAGE" \
+  -f /home/ec2-user/faas-worker/docker/Dockerfile.python-fat /home/ec2-user/faas-worker/docker
+docker run --rm --read-only --user 65534:65534 \
+  --tmpfs /tmp:rw,nosuid,nodev,exec,size=16m,mode=1777 \
+  "$PYTHON_FAT_RUNTIME_IMAGE" sh -c 'command -v tar >/dev/null && command -v tail >/dev/null && python -c "import numpy, pandas, PIL"'
+
 # Development-only files are not part of the runtime artifact.
 rm -rf \
   /home/ec2-user/faas-worker/__pycache__ \
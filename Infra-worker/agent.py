@@ -14,7 +14,10 @@ from http.server import HTTPServer, BaseHTTPRequestHandler
 from dotenv import load_dotenv
 from prometheus_client import start_http_server, Counter, Histogram, Gauge
 
+import config
+import json_codec
 from executor import TaskExecutor
+from micro_batcher import MicroBatcher
 from models import TaskMessage
 
 # --- Setup ---
@@ -54,6 +57,10 @@ class InfraAgent:
         self.dispatch_slots = threading.BoundedSemaphore(
             self.executor.metrics.concurrency_limit
         )
+        # Opt-in micro-batching: messages of one function's code are grouped
+        # and run with a single handler call (see _dispatch_batch)
+        self.batcher = MicroBatcher(self._dispatch_batch) if config.MICRO_BATCH_ENABLED else None
+        self.queue_url = self.config["SQS_URL"]
         self.running = True
         self._start_time = time.time()  # For uptime tracking
 
@@ -70,7 +77,7 @@ class InfraAgent:
         self.running = False
 
     def run(self):
-        queue_url = self.config["SQS_URL"]
+        queue_url = self.queue_url
         logger.info("📡 Listening for tasks", queue=queue_url)
 
         # Start Metrics Server
@@ -89,6 +96,10 @@ class InfraAgent:
         # Start Heartbeat Push to Controller (every 10 seconds)
         threading.Thread(target=self._heartbeat_push, daemon=True).start()
 
+        # Prefetch + pre-warm on code deployments announced by the Controller
+        if config.DEPLOY_PREWARM_ENABLED:
+            threading.Thread(target=self._listen_deploy_events, daemon=True).start()
+
         while self.running:
             reserved_slots = 0
             try:
@@ -114,8 +125,16 @@ class InfraAgent:
                     continue
 
                 for msg in messages:
-                    # Dispatch to thread for parallel processing
-                    threading.Thread(target=self._process_message, args=(queue_url, msg)).start()
+                    task = self._batchable_task(msg)
+                    if task is not None:
+                        # The slot now belongs to the pending batch
+                        self.batcher.add(
+                            self.executor.batch_key(task), (msg, task),
+                            min(task.batch_max_size, config.MICRO_BATCH_MAX_SIZE)
+                        )
+                    else:
+                        # Dispatch to thread for parallel processing
+                        threading.Thread(target=self._process_message, args=(queue_url, msg)).start()
                     reserved_slots -= 1
 
             except Exception as e:
@@ -126,70 +145,122 @@ class InfraAgent:
                 # thread. Each dispatched task releases its own slot.
                 for _ in range(reserved_slots):
                     self.dispatch_slots.release()
-        
+
+        # Run messages still waiting for their batch window
+        if self.batcher is not None:
+            self.batcher.flush_all()
+
+        # Publish metrics still buffered by the CloudWatch aggregator
+        self.executor.metrics.cw.close()
         logger.info("👋 Agent stopped cleanly")
 
+    @staticmethod
+    def _parse_task(body) -> TaskMessage:
+        return TaskMessage(
+            request_id=body["requestId"],
+            function_id=body.get("functionId", "unknown"),
+            runtime=body.get("runtime", "python"),
+            s3_key=body["s3Key"],
+            s3_bucket=body.get("s3Bucket"),
+            memory_mb=body.get("memoryMb", 128),
+            timeout_ms=body.get("timeoutMs", 300000),
+            payload=body.get("input", {}),
+            model_id=body.get("modelId", "llama3:8b"),
+            env_vars=body.get("envVars", {}),
+            runtime_variant=body.get("runtimeVariant"),
+            payload_ref=body.get("payloadRef"),
+            payload_content_type=body.get("payloadContentType"),
+            batch_max_size=int(body.get("batchMaxSize") or 1),
+            max_concurrency_per_container=int(body.get("maxConcurrencyPerContainer") or 1)
+        )
+
+    def _batchable_task(self, msg):
+        """Return the parsed task of a message that may join a micro-batch, else None."""
+        if self.batcher is None:
+            return None
+        try:
+            task = self._parse_task(json_codec.loads(msg["Body"]))
+        except Exception:
+            return None  # Reported by _process_message
+        # Batches are built by the Python runner; claim-check inputs are
+        # streamed into the container one at a time.
+        if task.batch_max_size > 1 and task.runtime == "python" and not task.payload_ref:
+            return task
+        return None
+
+    def _dispatch_batch(self, items):
+        """
+        Start a thread for a closed micro-batch of (message, task) pairs.
+
+        Every message reserved a dispatch slot when it was received; the
+        batch runs in one of them and returns the others right away.
+        """
+        try:
+            threading.Thread(target=self._process_batch, args=(self.queue_url, items)).start()
+        except Exception:
+            for _ in items:
+                self.dispatch_slots.release()
+            raise
+        for _ in range(len(items) - 1):
+            self.dispatch_slots.release()
+
+    def _run_with_retries(self, run):
+        max_attempts = 3
+        for attempt in range(max_attempts):
+            try:
+                return run()
+            except Exception as e:
+                logger.warning("Docker execution failed", attempt=attempt+1, error=str(e))
+                if attempt == max_attempts - 1:
+                    raise e
+                time.sleep(1)
+
+    def _publish_result(self, task, result):
+        # Serialised once; the same bytes are published and stored
+        json_result = result.to_json()
+
+        # Pub/Sub channel
+        channel = f"result:{task.request_id}"
+        max_attempts = 3
+        for attempt in range(max_attempts):
+            try:
+                self.redis_client.publish(channel, json_result)
+                
+                # Store key for async retrieval (TTL 1 hour)
+                self.redis_client.setex(f"job:{task.request_id}", 3600, json_result)
+                break
+            except Exception as e:
+                logger.warning("Redis publish failed", attempt=attempt+1, error=str(e))
+                if attempt == max_attempts - 1:
+                    raise e
+                time.sleep(1)
+
+    def _record_completion(self, task, result):
+        logger.info("✅ Task Completed", id=task.request_id, ms=result.duration_ms)
+
+        # Metrics Update
+        status = "success" if result.success else "failure"
+        self.jobs_processed.labels(status=status, runtime=task.runtime, model=task.model_id).inc()
+        self.job_duration.labels(runtime=task.runtime, model=task.model_id).observe(result.duration_ms / 1000.0)
+
     def _process_message(self, queue_url, msg):
         task = None # Initialize task to None for error handling
         try:
             self.active_jobs.inc() # Increment active jobs gauge
-            body = json.loads(msg["Body"])
-            task = TaskMessage(
-                request_id=body["requestId"],
-                function_id=body.get("functionId", "unknown"),
-                runtime=body.get("runtime", "python"),
-                s3_key=body["s3Key"],
-                s3_bucket=body.get("s3Bucket"),
-                memory_mb=body.get("memoryMb", 128),
-                timeout_ms=body.get("timeoutMs", 300000),
-                payload=body.get("input", {}),
-                model_id=body.get("modelId", "llama3:8b"),
-                env_vars=body.get("envVars", {})
-            )
+            task = self._parse_task(json_codec.loads(msg["Body"]))
             
             logger.info("🚀 Processing Task", id=task.request_id, runtime=task.runtime)
 
             # Execute Task
-            result = None
-            max_attempts = 3
-            for attempt in range(max_attempts):
-                try:
-                    result = self.executor.run(task)
-                    break
-                except Exception as e:
-                    logger.warning("Docker execution failed", attempt=attempt+1, error=str(e))
-                    if attempt == max_attempts - 1:
-                        raise e
-                    time.sleep(1)
+            result = self._run_with_retries(lambda: self.executor.run(task))
 
             # Publish Result
-            result_dict = result.to_dict()
-            json_result = json.dumps(result_dict)
-            
-            # Pub/Sub channel
-            channel = f"result:{task.request_id}"
-            for attempt in range(max_attempts):
-                try:
-                    self.redis_client.publish(channel, json_result)
-                    
-                    # Store key for async retrieval (TTL 1 hour)
-                    self.redis_client.setex(f"job:{task.request_id}", 3600, json_result)
-                    break
-                except Exception as e:
-                    logger.warning("Redis publish failed", attempt=attempt+1, error=str(e))
-                    if attempt == max_attempts - 1:
-                        raise e
-                    time.sleep(1)
+            self._publish_result(task, result)
 
             # Delete Message
             self.sqs.delete_message(QueueUrl=queue_url, ReceiptHandle=msg["ReceiptHandle"])
             
-            logger.info("✅ Task Completed", id=task.request_id, ms=result.duration_ms)
-
-            # Metrics Update
-            status = "success" if result.success else "failure"
-            self.jobs_processed.labels(status=status, runtime=task.runtime, model=task.model_id).inc()
-            self.job_duration.labels(runtime=task.runtime, model=task.model_id).observe(result.duration_ms / 1000.0)
+            self._record_completion(task, result)
 
         except Exception as e:
             logger.error("Task processing failed", error=str(e))
@@ -199,6 +270,109 @@ class InfraAgent:
             self.active_jobs.dec()
             self.dispatch_slots.release()
 
+    def _process_batch(self, queue_url, items):
+        """
+        Run a micro-batch with one handler call, then publish and acknowledge
+        each request on its own: a request whose result could not be
+        published keeps its SQS message and is retried after the visibility
+        timeout, without holding back the rest of the batch.
+        """
+        tasks = [task for _msg, task in items]
+        self.active_jobs.inc(len(tasks))
+        try:
+            logger.info(
+                "🚀 Processing Batch", ids=[task.request_id for task in tasks],
+                function_id=tasks[0].function_id, size=len(tasks)
+            )
+            results = self._run_with_retries(lambda: self.executor.run_batch(tasks))
+
+            completed = []
+            for (msg, task), result in zip(items, results):
+                try:
+                    self._publish_result(task, result)
+                except Exception as e:
+                    logger.error("Task processing failed", id=task.request_id, error=str(e))
+                    self.jobs_processed.labels(status="error", runtime=task.runtime, model=task.model_id).inc()
+                    continue
+                completed.append(msg)
+                self._record_completion(task, result)
+            self._delete_messages(queue_url, completed)
+
+        except Exception as e:
+            logger.error("Batch processing failed", size=len(tasks), error=str(e))
+            for task in tasks:
+                self.jobs_processed.labels(status="error", runtime=task.runtime, model=task.model_id).inc()
+
+        finally:
+            self.active_jobs.dec(len(tasks))
+            self.dispatch_slots.release()
+
+    def _delete_messages(self, queue_url, messages):
+        """Delete processed messages, up to 10 per SQS request."""
+        for start in range(0, len(messages), 10):
+            entries = [
+                {"Id": str(index), "ReceiptHandle": msg["ReceiptHandle"]}
+                for index, msg in enumerate(messages[start:start + 10])
+            ]
+            try:
+                resp = self.sqs.delete_message_batch(QueueUrl=queue_url, Entries=entries)
+                for failure in resp.get("Failed", []):
+                    logger.warning("SQS delete failed", entry=failure.get("Id"), error=failure.get("Message"))
+            except Exception as e:
+                logger.error("SQS batch delete failed", count=len(entries), error=str(e))
+
+    def _listen_deploy_events(self):
+        """
+        [Background Task] Subscribe to Controller deploy events
+        - Trigger: PUT /functions/:id with a new code file
+        - Action: Prefetch the new artifact and pre-warm its function pool
+        - Purpose: The first invocations of a new version start warm
+        """
+        while self.running:
+            pubsub = None
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(config.DEPLOY_EVENTS_CHANNEL)
+                logger.info("📣 Subscribed to deploy events", channel=config.DEPLOY_EVENTS_CHANNEL)
+                while self.running:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message.get("type") == "message":
+                        self._handle_deploy_event(message["data"])
+            except Exception as e:
+                logger.warning("Deploy event subscription failed", error=str(e))
+                time.sleep(5)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def _handle_deploy_event(self, data):
+        try:
+            event = json.loads(data)
+            function_id = event["functionId"]
+            s3_key = event["s3Key"]
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning("Invalid deploy event", error=str(e))
+            return
+
+        def _prewarm():
+            try:
+                self.executor.prewarm(
+                    function_id,
+                    event.get("runtime", "python"),
+                    s3_key,
+                    event.get("s3Bucket"),
+                    event.get("memoryMb", 128),
+                    event.get("runtimeVariant")
+                )
+            except Exception as e:
+                logger.warning("Deploy pre-warm failed", function_id=function_id, error=str(e))
+
+        # Pre-warming downloads and starts containers; keep the listener free.
+        threading.Thread(target=_prewarm, daemon=True).start()
+
     def _publish_system_status(self):
         """
         [Background Task] Publish System Status to Redis
@@ -212,10 +386,7 @@ class InfraAgent:
                     "timestamp": time.time(),
                     "worker_id": self.config.get("HOSTNAME", "unknown"),
                     "pools": {
-                        "python": len(self.executor.containers.pools["python"]),
-                        "nodejs": len(self.executor.containers.pools["nodejs"]),
-                        "cpp": len(self.executor.containers.pools["cpp"]),
-                        "go": len(self.executor.containers.pools["go"])
+                        runtime: len(pool) for runtime, pool in self.executor.containers.pools.items()
                     },
                     "active_jobs": self.active_jobs._value.get(),
                     "uptime_seconds": int(time.time() - self._start_time)
@@ -251,10 +422,7 @@ class InfraAgent:
                     "timestamp": time.time(),
                     "status": "healthy" if self.running else "stopping",
                     "pools": {
-                        "python": len(self.executor.containers.pools["python"]),
-                        "nodejs": len(self.executor.containers.pools["nodejs"]),
-                        "cpp": len(self.executor.containers.pools["cpp"]),
-                        "go": len(self.executor.containers.pools["go"])
+                        runtime: len(pool) for runtime, pool in self.executor.containers.pools.items()
                     },
                     "activeJobs": self.active_jobs._value.get(),
                     "uptimeSeconds": int(time.time() - self._start_time)
@@ -306,10 +474,7 @@ class InfraAgent:
                             "worker_id": socket.gethostname(),
                             "uptime_seconds": int(time.time() - agent._start_time),
                             "pools": {
-                                "python": len(agent.executor.containers.pools["python"]),
-                                "nodejs": len(agent.executor.containers.pools["nodejs"]),
-                                "cpp": len(agent.executor.containers.pools["cpp"]),
-                                "go": len(agent.executor.containers.pools["go"])
+                                runtime: len(pool) for runtime, pool in agent.executor.containers.pools.items()
                             },
                             "active_jobs": agent.active_jobs._value.get()
                         }
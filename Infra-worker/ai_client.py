@@ -10,7 +10,8 @@ class AIClient:
     def __init__(self):
         self.endpoint = os.environ.get("AI_ENDPOINT", "http://10.0.20.100:11434")
         self.default_model = os.environ.get("LLM_MODEL", "llama3:8b")
-        self.output_dir = "/output" # Standard path in container
+        # Per-invocation directory when invocations share a container
+        self.output_dir = os.environ.get("OUTPUT_DIR", "/output")
         
         # Retry Strategy
         retry_strategy = Retry(
@@ -0,0 +1,191 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+import structlog
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+from prometheus_client import Counter, Gauge
+
+import config
+
+logger = structlog.get_logger()
+
+ARTIFACT_REQUESTS = Counter(
+    'worker_artifact_cache_requests_total', 'Artifact lookups by serving tier', ['tier']
+)
+ARTIFACT_BYTES = Counter(
+    'worker_artifact_cache_bytes_total', 'Artifact bytes served by tier', ['tier']
+)
+ARTIFACT_CACHE_SIZE = Gauge(
+    'worker_artifact_cache_size_bytes', 'Bytes held by the on-host artifact cache'
+)
+
+
+class ArtifactCache:
+    """
+    On-host, content-addressed cache for code artifacts.
+
+    Blobs are stored once per SHA-256 of their content under blobs/, so the
+    same code deployed under different function IDs (or S3 keys) shares one
+    entry. index/ maps an artifact ID (bucket/key) to its content hash and
+    survives Worker restarts. The total size is bounded with LRU eviction.
+
+    Concurrent misses for the same artifact are coalesced: one caller runs
+    the fetch, the others wait for its result (single flight).
+    """
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, root: Path = None, max_bytes: int = None):
+        self.root = Path(root or config.ARTIFACT_CACHE_DIR)
+        self.max_bytes = max_bytes or config.ARTIFACT_CACHE_MAX_MB * 1024 * 1024
+        self.blob_dir = self.root / "blobs"
+        self.index_dir = self.root / "index"
+        self.tmp_dir = self.root / "tmp"
+        for directory in (self.blob_dir, self.index_dir, self.tmp_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._lru = OrderedDict()  # content hash -> size
+        self._size = 0
+        self._load_existing()
+
+    def get_or_fetch(self, artifact_id: str, fetch: Callable[[Path], str]) -> Path:
+        """
+        Return the cached blob for artifact_id, fetching it at most once.
+
+        fetch(destination) must write the artifact to destination and return
+        the tier that served it ("redis" or "s3"). Local hits are reported as
+        the "local" tier.
+        """
+        while True:
+            with self._lock:
+                blob = self._lookup_locked(artifact_id)
+                if blob is not None:
+                    self._record("local", blob)
+                    return blob
+                event = self._inflight.get(artifact_id)
+                if event is None:
+                    event = self._inflight[artifact_id] = threading.Event()
+                    break
+            # Another thread is fetching the same artifact: wait, then re-check.
+            event.wait()
+
+        try:
+            return self._fetch(artifact_id, fetch)
+        finally:
+            with self._lock:
+                self._inflight.pop(artifact_id, None)
+            event.set()
+
+    def fetch_into(self, artifact_id: str, destination: Path, fetch: Callable[[Path], str]) -> Path:
+        """get_or_fetch() + link_into(), retrying if the blob is evicted in between."""
+        for _ in range(3):
+            blob = self.get_or_fetch(artifact_id, fetch)
+            try:
+                self.link_into(blob, destination)
+                return blob
+            except FileNotFoundError:
+                continue
+        raise RuntimeError(f"Artifact was evicted while being linked: {artifact_id}")
+
+    def link_into(self, blob: Path, destination: Path):
+        """Expose a blob inside a workspace without copying its bytes.
+
+        A hard link keeps the data reachable even if the blob is evicted while
+        the workspace still uses it. Falls back to a copy across filesystems.
+        """
+        try:
+            os.link(blob, destination)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            shutil.copyfile(blob, destination)
+
+    def _fetch(self, artifact_id: str, fetch: Callable[[Path], str]) -> Path:
+        fd, tmp_name = tempfile.mkstemp(dir=self.tmp_dir)
+        os.close(fd)
+        tmp_path = Path(tmp_name)
+        try:
+            tier = fetch(tmp_path)
+            content_hash = self._sha256(tmp_path)
+            blob = self.blob_dir / content_hash
+            with self._lock:
+                if content_hash in self._lru:
+                    # Identical content is already cached under another ID.
+                    self._lru.move_to_end(content_hash)
+                else:
+                    os.replace(tmp_path, blob)
+                    size = blob.stat().st_size
+                    self._lru[content_hash] = size
+                    self._size += size
+                self._write_index(artifact_id, content_hash)
+                self._evict_locked(keep=content_hash)
+            self._record(tier, blob)
+            return blob
+        finally:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+    def _lookup_locked(self, artifact_id: str) -> Optional[Path]:
+        try:
+            content_hash = self._index_path(artifact_id).read_text().strip()
+        except OSError:
+            return None
+        if content_hash not in self._lru:
+            return None
+        self._lru.move_to_end(content_hash)
+        return self.blob_dir / content_hash
+
+    def _evict_locked(self, keep: str):
+        while self._size > self.max_bytes and len(self._lru) > 1:
+            content_hash, size = next(iter(self._lru.items()))
+            if content_hash == keep:
+                self._lru.move_to_end(content_hash)
+                continue
+            self._lru.pop(content_hash)
+            self._size -= size
+            try:
+                (self.blob_dir / content_hash).unlink()
+            except OSError:
+                pass
+            logger.info("Artifact evicted from local cache", content_hash=content_hash[:12], size=size)
+        ARTIFACT_CACHE_SIZE.set(self._size)
+
+    def _load_existing(self):
+        blobs = sorted(self.blob_dir.iterdir(), key=lambda path: path.stat().st_mtime)
+        for blob in blobs:
+            size = blob.stat().st_size
+            self._lru[blob.name] = size
+            self._size += size
+        for leftover in self.tmp_dir.iterdir():
+            try:
+                leftover.unlink()
+            except OSError:
+                pass
+        ARTIFACT_CACHE_SIZE.set(self._size)
+
+    def _write_index(self, artifact_id: str, content_hash: str):
+        self._index_path(artifact_id).write_text(content_hash)
+
+    def _index_path(self, artifact_id: str) -> Path:
+        return self.index_dir / hashlib.sha256(artifact_id.encode("utf-8")).hexdigest()
+
+    def _record(self, tier: str, blob: Path):
+        ARTIFACT_REQUESTS.labels(tier=tier).inc()
+        try:
+            ARTIFACT_BYTES.labels(tier=tier).inc(blob.stat().st_size)
+        except OSError:
+            pass
+
+    def _sha256(self, path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
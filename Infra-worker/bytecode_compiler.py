@@ -0,0 +1,126 @@
+import re
+import sys
+import shutil
+import subprocess
+import structlog
+from pathlib import Path
+from typing import Optional
+from prometheus_client import Counter
+
+import config
+
+logger = structlog.get_logger()
+
+PRECOMPILE_RUNS = Counter(
+    'worker_bytecode_precompile_total', 'Snapshot bytecode precompilation runs', ['result']
+)
+
+
+def runtime_python_version(image: str) -> Optional[str]:
+    """Return "X.Y" from a runtime image tag like faas-runtime/python:3.11.13."""
+    match = re.search(r":(\d+)\.(\d+)", image or "")
+    return f"{match.group(1)}.{match.group(2)}" if match else None
+
+
+class BytecodeCompiler:
+    """
+    Precompiles Python sources of a prepared workspace on the host.
+
+    Warm containers have a read-only root and tmpfs workspaces, so bytecode
+    written at import time is lost with the container. Compiling once while
+    the snapshot is built ships __pycache__/*.pyc inside the snapshot tar.
+
+    The .pyc magic number is tied to the interpreter version, so only an
+    interpreter whose cache tag matches the Python runtime image is used:
+    PRECOMPILE_PYTHON_INTERPRETER, the Worker's own interpreter, or
+    python<major>.<minor> on PATH. Without one, precompilation is skipped.
+    Hash-based .pyc files are written, so they stay valid regardless of the
+    file timestamps the workspace ends up with in the container.
+    """
+    def __init__(self, image: str = None, interpreter: str = None, enabled: bool = None):
+        self.enabled = config.PRECOMPILE_PYTHON_ENABLED if enabled is None else enabled
+        self.expected_tag = self._image_cache_tag(image or config.DOCKER_IMAGES["python"])
+        self.interpreter = None
+        # Cache tag of the selected interpreter, e.g. "cpython-311"; part of
+        # the snapshot key so a runtime upgrade never reuses stale bytecode.
+        self.tag = ""
+        if self.enabled:
+            self._resolve_interpreter(interpreter or config.PRECOMPILE_PYTHON_INTERPRETER)
+
+    def compile_tree(self, tree: Path) -> bool:
+        """Write .pyc files next to every .py file under tree. Returns True on success."""
+        if not any(Path(tree).rglob("*.py")):
+            return False
+        if self.interpreter is None:
+            PRECOMPILE_RUNS.labels(result="skipped").inc()
+            return False
+
+        command = [
+            self.interpreter, "-m", "compileall", "-q", "-j", "0",
+            "--invalidation-mode", "checked-hash",
+            # Report container paths in tracebacks, not host staging paths
+            "-d", "/workspace",
+            str(tree)
+        ]
+        try:
+            result = subprocess.run(
+                command, capture_output=True, timeout=config.PRECOMPILE_TIMEOUT_SECONDS
+            )
+        except (OSError, subprocess.TimeoutExpired) as e:
+            PRECOMPILE_RUNS.labels(result="failed").inc()
+            logger.warning("Bytecode precompilation failed", error=str(e))
+            return False
+
+        if result.returncode != 0:
+            # Modules that do not compile (e.g. syntax errors) simply have no
+            # .pyc; the rest of the tree is still precompiled.
+            PRECOMPILE_RUNS.labels(result="failed").inc()
+            logger.warning(
+                "Bytecode precompilation incomplete",
+                output=result.stdout.decode("utf-8", errors="replace")[-500:]
+            )
+            return False
+        PRECOMPILE_RUNS.labels(result="compiled").inc()
+        return True
+
+    def _resolve_interpreter(self, configured: str):
+        if configured:
+            candidates = [configured]
+        else:
+            candidates = [sys.executable]
+            match = re.fullmatch(r"cpython-(\d)(\d+)", self.expected_tag or "")
+            if match:
+                candidates.append(shutil.which(f"python{match.group(1)}.{match.group(2)}"))
+
+        for candidate in filter(None, candidates):
+            tag = self._interpreter_cache_tag(candidate)
+            if tag and (tag == self.expected_tag or (configured and not self.expected_tag)):
+                self.interpreter = candidate
+                self.tag = tag
+                logger.info("🐍 Bytecode precompilation enabled", interpreter=candidate, tag=tag)
+                return
+        logger.warning(
+            "No interpreter matches the Python runtime image; bytecode precompilation disabled",
+            expected=self.expected_tag
+        )
+
+    @staticmethod
+    def _image_cache_tag(image: str) -> Optional[str]:
+        """Derive the CPython cache tag from an image tag like python:3.11.13."""
+        version = runtime_python_version(image)
+        return f"cpython-{version.replace('.', '')}" if version else None
+
+    @staticmethod
+    def _interpreter_cache_tag(interpreter: str) -> Optional[str]:
+        if interpreter == sys.executable:
+            return sys.implementation.cache_tag
+        try:
+            result = subprocess.run(
+                [interpreter, "-c", "import sys; print(sys.implementation.cache_tag)"],
+                capture_output=True, timeout=10
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode != 0:
+            return None
+        return result.stdout.decode("utf-8", errors="replace").strip() or None
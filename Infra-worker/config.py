@@ -9,6 +9,11 @@ S3_USER_DATA_BUCKET = os.getenv("S3_USER_DATA_BUCKET", "faas-user-data")
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
 
+# Code artifacts are cached in Redis as a manifest plus fixed-size chunks
+REDIS_CODE_CHUNK_SIZE_MB = int(os.getenv("REDIS_CODE_CHUNK_SIZE_MB", 4))
+REDIS_CODE_PIPELINE_CHUNKS = int(os.getenv("REDIS_CODE_PIPELINE_CHUNKS", 8))
+REDIS_CODE_TTL_SECONDS = int(os.getenv("REDIS_CODE_TTL_SECONDS", 600))
+
 # --- Costs & Limits ---
 # Cost per MB-hour (Estimated based on loose AWS EC2 GB-hour cost)
 COST_PER_MB_HOUR = 0.00005 
@@ -16,34 +21,189 @@ COST_PER_MB_HOUR = 0.00005
 # Max containers per function for warm pool (LRU)
 MAX_POOL_SIZE_PER_FUNC = 5
 
+# Max reset containers of superseded deployments kept per runtime for reuse
+RECYCLED_POOL_MAX_SIZE = int(os.getenv("RECYCLED_POOL_MAX_SIZE", 10))
+
+# --- Deploy Events ---
+# Redis Pub/Sub channel on which the Controller announces new code deployments.
+# Workers prefetch the artifact and pre-warm containers for it.
+DEPLOY_EVENTS_CHANNEL = os.getenv("DEPLOY_EVENTS_CHANNEL", "deploy-events")
+DEPLOY_PREWARM_ENABLED = os.getenv("DEPLOY_PREWARM_ENABLED", "true").lower() == "true"
+
+# --- Claim-Check Payloads ---
+# Inputs too large for the SQS body arrive as payloadRef ("redis://<key>" or
+# "s3://<bucket>/<key>") and are streamed into the container by the Worker.
+PAYLOAD_REF_REDIS_PREFIX = os.getenv("PAYLOAD_REF_REDIS_PREFIX", "payload:")
+PAYLOAD_REF_BUCKETS = frozenset(
+    name.strip() for name in os.getenv("PAYLOAD_REF_BUCKETS", S3_USER_DATA_BUCKET).split(",") if name.strip()
+)
+
+# --- CloudWatch Metrics ---
+# "api": batched PutMetricData calls, "emf": Embedded Metric Format log lines
+CW_METRICS_MODE = os.getenv("CW_METRICS_MODE", "api")
+CW_NAMESPACE = os.getenv("CW_NAMESPACE", "FaaS/FunctionRunner")
+CW_FLUSH_INTERVAL_SECONDS = float(os.getenv("CW_FLUSH_INTERVAL_SECONDS", 30))
+# Distinct (metric, dimensions, value) entries buffered between flushes; new
+# entries beyond this are dropped (and counted), repeats of buffered ones are kept
+CW_MAX_BUFFERED_POINTS = int(os.getenv("CW_MAX_BUFFERED_POINTS", 100000))
+
+# --- Background Reporting ---
+# Bounded queue per stage (metrics / upload / cleanup) and fixed worker pools
+REPORTING_QUEUE_SIZE = int(os.getenv("REPORTING_QUEUE_SIZE", 256))
+REPORTING_UPLOAD_WORKERS = int(os.getenv("REPORTING_UPLOAD_WORKERS", 4))
+REPORTING_CLEANUP_WORKERS = int(os.getenv("REPORTING_CLEANUP_WORKERS", 2))
+# How long an executor waits for upload queue capacity before dropping outputs
+REPORTING_SUBMIT_TIMEOUT_SECONDS = float(os.getenv("REPORTING_SUBMIT_TIMEOUT_SECONDS", 5))
+
+# --- Output Upload ---
+# Shared TransferManager settings for function outputs
+OUTPUT_UPLOAD_CONCURRENCY = int(os.getenv("OUTPUT_UPLOAD_CONCURRENCY", 16))
+OUTPUT_MULTIPART_THRESHOLD_MB = int(os.getenv("OUTPUT_MULTIPART_THRESHOLD_MB", 16))
+OUTPUT_MULTIPART_CHUNKSIZE_MB = int(os.getenv("OUTPUT_MULTIPART_CHUNKSIZE_MB", 8))
+# Stream /output from the container tar straight into S3 (single pass, no
+# temp tar or extracted copy on the host disk)
+OUTPUT_STREAMING_ENABLED = os.getenv("OUTPUT_STREAMING_ENABLED", "false").lower() == "true"
+# Content hashes remembered for skipping re-uploads of identical outputs
+OUTPUT_DEDUP_CACHE_SIZE = int(os.getenv("OUTPUT_DEDUP_CACHE_SIZE", 10000))
+
+# Handler results (SDK result channel) up to this size are returned inline;
+# larger ones are uploaded to S3 and returned as resultRef
+RESULT_INLINE_MAX_BYTES = int(os.getenv("RESULT_INLINE_MAX_BYTES", 256 * 1024))
+
 # --- Paths ---
 # OS-specific Cgroup paths (Amazon Linux 2023 / Cgroup v2)
 CGROUP_PATH_IO_STAT = "/sys/fs/cgroup/system.slice/docker-{container_id}.scope/io.stat"
 CGROUP_PATH_MEMORY_PEAK = "/sys/fs/cgroup/system.slice/docker-{container_id}.scope/memory.peak"
 CGROUP_PATH_CPU_STAT = "/sys/fs/cgroup/system.slice/docker-{container_id}.scope/cpu.stat"
+CGROUP_PATH_CPU_MAX_BURST = "/sys/fs/cgroup/system.slice/docker-{container_id}.scope/cpu.max.burst"
 
 # Docker Work Directory (Host)
 DOCKER_WORK_DIR_ROOT = os.getenv("DOCKER_WORK_DIR_ROOT", "/tmp/faas/workspace")
 
+# Content-addressed artifact cache (Host). Keep it on the same filesystem as
+# DOCKER_WORK_DIR_ROOT so workspaces can hard-link cached artifacts.
+ARTIFACT_CACHE_DIR = os.getenv("ARTIFACT_CACHE_DIR", "/tmp/faas/artifacts")
+ARTIFACT_CACHE_MAX_MB = int(os.getenv("ARTIFACT_CACHE_MAX_MB", 2048))
+
+# Prepared workspace snapshots (extracted, validated, packed as tar) per artifact
+SNAPSHOT_CACHE_ENABLED = os.getenv("SNAPSHOT_CACHE_ENABLED", "true").lower() == "true"
+SNAPSHOT_CACHE_DIR = os.getenv("SNAPSHOT_CACHE_DIR", "/tmp/faas/snapshots")
+SNAPSHOT_CACHE_MAX_MB = int(os.getenv("SNAPSHOT_CACHE_MAX_MB", 4096))
+# Evict snapshots while free disk space on the cache volume is below this
+SNAPSHOT_MIN_FREE_MB = int(os.getenv("SNAPSHOT_MIN_FREE_MB", 1024))
+# Snapshots kept per function; a deploy cutover serves the old and new artifact at once
+SNAPSHOT_KEYS_PER_FUNCTION = int(os.getenv("SNAPSHOT_KEYS_PER_FUNCTION", 2))
+
+# Python dependency layers: a requirements.txt in a ZIP artifact is installed
+# once per requirements hash from a local wheel mirror (no index access) and
+# injected next to the code. Layers are shared across functions.
+DEPENDENCY_LAYERS_ENABLED = os.getenv("DEPENDENCY_LAYERS_ENABLED", "true").lower() == "true"
+PYTHON_WHEEL_MIRROR = os.getenv("PYTHON_WHEEL_MIRROR", "/opt/faas/wheels")
+LAYER_CACHE_DIR = os.getenv("LAYER_CACHE_DIR", "/tmp/faas/layers")
+LAYER_CACHE_MAX_MB = int(os.getenv("LAYER_CACHE_MAX_MB", 4096))
+LAYER_BUILD_TIMEOUT_SECONDS = int(os.getenv("LAYER_BUILD_TIMEOUT_SECONDS", 300))
+# Node layers are keyed by package-lock.json. They are taken from the
+# artifact's node_modules, or installed with `npm ci --offline` from this cache.
+NPM_OFFLINE_CACHE = os.getenv("NPM_OFFLINE_CACHE", "/opt/faas/npm-cache")
+
+# V8 compile cache (NODE_COMPILE_CACHE) kept per Node artifact after its first
+# cold start and injected into later cold starts. Needs Node >= 22.1 in the
+# runtime image; older runtimes write no cache and are skipped.
+NODE_COMPILE_CACHE_ENABLED = os.getenv("NODE_COMPILE_CACHE_ENABLED", "true").lower() == "true"
+COMPILE_CACHE_DIR = os.getenv("COMPILE_CACHE_DIR", "/tmp/faas/compile-cache")
+COMPILE_CACHE_MAX_MB = int(os.getenv("COMPILE_CACHE_MAX_MB", 1024))
+
+# Compile .py files to .pyc while building a snapshot. Requires an interpreter
+# matching the Python runtime image (Worker's own, python<X.Y> on PATH, or set
+# PRECOMPILE_PYTHON_INTERPRETER explicitly).
+PRECOMPILE_PYTHON_ENABLED = os.getenv("PRECOMPILE_PYTHON_ENABLED", "true").lower() == "true"
+PRECOMPILE_PYTHON_INTERPRETER = os.getenv("PRECOMPILE_PYTHON_INTERPRETER", "")
+PRECOMPILE_TIMEOUT_SECONDS = int(os.getenv("PRECOMPILE_TIMEOUT_SECONDS", 120))
+
 # --- Docker Images ---
 DOCKER_IMAGES = {
     "python": os.getenv("DOCKER_PYTHON_IMAGE", "faas-runtime/python:3.11.13"),
     "cpp": os.getenv("DOCKER_CPP_IMAGE", "faas-runtime/cpp:14.3.0"),
     "nodejs": os.getenv("DOCKER_NODEJS_IMAGE", "faas-runtime/nodejs:20.19.4"),
-    "go": os.getenv("DOCKER_GO_IMAGE", "faas-runtime/go:1.21.13")
+    "go": os.getenv("DOCKER_GO_IMAGE", "faas-runtime/go:1.21.13"),
+    # Image variants (see RUNTIME_VARIANTS)
+    "python-fat": os.getenv("DOCKER_PYTHON_FAT_IMAGE", "faas-runtime/python-fat:3.11.13")
 }
 
+# --- Runtime Variants ---
+# Image variant -> base runtime. A variant runs the base runtime's command in
+# a different image and has its own warm pool and metrics. Functions declare
+# a variant at upload (x-runtime-variant) or are routed by their imports.
+RUNTIME_VARIANTS = {
+    "python-fat": "python"
+}
+# main.py importing any of these (without vendoring it) routes to python-fat,
+# where they are preinstalled
+PYTHON_FAT_MODULES = frozenset(
+    name.strip() for name in os.getenv("PYTHON_FAT_MODULES", "numpy,pandas,PIL").split(",") if name.strip()
+)
+RUNTIME_VARIANT_DETECTION = os.getenv("RUNTIME_VARIANT_DETECTION", "true").lower() == "true"
+
 # --- Warm Pool Sizes ---
 WARM_POOL_SIZES = {
     "python": int(os.getenv("WARM_POOL_PYTHON_SIZE", 1)),
     "cpp": int(os.getenv("WARM_POOL_CPP_SIZE", 1)),
     "nodejs": int(os.getenv("WARM_POOL_NODEJS_SIZE", 1)),
-    "go": int(os.getenv("WARM_POOL_GO_SIZE", 1))
+    "go": int(os.getenv("WARM_POOL_GO_SIZE", 1)),
+    "python-fat": int(os.getenv("WARM_POOL_PYTHON_FAT_SIZE", 1))
 }
 
+# --- CPU Sizing ---
+# CPU scales with memory (Lambda-style): every CPU_MB_PER_VCPU MB of memory
+# buys one vCPU of cpu.max quota, clamped to [CPU_MIN_CORES, CPU_MAX_CORES]
+# and the host's core count.
+CPU_MB_PER_VCPU = int(os.getenv("CPU_MB_PER_VCPU", 1769))
+CPU_MIN_CORES = float(os.getenv("CPU_MIN_CORES", 0.125))
+CPU_MAX_CORES = float(os.getenv("CPU_MAX_CORES", 6))
+# cpu.max.burst as a fraction (0-1) of the quota: unused quota a short,
+# latency-sensitive handler may spend at once. 0 disables it; needs kernel >= 5.14.
+CPU_BURST_RATIO = float(os.getenv("CPU_BURST_RATIO", 1.0))
+# Pin each container to dedicated cores (cpuset), least-loaded first, on
+# hosts with at least CPU_PINNING_MIN_HOST_CORES cores
+CPU_PINNING_ENABLED = os.getenv("CPU_PINNING_ENABLED", "false").lower() == "true"
+CPU_PINNING_MIN_HOST_CORES = int(os.getenv("CPU_PINNING_MIN_HOST_CORES", 16))
+
 # --- Execution Limits ---
 # Max size of stdout/stderr to capture (bytes)
 MAX_OUTPUT_SIZE = int(os.getenv("MAX_OUTPUT_SIZE", 1024 * 1024)) # 1MB
+# Invocation deadlines are kept in a timer wheel on the exec I/O thread:
+# resolution (tick) and number of slots per revolution
+EXEC_TIMER_TICK_MS = int(os.getenv("EXEC_TIMER_TICK_MS", 50))
+EXEC_TIMER_SLOTS = int(os.getenv("EXEC_TIMER_SLOTS", 512))
+# Upper bound for a function's maxConcurrencyPerContainer (invocations sharing
+# one warm container; Python runtime)
+CONTAINER_MAX_CONCURRENCY = int(os.getenv("CONTAINER_MAX_CONCURRENCY", 16))
+
+# --- Function Logs ---
+# Logs are held in memory as a head plus a ring-buffer tail of LOG_TAIL_BYTES,
+# which together form the stdout preview (MAX_OUTPUT_SIZE). Longer logs are
+# also spilled gzip-compressed to output/stdout.log.gz, up to LOG_SPILL_MAX_MB
+# of raw log, and uploaded with the outputs.
+LOG_TAIL_BYTES = int(os.getenv("LOG_TAIL_BYTES", 256 * 1024))
+LOG_SPILL_MAX_MB = int(os.getenv("LOG_SPILL_MAX_MB", 256))
+LOG_SPILL_COMPRESSLEVEL = int(os.getenv("LOG_SPILL_COMPRESSLEVEL", 3))
+# Spill bytes are buffered by the exec stream and written out this often
+LOG_SPILL_DRAIN_MS = int(os.getenv("LOG_SPILL_DRAIN_MS", 100))
+# Live tailing: log chunks batched into the Redis stream <prefix><requestId>
+LOG_STREAM_ENABLED = os.getenv("LOG_STREAM_ENABLED", "false").lower() == "true"
+LOG_STREAM_PREFIX = os.getenv("LOG_STREAM_PREFIX", "logs:")
+LOG_STREAM_BATCH_BYTES = int(os.getenv("LOG_STREAM_BATCH_BYTES", 16 * 1024))
+LOG_STREAM_FLUSH_MS = int(os.getenv("LOG_STREAM_FLUSH_MS", 250))
+LOG_STREAM_MAXLEN = int(os.getenv("LOG_STREAM_MAXLEN", 1000))
+LOG_STREAM_TTL_SECONDS = int(os.getenv("LOG_STREAM_TTL_SECONDS", 3600))
+
+# --- Micro-Batching ---
+# Functions uploaded with a batch size (batchMaxSize > 1) have messages for the
+# same code grouped for up to MICRO_BATCH_WINDOW_MS and run with one handler
+# call (Python runtime). MICRO_BATCH_MAX_SIZE caps the size a function may ask for.
+MICRO_BATCH_ENABLED = os.getenv("MICRO_BATCH_ENABLED", "true").lower() == "true"
+MICRO_BATCH_WINDOW_MS = int(os.getenv("MICRO_BATCH_WINDOW_MS", 20))
+MICRO_BATCH_MAX_SIZE = int(os.getenv("MICRO_BATCH_MAX_SIZE", 50))
 
 # --- AI Node Configuration ---
 AI_ENDPOINT = os.getenv("AI_ENDPOINT", "http://10.0.20.100:11434")
@@ -8,14 +8,80 @@ import tarfile
 import shlex
 import socket
 import shutil
+import signal
+import math
 from collections import deque
 from pathlib import Path
-from typing import Dict, Optional, List
+from typing import Dict, Iterable, Optional, List
+from prometheus_client import Counter, Gauge
 
 import config
+from cpu_sizing import CPU_PERIOD_US, cores_for_memory, cpu_limits
+from exec_multiplexer import ExecMultiplexer, ExecHandle
+from system_bundle import SYSTEM_DIR
+from usage_ledger import UsageLedger
+
+try:
+    import zstandard
+except ImportError:  # Optional: only needed for .tar.zst artifacts
+    zstandard = None
 
 logger = structlog.get_logger()
 
+ARCHIVE_STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Virtual extraction root used to validate streamed output paths
+_STREAM_ROOT = Path("/output-stream")
+
+# Empties the writable tmpfs mounts of a container that is reused for another
+# deployment. The read-only root filesystem needs no reset.
+_RESET_SCRIPT = (
+    "find /workspace /output /tmp -mindepth 1 -delete 2>/dev/null; "
+    "[ -z \"$(find /workspace /output /tmp -mindepth 1 | head -n 1)\" ]"
+)
+
+# Removes a root-owned read-only directory (the system files); run as root.
+# Without capabilities root needs write permission on it like anyone else.
+_REMOVE_READ_ONLY_DIR = '[ ! -d "$1" ] || chmod -R u+w "$1"; rm -rf "$1"'
+
+CONTAINER_RECYCLES = Counter(
+    'worker_container_recycles_total', 'Warm containers of superseded deployments', ['result']
+)
+CONTAINER_ACQUISITIONS = Counter(
+    'worker_container_acquisitions_total', 'Containers handed to invocations', ['pool', 'source']
+)
+WARM_POOL_SIZE = Gauge(
+    'worker_warm_pool_size', 'Idle containers in the generic warm pool', ['pool']
+)
+CONTAINER_CPU_CORES = Gauge(
+    'worker_container_cpu_cores', 'vCPUs granted by cpu.max to the last sized container', ['pool']
+)
+
+# Memory limit of idle warm containers until an invocation sizes them
+WARM_CONTAINER_MEMORY_MB = 1024
+
+
+class _ChunkStream(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks (an exec stream)."""
+    def __init__(self, first_chunk: bytes, chunks):
+        self._chunks = chunks
+        self._buffer = memoryview(first_chunk)
+
+    def readable(self):
+        return True
+
+    def readinto(self, target):
+        while not self._buffer:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buffer = memoryview(chunk)
+        size = min(len(target), len(self._buffer))
+        target[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+
+
 class ContainerManager:
     """
     Manages Docker container lifecycle, including creation, execution, and warm pools.
@@ -23,27 +89,49 @@ class ContainerManager:
     def __init__(self, docker_client=None):
         self.docker = docker_client or docker.from_env()
         
-        # Runtime-based Warm Pool (Generic)
-        self.pools = {
-            "python": deque(), "cpp": deque(), "nodejs": deque(), "go": deque()
-        }
+        # Runtime-based Warm Pool (Generic), one per runtime and image variant
+        self.pools = {runtime: deque() for runtime in config.DOCKER_IMAGES}
         
         # Artifact-specific Warm Pool (function + runtime + deployed S3 key).
         # A function ID survives code updates, so it is not a safe pool key by
         # itself: reusing it could execute an older deployment.
         self.function_pools = {}
+        # Latest deployment announced per (function, runtime). Its pool is
+        # pre-warmed ahead of traffic and survives invocations that still
+        # carry an older S3 key.
+        self.deployed_artifacts = {}
+        # Containers running invocations of a function that allows several
+        # per container (maxConcurrencyPerContainer), by function pool key,
+        # and the ledger that splits each one's resource counters
+        self.shared_containers = {}
+        self.usage_ledgers = {}
+
+        # Reset containers of superseded deployments, ready for new code of
+        # the same function, by (function_id, runtime). Preferred over the
+        # generic pool because they skip 'docker run'; never handed to
+        # another function, which must not inherit this one's filesystem.
+        self.recycled = {}
         
         # Locks
         self.function_pool_lock = threading.Lock()
-        self.pool_locks = {
-            k: threading.Lock() for k in ["python", "cpp", "nodejs", "go"]
-        }
+        self.pool_locks = {runtime: threading.Lock() for runtime in config.DOCKER_IMAGES}
         
         # Pre-pull images
         self._ensure_images()
         
         # PID Cache (Global)
         self.pid_cache = {}
+        # Container ID -> PIDs right after creation (init + idle command)
+        self.baseline_processes = {}
+
+        # One thread reads the output of every running invocation
+        self.exec_mux = ExecMultiplexer()
+
+        # Optional cpuset pinning: containers per host core, and each container's cores
+        self.cpu_pinning = config.CPU_PINNING_ENABLED and (os.cpu_count() or 1) >= config.CPU_PINNING_MIN_HOST_CORES
+        self.cpu_load = [0] * (os.cpu_count() or 1)
+        self.cpusets = {}
+        self.cpuset_lock = threading.Lock()
 
         # Initialize pools
         self._initialize_warm_pool()
@@ -56,17 +144,28 @@ class ContainerManager:
                 logger.debug(f"✓ Image ready: {img_name}")
             except docker.errors.ImageNotFound:
                 logger.info(f"📥 Pulling image: {img_name}")
-                self.docker.images.pull(img_name)
+                try:
+                    self.docker.images.pull(img_name)
+                except Exception as e:
+                    if runtime not in config.RUNTIME_VARIANTS:
+                        raise
+                    # A missing variant image only disables the variant; its
+                    # functions fall back to the base runtime pool.
+                    logger.error("Runtime variant image unavailable", variant=runtime, image=img_name, error=str(e))
+                    self.pools.pop(runtime, None)
 
     def _initialize_warm_pool(self):
         logger.info("🔥 Initializing Warm Pools", counts=config.WARM_POOL_SIZES)
         for runtime, count in config.WARM_POOL_SIZES.items():
+            if runtime not in self.pools:
+                continue
             for _ in range(count):
                 self._create_warm_container(runtime)
 
     def _create_warm_container(self, runtime: str) -> str:
         try:
             img = config.DOCKER_IMAGES.get(runtime)
+            cpu_quota, cpu_burst = cpu_limits(WARM_CONTAINER_MEMORY_MB)
             # Run infinite wait container
             c = self.docker.containers.run(
                 img, command="tail -f /dev/null", detach=True,
@@ -75,8 +174,9 @@ class ContainerManager:
                 init=True,
                 read_only=True,
                 network_mode="bridge",
-                mem_limit="1024m",
-                cpu_quota=100000,
+                mem_limit=f"{WARM_CONTAINER_MEMORY_MB}m",
+                cpu_period=CPU_PERIOD_US,
+                cpu_quota=cpu_quota,
                 user="65534:65534",
                 cap_drop=["ALL"],
                 security_opt=["no-new-privileges:true"],
@@ -87,13 +187,18 @@ class ContainerManager:
                     "/tmp": "rw,nosuid,nodev,exec,size=128m,mode=1777"
                 }
             )
+            self._set_cpu_burst(c.id, cpu_burst)
             c.pause()
             
             # Cache PID immediately (requires reload since 'run' might not populate attrs fully initially)
             c.reload()
             self.pid_cache[c.id] = c.attrs['State']['Pid']
+            baseline = self.get_process_ids(c)
+            if baseline is not None:
+                self.baseline_processes[c.id] = baseline
             
             self.pools[runtime].append(c.id)
+            WARM_POOL_SIZE.labels(pool=runtime).set(len(self.pools[runtime]))
             return c.id
         except Exception as e:
             logger.error("Failed to create warm container", runtime=runtime, error=str(e))
@@ -126,32 +231,209 @@ class ContainerManager:
             )
             return None
 
+    def resolve_pool(self, runtime: str) -> str:
+        """Return the pool serving runtime: itself, else its base runtime, else python."""
+        if runtime in self.pools:
+            return runtime
+        base_runtime = config.RUNTIME_VARIANTS.get(runtime)
+        return base_runtime if base_runtime in self.pools else "python"
+
     @staticmethod
     def _function_pool_key(function_id: str, runtime: str, artifact_id: str):
         return function_id, runtime, artifact_id
 
+    def mark_deployed(self, function_id: str, runtime: str, artifact_id: str):
+        """Record the newest deployment of a function (from a deploy event)."""
+        with self.function_pool_lock:
+            self.deployed_artifacts[(function_id, runtime)] = artifact_id
+
+    def function_pool_sizes(self, function_id: str, runtime: str) -> Dict[str, int]:
+        """Return the number of warm containers per artifact of a function."""
+        with self.function_pool_lock:
+            return {
+                key[2]: len(pool)
+                for key, pool in self.function_pools.items()
+                if key[0] == function_id and key[1] == runtime
+            }
+
     def _discard_stale_function_pools(self, function_id: str, runtime: str, artifact_id: str):
-        """Remove containers belonging to superseded deployments."""
+        """Retire containers belonging to superseded deployments.
+
+        They are reset in the background and handed out as recycled
+        containers, so a redeploy does not turn into a cold-start storm.
+        """
         active_key = self._function_pool_key(function_id, runtime, artifact_id)
         stale_containers = []
         with self.function_pool_lock:
+            deployed_key = self._function_pool_key(
+                function_id, runtime, self.deployed_artifacts.get((function_id, runtime))
+            )
             stale_keys = [
                 key for key in self.function_pools
-                if key[0] == function_id and key != active_key
+                if key[0] == function_id and key not in (active_key, deployed_key)
             ]
             for key in stale_keys:
-                stale_containers.extend(self.function_pools.pop(key))
+                stale_containers.extend(
+                    (container, function_id, key[1]) for container in self.function_pools.pop(key)
+                )
+
+        if stale_containers:
+            threading.Thread(
+                target=self._recycle_containers, args=(stale_containers,), daemon=True
+            ).start()
 
-        for stale in stale_containers:
-            self.discard_container(stale)
+    def _recycle_containers(self, containers):
+        """Reset (container, function_id, runtime) into the recycled pools, else remove them."""
+        for container, function_id, runtime in containers:
+            if runtime in self.pool_locks and self.reset_container(container):
+                with self.pool_locks[runtime]:
+                    kept = sum(len(queue) for key, queue in self.recycled.items() if key[1] == runtime)
+                    if kept < config.RECYCLED_POOL_MAX_SIZE:
+                        container.is_warm = False
+                        # Resized (and re-pinned) when it is acquired again
+                        self._release_cpuset(container.id)
+                        self.recycled.setdefault((function_id, runtime), deque()).append(container)
+                        CONTAINER_RECYCLES.labels(result="recycled").inc()
+                        continue
+            CONTAINER_RECYCLES.labels(result="discarded").inc()
+            self.discard_container(container)
+
+    def reset_container(self, container) -> bool:
+        """
+        Return a used container to its just-created state.
+
+        Kills every process that was not there right after creation and
+        empties /workspace, /output and /tmp. Returns False when the state
+        cannot be verified; such a container must be discarded.
+        """
+        baseline = self.baseline_processes.get(container.id)
+        current = self.get_process_ids(container)
+        if baseline is None or current is None:
+            return False
+
+        try:
+            self._kill_processes(current - baseline)
+            container.exec_run(["sh", "-c", _REMOVE_READ_ONLY_DIR, "sh", SYSTEM_DIR], user="0:0")
+            result = container.exec_run(["sh", "-c", _RESET_SCRIPT], user="65534:65534")
+            # The wiped /workspace no longer holds the system bundle.
+            container._system_bundle_hash = None
+            if result.exit_code != 0:
+                logger.warning("Container reset left files behind", container_id=container.id[:12])
+                return False
+        except Exception as e:
+            logger.warning("Container reset failed", container_id=container.id[:12], error=str(e))
+            return False
+
+        if self._wait_for_processes(container, baseline):
+            return True
+        logger.warning("Container processes survived reset", container_id=container.id[:12])
+        return False
+
+    def kill_invocation_processes(self, container, baseline: Optional[frozenset]) -> bool:
+        """
+        Stop a timed-out invocation without stopping its container.
+
+        The container is paused (cgroup freeze) so no process can fork while
+        the process list is read, every process missing from the
+        pre-invocation baseline gets SIGKILL, and the container is resumed so
+        Docker init reaps them. Returns True once only the baseline is left;
+        otherwise the container must be discarded.
+        """
+        if baseline is None:
+            return False
+        try:
+            container.pause()
+        except Exception as e:
+            logger.warning("Failed to freeze timed-out container", container_id=container.id[:12], error=str(e))
+            return False
+
+        killed = False
+        try:
+            current = self.get_process_ids(container)
+            if current is not None:
+                self._kill_processes(current - baseline)
+                killed = True
+        finally:
+            try:
+                container.unpause()
+            except Exception as e:
+                logger.warning("Failed to thaw container", container_id=container.id[:12], error=str(e))
+                killed = False
+
+        return killed and self._wait_for_processes(container, baseline)
+
+    def kill_exec_processes(self, container, exec_id: str) -> bool:
+        """
+        Stop a timed-out invocation in a shared container, leaving the others running.
+
+        The container is frozen while the exec's process tree (its process
+        and all descendants, by parent PID) is read and killed. Processes
+        the invocation detached from its tree cannot be attributed to it;
+        release_shared finds them when the container goes idle.
+        """
+        try:
+            root = self.docker.api.exec_inspect(exec_id).get("Pid")
+        except Exception as e:
+            logger.warning("Failed to inspect timed-out exec", exec_id=exec_id, error=str(e))
+            return False
+        if not root:
+            return False
+        try:
+            container.pause()
+        except Exception as e:
+            logger.warning("Failed to freeze timed-out container", container_id=container.id[:12], error=str(e))
+            return False
+
+        killed = False
+        try:
+            children = {}
+            for row in container.top(ps_args="-eo pid,ppid").get("Processes", []):
+                children.setdefault(int(row[1]), []).append(int(row[0]))
+            # Only PIDs listed for the container are killed; an exec that has
+            # already exited leaves nothing to do.
+            listed = {pid for pids in children.values() for pid in pids}
+            tree, stack = set(), [root] if root in listed else []
+            while stack:
+                pid = stack.pop()
+                if pid not in tree:
+                    tree.add(pid)
+                    stack.extend(children.get(pid, ()))
+            self._kill_processes(tree)
+            killed = True
+        except Exception as e:
+            logger.warning("Failed to kill timed-out invocation", container_id=container.id[:12], error=str(e))
+        finally:
+            try:
+                container.unpause()
+            except Exception as e:
+                logger.warning("Failed to thaw container", container_id=container.id[:12], error=str(e))
+                killed = False
+        return killed
+
+    @staticmethod
+    def _kill_processes(pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+
+    def _wait_for_processes(self, container, expected: frozenset, attempts: int = 10) -> bool:
+        """Killed processes disappear once Docker init has reaped them."""
+        for _ in range(attempts):
+            if self.get_process_ids(container) == expected:
+                return True
+            time.sleep(0.05)
+        return False
 
     def acquire_container(self, runtime: str, function_id: str = None, artifact_id: str = ""):
         """
         Acquire container with priority:
         1. Function-specific warm pool
-        2. Generic runtime pool
+        2. Recycled containers of the function's superseded deployments
+        3. Generic runtime pool
         """
-        target_runtime = runtime if runtime in self.pools else "python"
+        target_runtime = self.resolve_pool(runtime)
         
         # 1. Warm Pool Check
         if function_id:
@@ -165,19 +447,39 @@ class ContainerManager:
                     #     container.unpause()
                     # except Exception: pass
                     logger.info("⚡ Warm Start from function pool", function_id=function_id)
+                    CONTAINER_ACQUISITIONS.labels(pool=target_runtime, source="function").inc()
                     container.is_warm = True
                     return container
         
-        # 2. Generic Pool Check
+        # 2. Recycled Pool Check (reset containers of older deployments)
+        recycled = None
+        if function_id:
+            with self.pool_locks[target_runtime]:
+                queue = self.recycled.get((function_id, target_runtime))
+                if queue:
+                    recycled = queue.popleft()
+                    if not queue:
+                        del self.recycled[(function_id, target_runtime)]
+        if recycled is not None:
+            logger.info("♻️ Cold Start from recycled container", runtime=target_runtime)
+            CONTAINER_ACQUISITIONS.labels(pool=target_runtime, source="recycled").inc()
+            recycled.is_warm = False
+            return recycled
+
+        # 3. Generic Pool Check
         cid = None
+        source = "pool"
         with self.pool_locks[target_runtime]:
             if not self.pools[target_runtime]:
                 logger.warning("Pool empty, creating new container synchronously", runtime=target_runtime)
+                source = "created"
                 cid = self._create_warm_container(target_runtime)
                 if not cid: raise RuntimeError("Failed to create container")
             
             if self.pools[target_runtime]:
                 cid = self.pools[target_runtime].popleft()
+            remaining = len(self.pools[target_runtime])
+            WARM_POOL_SIZE.labels(pool=target_runtime).set(remaining)
                 
         if not cid: raise RuntimeError("Failed to acquire container")
 
@@ -187,15 +489,111 @@ class ContainerManager:
                 c.unpause()
             except Exception: pass
             logger.info("🥶 Cold Start from runtime pool", runtime=target_runtime)
+            CONTAINER_ACQUISITIONS.labels(pool=target_runtime, source=source).inc()
             
-            # Asynchronously replenish generic pool
-            self._replenish_pool(target_runtime)
+            # Asynchronously replenish the generic pool up to its configured size
+            if remaining < config.WARM_POOL_SIZES.get(target_runtime, 0):
+                self._replenish_pool(target_runtime)
             
             c.is_warm = False
             return c
         except Exception:
             return self.acquire_container(runtime, function_id, artifact_id)
 
+    def acquire_shared(self, runtime: str, function_id: str, artifact_id: str, max_concurrency: int,
+                       memory_mb: int):
+        """
+        Acquire a container for a function that allows several invocations per container.
+
+        Joins a running container of the same deployment that has a free
+        invocation slot and already has memory_mb, so a joining invocation
+        never resizes a container under the ones running in it. Otherwise a
+        container is acquired as usual, and share_container opens it to
+        other invocations once its workspace is ready.
+        """
+        target_runtime = self.resolve_pool(runtime)
+        pool_key = self._function_pool_key(function_id, target_runtime, artifact_id)
+        with self.function_pool_lock:
+            for container in self.shared_containers.get(pool_key, ()):
+                if (container.active_invocations < max_concurrency
+                        and getattr(container, "_mem_limit_mb", None) == memory_mb):
+                    container.active_invocations += 1
+                    CONTAINER_ACQUISITIONS.labels(pool=target_runtime, source="shared").inc()
+                    container.is_warm = True
+                    return container
+
+        container = self.acquire_container(runtime, function_id, artifact_id)
+        container.active_invocations = 1
+        container.shared_retired = False
+        with self.function_pool_lock:
+            self.usage_ledgers[container.id] = UsageLedger(lambda: self._usage_counters(container))
+        return container
+
+    def share_container(self, container, function_id: str, runtime: str, artifact_id: str = ""):
+        """Let further invocations of the deployment join a container that is ready to run it."""
+        pool_key = self._function_pool_key(function_id, runtime, artifact_id)
+        with self.function_pool_lock:
+            shared = self.shared_containers.setdefault(pool_key, [])
+            if not container.shared_retired and container not in shared:
+                shared.append(container)
+
+    def usage_ledger(self, container) -> UsageLedger:
+        with self.function_pool_lock:
+            return self.usage_ledgers[container.id]
+
+    def release_shared(self, container, function_id: str, runtime: str, artifact_id: str = "",
+                       reusable: bool = True):
+        """
+        End one invocation's use of a shared container.
+
+        A container that an invocation left unusable takes no new
+        invocations and is discarded once the others have finished. The
+        last invocation to leave returns the container to the function pool,
+        but only if no process beyond its creation baseline survived. Shared
+        invocations cannot tell their processes apart, so this is where
+        leftovers are caught.
+        """
+        pool_key = self._function_pool_key(function_id, runtime, artifact_id)
+        with self.function_pool_lock:
+            container.active_invocations -= 1
+            if not reusable:
+                container.shared_retired = True
+            remaining = container.active_invocations
+            if remaining == 0 or container.shared_retired:
+                shared = self.shared_containers.get(pool_key, [])
+                if container in shared:
+                    shared.remove(container)
+                if not shared:
+                    self.shared_containers.pop(pool_key, None)
+            if remaining == 0:
+                self.usage_ledgers.pop(container.id, None)
+        if remaining:
+            return
+
+        baseline = self.baseline_processes.get(container.id)
+        if container.shared_retired or baseline is None or self.get_process_ids(container) != baseline:
+            logger.warning("Shared container is not clean; discarding", container_id=container.id[:12])
+            self.discard_container(container)
+            return
+        self.release_container(container, function_id, runtime, artifact_id)
+
+    def _usage_counters(self, container):
+        """CPU (us), network rx/tx and disk read/write bytes of a container."""
+        return (
+            self.get_cgroup_cpu_usage(container.id),
+            *self.get_network_stats(container),
+            *self.get_disk_stats(container.id)
+        )
+
+    def remove_paths(self, container, paths: List[str]) -> bool:
+        """Delete per-invocation files from a container's tmpfs mounts."""
+        try:
+            result = container.exec_run(["rm", "-rf", "--", *paths], user="65534:65534")
+            return getattr(result, "exit_code", -1) == 0
+        except Exception as e:
+            logger.warning("Failed to remove invocation files", container_id=container.id[:12], error=str(e))
+            return False
+
     def release_container(self, container, function_id: str, runtime: str, artifact_id: str = ""):
         """Return container to function-specific pool."""
         try:
@@ -207,23 +605,20 @@ class ContainerManager:
                 pool = self.function_pools[pool_key]
                 
                 if len(pool) >= config.MAX_POOL_SIZE_PER_FUNC:
-                    oldest = pool.pop(0)
-                    try:
-                        oldest.remove(force=True)
-                    except Exception: pass
+                    self.discard_container(pool.pop(0))
                 
                 pool.append(container)
                 logger.info("♻️ Container recycled", function_id=function_id, pool_size=len(pool))
         except Exception as e:
             logger.warning("Failed to recycle container", error=str(e))
-            try:
-                container.remove(force=True)
-            except Exception: pass
+            self.discard_container(container)
 
     def discard_container(self, container):
         """Remove a container that failed before it became safe to reuse."""
         try:
             self.pid_cache.pop(container.id, None)
+            self.baseline_processes.pop(container.id, None)
+            self._release_cpuset(container.id)
             container.remove(force=True)
         except Exception as e:
             logger.warning("Failed to discard container", error=str(e))
@@ -236,11 +631,60 @@ class ContainerManager:
                 logger.error("Failed to replenish pool", error=str(e))
         threading.Thread(target=_create, daemon=True).start()
 
-    def update_resources(self, container, memory_mb: int):
+    def update_resources(self, container, memory_mb: int, pool: Optional[str] = None):
+        """Apply the memory limit and the CPU share (quota, burst, cpuset) it buys."""
+        cpu_quota, cpu_burst = cpu_limits(memory_mb)
+        limits = {
+            "mem_limit": f"{memory_mb}m",
+            "memswap_limit": f"{memory_mb}m",
+            "cpu_period": CPU_PERIOD_US,
+            "cpu_quota": cpu_quota
+        }
+        if self.cpu_pinning:
+            cores = self._assign_cpuset(container.id, math.ceil(cores_for_memory(memory_mb)))
+            limits["cpuset_cpus"] = ",".join(str(core) for core in cores)
+        # The kernel rejects a quota below the current burst, so the burst is
+        # cleared before the quota changes and set to its new value after.
+        self._set_cpu_burst(container.id, 0)
         try:
-            container.update(mem_limit=f"{memory_mb}m", memswap_limit=f"{memory_mb}m")
+            container.update(**limits)
         except Exception as e:
             logger.warning("Failed to update container resources", error=str(e))
+            # The container did not get the cores, so they must not count as taken
+            self._release_cpuset(container.id)
+            return
+        self._set_cpu_burst(container.id, cpu_burst)
+        CONTAINER_CPU_CORES.labels(pool=pool or "unknown").set(cpu_quota / CPU_PERIOD_US)
+
+    def _set_cpu_burst(self, container_id: str, burst_us: int):
+        """Write cpu.max.burst (Docker has no option for it yet)."""
+        path = config.CGROUP_PATH_CPU_MAX_BURST.format(container_id=container_id)
+        try:
+            if os.path.exists(path):
+                with open(path, "w") as f:
+                    f.write(str(burst_us))
+        except OSError as e:
+            logger.debug("Failed to set cpu.max.burst", container_id=container_id[:12], error=str(e))
+
+    def _assign_cpuset(self, container_id: str, count: int) -> List[int]:
+        """Give a container the `count` least-loaded host cores, replacing its previous set."""
+        with self.cpuset_lock:
+            self._release_cpuset_locked(container_id)
+            cores = sorted(range(len(self.cpu_load)), key=lambda core: (self.cpu_load[core], core))[:count]
+            for core in cores:
+                self.cpu_load[core] += 1
+            self.cpusets[container_id] = sorted(cores)
+            return self.cpusets[container_id]
+
+    def _release_cpuset(self, container_id: str):
+        """Return a container's cores to the pinning pool (on removal or re-sizing)."""
+        if self.cpu_pinning:
+            with self.cpuset_lock:
+                self._release_cpuset_locked(container_id)
+
+    def _release_cpuset_locked(self, container_id: str):
+        for core in self.cpusets.pop(container_id, ()):
+            self.cpu_load[core] -= 1
 
     def reset_cgroup_peak(self, container_id: str):
         try:
@@ -298,11 +742,78 @@ class ContainerManager:
             user="65534:65534"
         )
 
+    def stream_archive_to_container(self, container, archive_path: Path, target_path: str,
+                                    compression: Optional[str] = None):
+        """Extract a tar file into the container straight from disk.
+
+        Plain tars go from the file into the exec socket with sendfile(), so
+        the archive is never loaded into Python memory. zstd-compressed tars
+        are decompressed on the host in fixed-size chunks, because the
+        runtime images ship tar without zstd support.
+        """
+        archive_path = Path(archive_path)
+        if not archive_path.is_file():
+            raise FileNotFoundError(f"Container archive does not exist: {archive_path}")
+
+        def _send(raw_socket):
+            with open(archive_path, "rb") as archive:
+                if compression == "zstd":
+                    if zstandard is None:
+                        raise RuntimeError("zstd artifacts require the 'zstandard' package")
+                    reader = zstandard.ZstdDecompressor().stream_reader(archive)
+                    for chunk in iter(lambda: reader.read(ARCHIVE_STREAM_CHUNK_SIZE), b""):
+                        raw_socket.sendall(chunk)
+                elif hasattr(raw_socket, "sendfile"):
+                    raw_socket.sendfile(archive)
+                else:
+                    for chunk in iter(lambda: archive.read(ARCHIVE_STREAM_CHUNK_SIZE), b""):
+                        raw_socket.sendall(chunk)
+
+        self._run_extract_exec(container, target_path, "65534:65534", _send)
+
+    def install_system_files(self, container, archive_bytes: bytes, target_path: str = SYSTEM_DIR):
+        """Replace target_path with an in-memory tar, root-owned and read-only for the function user."""
+        script = _REMOVE_READ_ONLY_DIR + ' && mkdir "$1" && tar -xf - -C "$1" && chmod -R a-w "$1"'
+        self._run_stdin_exec(
+            container, ["sh", "-c", script, "sh", target_path], "0:0",
+            lambda raw_socket: raw_socket.sendall(archive_bytes), f"install system files into {target_path}"
+        )
+
     def _extract_archive_via_exec(self, container, archive_bytes: bytes, target_path: str, user: str):
+        self._run_extract_exec(
+            container, target_path, user, lambda raw_socket: raw_socket.sendall(archive_bytes)
+        )
+
+    def stream_file_to_container(self, container, chunks: Iterable[bytes], target_file: str):
+        """Write a single file in the container from an iterator of byte chunks.
+
+        The chunks go straight into the exec stdin (e.g. a claim-check payload
+        read from Redis or S3), so the file is never held in Worker memory
+        or written to host disk.
+        """
+        def _send(raw_socket):
+            for chunk in chunks:
+                if chunk:
+                    raw_socket.sendall(chunk)
+
+        self._run_stdin_exec(
+            container, ["sh", "-c", 'cat > "$1"', "sh", target_file], "65534:65534", _send,
+            f"write {target_file}"
+        )
+
+    def _run_extract_exec(self, container, target_path: str, user: str, send_archive):
+        """Run `tar -x` in the container and feed its stdin via send_archive(socket)."""
+        self._run_stdin_exec(
+            container, ["tar", "-xf", "-", "-C", target_path], user, send_archive,
+            f"extract archive into {target_path}"
+        )
+
+    def _run_stdin_exec(self, container, command: List[str], user: str, send, action: str):
+        """Run command in the container, feed its stdin via send(socket), and check its exit code."""
         api = self.docker.api
         created = api.exec_create(
             container.id,
-            ["tar", "-xf", "-", "-C", target_path],
+            command,
             stdin=True,
             stdout=True,
             stderr=True,
@@ -310,13 +821,13 @@ class ContainerManager:
         )
         exec_id = created.get("Id") if isinstance(created, dict) else created
         if not exec_id:
-            raise RuntimeError(f"Docker failed to create archive extraction exec for {target_path}")
+            raise RuntimeError(f"Docker failed to create exec to {action}")
 
         stream = api.exec_start(exec_id, socket=True)
         raw_socket = getattr(stream, "_sock", stream)
         output = bytearray()
         try:
-            raw_socket.sendall(archive_bytes)
+            send(raw_socket)
             raw_socket.shutdown(socket.SHUT_WR)
             while True:
                 chunk = raw_socket.recv(64 * 1024)
@@ -330,9 +841,39 @@ class ContainerManager:
         exit_code = inspection.get("ExitCode")
         if exit_code != 0:
             detail = bytes(output).decode("utf-8", errors="replace").strip()
-            raise RuntimeError(
-                f"Failed to extract archive into {target_path}: {detail or f'exit code {exit_code}'}"
-            )
+            raise RuntimeError(f"Failed to {action}: {detail or f'exit code {exit_code}'}")
+
+    def start_exec(self, container, command: List[str], environment: Dict[str, str], user: str,
+                   workdir: str, sink, timeout_seconds: float) -> ExecHandle:
+        """
+        Start an invocation command and hand its output socket to the exec
+        multiplexer. sink(view) receives stdout and stderr as they arrive.
+        """
+        api = self.docker.api
+        created = api.exec_create(
+            container.id,
+            command,
+            stdout=True,
+            stderr=True,
+            environment=environment,
+            workdir=workdir,
+            user=user
+        )
+        exec_id = created.get("Id") if isinstance(created, dict) else created
+        if not exec_id:
+            raise RuntimeError("Docker failed to create exec for invocation")
+        stream = api.exec_start(exec_id, socket=True)
+        return self.exec_mux.register(exec_id, stream, sink, timeout_seconds)
+
+    def exec_exit_code(self, exec_id: str, attempts: int = 20) -> int:
+        """Exit code of a finished exec (-1 if Docker does not report one)."""
+        for _ in range(attempts):
+            inspection = self.docker.api.exec_inspect(exec_id)
+            if not inspection.get("Running") and inspection.get("ExitCode") is not None:
+                return inspection["ExitCode"]
+            # The stream can close a moment before Docker records the exit.
+            time.sleep(0.01)
+        return -1
 
     def verify_files_readable(self, container, file_paths: List[str], user: str = "65534:65534"):
         """Fail if any required runtime file is missing or unreadable in a container."""
@@ -349,24 +890,36 @@ class ContainerManager:
             detail = output.decode("utf-8", errors="replace").strip() if isinstance(output, bytes) else str(output)
             raise RuntimeError(f"Required container files are unavailable: {detail or file_paths}")
 
+    def _open_output_archive_stream(self, container, source_path: str):
+        """Start a tar of source_path inside the container and return its chunk stream.
+
+        Docker get_archive cannot see files created inside a tmpfs when the
+        container rootfs is read-only, so the tar is created from inside the
+        namespace and its stdout is streamed back to the host instead. An
+        empty directory produces an empty stream: tar is not even started.
+        """
+        archive_result = container.exec_run(
+            ["sh", "-c", 'cd "$1" && [ -n "$(ls -A)" ] && exec tar -cf - . || true', "sh", source_path],
+            stream=True,
+            user="65534:65534"
+        )
+        output_stream = getattr(
+            archive_result,
+            "output",
+            archive_result[1] if isinstance(archive_result, tuple) else archive_result
+        )
+        return (chunk for chunk in output_stream if chunk)
+
     def copy_from_container(self, container, source_path: str, target_local_path: Path):
         temp_tar = target_local_path / "temp_output.tar"
         try:
-            # Docker get_archive cannot see files created inside a tmpfs when
-            # the container rootfs is read-only. Create the tar from inside
-            # the namespace and stream its stdout back to the host instead.
-            archive_result = container.exec_run(
-                ["tar", "-cf", "-", "-C", source_path, "."],
-                stream=True,
-                user="65534:65534"
-            )
-            output_stream = getattr(
-                archive_result,
-                "output",
-                archive_result[1] if isinstance(archive_result, tuple) else archive_result
-            )
+            chunks = self._open_output_archive_stream(container, source_path)
+            first_chunk = next(chunks, None)
+            if first_chunk is None:
+                return
             with open(temp_tar, "wb") as f:
-                for chunk in output_stream:
+                f.write(first_chunk)
+                for chunk in chunks:
                     f.write(chunk)
             with tarfile.open(temp_tar, mode='r') as tar:
                 self._extract_output_tar_safely(tar, target_local_path)
@@ -378,22 +931,60 @@ class ContainerManager:
             except OSError:
                 pass
 
+    def stream_from_container(self, container, source_path: str, handle_file) -> List[Dict]:
+        """
+        Single-pass alternative to copy_from_container.
+
+        Consumes the exec tar stream once, applies the same member rules as
+        _extract_output_tar_safely, and hands each regular file to
+        handle_file(relative_path, fileobj, size) without touching host disk.
+        The file object is only valid during the call. Returns the non-None
+        values returned by handle_file.
+        """
+        results = []
+        chunks = self._open_output_archive_stream(container, source_path)
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            return results
+
+        raw = _ChunkStream(first_chunk, chunks)
+        with tarfile.open(fileobj=io.BufferedReader(raw, 1024 * 1024), mode="r|") as archive:
+            for member in archive:
+                destination = self._validate_output_member(member, _STREAM_ROOT)
+                if member.isdir():
+                    continue
+                source = archive.extractfile(member)
+                if source is None:
+                    raise ValueError(f"Unreadable output entry: {member.name}")
+                relative_path = destination.relative_to(_STREAM_ROOT).as_posix()
+                with source:
+                    result = handle_file(relative_path, source, member.size)
+                if result is not None:
+                    results.append(result)
+        return results
+
+    @staticmethod
+    def _validate_output_member(member: tarfile.TarInfo, root: Path) -> Path:
+        """Return the destination of a tar member, rejecting unsafe entries."""
+        destination = (root / member.name).resolve()
+        try:
+            destination.relative_to(root)
+        except ValueError as exc:
+            raise ValueError(f"Unsafe output path: {member.name}") from exc
+
+        if not member.isdir() and not member.isfile():
+            raise ValueError(f"Unsupported output entry: {member.name}")
+        return destination
+
     @staticmethod
     def _extract_output_tar_safely(archive: tarfile.TarFile, target_dir: Path):
         """Extract regular files/directories without trusting user tar metadata."""
         root = Path(target_dir).resolve()
         for member in archive.getmembers():
-            destination = (root / member.name).resolve()
-            try:
-                destination.relative_to(root)
-            except ValueError as exc:
-                raise ValueError(f"Unsafe output path: {member.name}") from exc
-
+            destination = ContainerManager._validate_output_member(member, root)
             if member.isdir():
                 destination.mkdir(parents=True, exist_ok=True)
                 continue
-            if not member.isfile():
-                raise ValueError(f"Unsupported output entry: {member.name}")
 
             destination.parent.mkdir(parents=True, exist_ok=True)
             source = archive.extractfile(member)
@@ -0,0 +1,34 @@
+"""
+CPU allocation proportional to memory (Lambda-style).
+
+An invocation's memory setting buys CPU_MB_PER_VCPU MB per vCPU, granted as
+a cgroup v2 cpu.max quota per CPU_PERIOD_US period. cpu.max.burst lets a
+short handler spend quota it left unused in earlier periods.
+"""
+import os
+
+import config
+
+# cpu.max period (Docker's default CFS period)
+CPU_PERIOD_US = 100000
+# Smallest quota the kernel accepts
+MIN_QUOTA_US = 1000
+
+
+def max_cores() -> float:
+    """Upper bound for one container: CPU_MAX_CORES or the host size, if smaller."""
+    return min(config.CPU_MAX_CORES, float(os.cpu_count() or 1))
+
+
+def cores_for_memory(memory_mb: int) -> float:
+    """vCPUs granted to a container with memory_mb of memory."""
+    cores = memory_mb / config.CPU_MB_PER_VCPU
+    return round(min(max(cores, config.CPU_MIN_CORES), max_cores()), 3)
+
+
+def cpu_limits(memory_mb: int):
+    """Return (cpu.max quota, cpu.max.burst) in microseconds per CPU_PERIOD_US."""
+    quota = max(MIN_QUOTA_US, int(cores_for_memory(memory_mb) * CPU_PERIOD_US))
+    # The kernel rejects a burst larger than the quota.
+    burst = int(quota * min(max(config.CPU_BURST_RATIO, 0.0), 1.0))
+    return quota, burst
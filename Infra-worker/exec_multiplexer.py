@@ -0,0 +1,258 @@
+import math
+import selectors
+import socket
+import threading
+import time
+import structlog
+from collections import deque
+from typing import Callable, List, Optional, Tuple
+from prometheus_client import Counter, Gauge
+
+import config
+
+logger = structlog.get_logger()
+
+EXEC_STREAMS_ACTIVE = Gauge(
+    'worker_exec_streams_active', 'Invocation exec streams owned by the I/O multiplexer'
+)
+EXEC_STREAMS_FINISHED = Counter(
+    'worker_exec_streams_total', 'Invocation exec streams by outcome', ['outcome']
+)
+
+# Docker frame header: stream type (1 byte), 3 padding bytes, payload size (uint32 BE)
+FRAME_HEADER_SIZE = 8
+STDOUT, STDERR = 1, 2
+
+RECV_BUFFER_SIZE = 256 * 1024
+
+OUTCOME_EOF = "eof"
+OUTCOME_TIMEOUT = "timeout"
+OUTCOME_ERROR = "error"
+
+
+class DockerStreamDemuxer:
+    """
+    Incremental parser for the framing of non-TTY Docker exec streams.
+
+    feed() returns (stream type, payload view) pairs that point into the data
+    passed in, so payload bytes are never buffered or copied here. Only a
+    header split across reads is kept (at most 8 bytes).
+    """
+    def __init__(self):
+        self._header = bytearray()
+        self._stream = STDOUT
+        self._remaining = 0
+
+    def feed(self, data) -> List[Tuple[int, memoryview]]:
+        view = memoryview(data)
+        pieces = []
+        pos = 0
+        while pos < len(view):
+            if self._remaining == 0:
+                part = view[pos:pos + FRAME_HEADER_SIZE - len(self._header)]
+                self._header += part
+                pos += len(part)
+                if len(self._header) < FRAME_HEADER_SIZE:
+                    break
+                self._stream = self._header[0]
+                self._remaining = int.from_bytes(self._header[4:8], "big")
+                self._header.clear()
+                continue
+            size = min(self._remaining, len(view) - pos)
+            pieces.append((self._stream, view[pos:pos + size]))
+            pos += size
+            self._remaining -= size
+        return pieces
+
+
+class TimerWheel:
+    """
+    Hashed timing wheel for invocation deadlines.
+
+    Scheduling and cancelling are O(1); advance() only looks at the slots of
+    the ticks that passed, so the cost per tick does not grow with the number
+    of running invocations. Deadlines further out than one revolution stay in
+    their slot until their round comes.
+    """
+    def __init__(self, tick_seconds: float, slots: int):
+        self.tick = tick_seconds
+        self.slots = [set() for _ in range(slots)]
+        self._last_tick = int(time.monotonic() / tick_seconds)
+
+    def schedule(self, item, deadline: float):
+        """Add item (with a .deadline attribute) and remember its slot on it."""
+        item.deadline = deadline
+        # Round up: the slot's tick must not start before the deadline, or the
+        # item would be skipped and only expire a full revolution later.
+        tick = max(math.ceil(deadline / self.tick), self._last_tick + 1)
+        item.timer_slot = tick % len(self.slots)
+        self.slots[item.timer_slot].add(item)
+
+    def cancel(self, item):
+        slot = getattr(item, "timer_slot", None)
+        if slot is not None:
+            self.slots[slot].discard(item)
+            item.timer_slot = None
+
+    def advance(self, now: float) -> list:
+        """Return the items whose deadline passed since the last call."""
+        current = int(now / self.tick)
+        if current <= self._last_tick:
+            return []
+        ticks = min(current - self._last_tick, len(self.slots))
+        expired = []
+        for offset in range(1, ticks + 1):
+            slot = self.slots[(self._last_tick + offset) % len(self.slots)]
+            for item in [item for item in slot if item.deadline <= now]:
+                slot.discard(item)
+                item.timer_slot = None
+                expired.append(item)
+        self._last_tick = current
+        return expired
+
+
+class ExecHandle:
+    """A running invocation exec stream; wait() returns once it has finished."""
+    def __init__(self, exec_id: str, stream, sink: Callable):
+        self.exec_id = exec_id
+        self.stream = stream
+        self.socket = getattr(stream, "_sock", stream)
+        self.sink = sink
+        self.demuxer = DockerStreamDemuxer()
+        self.outcome: Optional[str] = None
+        self.deadline = None
+        self.timer_slot = None
+        self._done = threading.Event()
+
+    @property
+    def timed_out(self) -> bool:
+        return self.outcome == OUTCOME_TIMEOUT
+
+    def wait(self, timeout: float = None) -> bool:
+        return self._done.wait(timeout)
+
+
+class ExecMultiplexer:
+    """
+    Owns the exec output sockets of all running invocations on one thread.
+
+    Sockets are watched with a selector (epoll on Linux). Each readable
+    socket is read into one shared buffer, demultiplexed from Docker's frame
+    format and handed to the invocation's sink (stdout and stderr alike),
+    which must copy what it keeps. Deadlines live in a timer wheel; an
+    expired invocation's socket is closed and its handle marked as timed
+    out, and the waiting executor thread stops the container. The Worker's
+    thread count therefore does not grow with concurrent invocations.
+    """
+    def __init__(self, tick_seconds: float = None, slots: int = None):
+        self.wheel = TimerWheel(
+            tick_seconds or config.EXEC_TIMER_TICK_MS / 1000.0, slots or config.EXEC_TIMER_SLOTS
+        )
+        self._selector = selectors.DefaultSelector()
+        self._handles = set()
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._buffer = bytearray(RECV_BUFFER_SIZE)
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ, None)
+        EXEC_STREAMS_ACTIVE.set_function(lambda: len(self._handles))
+        self._thread = threading.Thread(target=self._run, name="exec-mux", daemon=True)
+        self._thread.start()
+
+    def register(self, exec_id: str, stream, sink: Callable, timeout_seconds: float) -> ExecHandle:
+        """Start watching an exec stream; sink(view) receives its output."""
+        handle = ExecHandle(exec_id, stream, sink)
+        handle.deadline = time.monotonic() + timeout_seconds
+        handle.socket.setblocking(False)
+        with self._lock:
+            self._pending.append(handle)
+        self._wake()
+        return handle
+
+    def _wake(self):
+        try:
+            self._wakeup_writer.send(b"\0")
+        except (BlockingIOError, InterruptedError):
+            pass  # A wakeup is already pending
+
+    def _run(self):
+        while True:
+            try:
+                self._step()
+            except Exception as e:
+                logger.error("Exec multiplexer iteration failed", error=str(e))
+
+    def _step(self):
+        events = self._selector.select(self.wheel.tick if self._handles else None)
+        for key, _mask in events:
+            if key.data is None:
+                self._drain_wakeups()
+            else:
+                self._read(key.data)
+        self._add_pending()
+        for handle in self.wheel.advance(time.monotonic()):
+            self._finish(handle, OUTCOME_TIMEOUT)
+
+    def _drain_wakeups(self):
+        try:
+            while self._wakeup_reader.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+    def _add_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, deque()
+        for handle in pending:
+            try:
+                self._selector.register(handle.socket, selectors.EVENT_READ, handle)
+            except (ValueError, OSError) as e:
+                logger.warning("Failed to watch exec stream", exec_id=handle.exec_id, error=str(e))
+                handle.outcome = OUTCOME_ERROR
+                self._close(handle)
+                continue
+            self._handles.add(handle)
+            self.wheel.schedule(handle, handle.deadline)
+
+    def _read(self, handle: ExecHandle):
+        try:
+            size = handle.socket.recv_into(self._buffer)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as e:
+            logger.warning("Exec stream read failed", exec_id=handle.exec_id, error=str(e))
+            self._finish(handle, OUTCOME_ERROR)
+            return
+        if size == 0:
+            self._finish(handle, OUTCOME_EOF)
+            return
+        for _stream, payload in handle.demuxer.feed(memoryview(self._buffer)[:size]):
+            try:
+                handle.sink(payload)
+            except Exception as e:
+                logger.warning("Exec output sink failed", exec_id=handle.exec_id, error=str(e))
+
+    def _finish(self, handle: ExecHandle, outcome: str):
+        if handle not in self._handles:
+            return
+        self._handles.discard(handle)
+        self.wheel.cancel(handle)
+        try:
+            self._selector.unregister(handle.socket)
+        except (KeyError, ValueError, OSError):
+            pass
+        handle.outcome = outcome
+        EXEC_STREAMS_FINISHED.labels(outcome=outcome).inc()
+        self._close(handle)
+
+    @staticmethod
+    def _close(handle: ExecHandle):
+        try:
+            handle.stream.close()
+            if handle.socket is not handle.stream:
+                handle.socket.close()
+        except OSError:
+            pass
+        handle._done.set()
@@ -1,23 +1,64 @@
 import os
 import time
 import json
-import threading
 import structlog
 import socket
+import shutil
+import uuid
+import dataclasses
 from pathlib import Path
 from typing import List, Optional, Dict
+from prometheus_client import Counter
 
 import config
 from container_manager import ContainerManager
-from storage_adapter import StorageAdapter
+from storage_adapter import StorageAdapter, NODE_COMPILE_CACHE_DIR
 from metrics_collector import MetricsCollector
 from uploader import OutputUploader
+from reporting import ReportingPipeline
+from system_bundle import SystemBundle, SYSTEM_DIR
+from log_capture import LogCapture, LiveLogStream, LOG_SPILL_NAME
+import json_codec
 
 logger = structlog.get_logger()
 
 # --- Data Models ---
 from models import TaskMessage, ExecutionResult
 
+# Platform metadata written to /output by the runner and SDK
+RESERVED_OUTPUT_FILES = (".faas_runtime_metrics.json", ".llm_usage_stats.jsonl")
+
+# Handler result written by the SDK (RESULT_FILE), separate from the logs
+RESULT_FILE_NAME = ".faas_result"
+
+# Exit code reported for an invocation killed at its timeout (as with timeout(1))
+TIMEOUT_EXIT_CODE = 124
+
+# Container path of the input when it is too large for the PAYLOAD env var
+PAYLOAD_FILE = "/workspace/payload.json"
+
+# Accepted input content types (PAYLOAD_CONTENT_TYPE); the SDK hands binary
+# inputs to handlers as a memoryview and ndjson inputs as a record iterator
+PAYLOAD_CONTENT_TYPES = ("application/json", "application/x-ndjson", "application/octet-stream")
+
+# Starts the stdout of every request of a micro-batch, whose log is shared
+BATCH_LOG_HEADER = "[BATCH] Shared log of {count} batched requests\n"
+
+# Files that must be readable in /workspace before user code starts
+REQUIRED_FILES = {
+    "python": ["/workspace/main.py", f"{SYSTEM_DIR}/runner.py", f"{SYSTEM_DIR}/sdk.py"],
+    "nodejs": ["/workspace/index.js"],
+    "cpp": ["/workspace/main.cpp"],
+    "go": ["/workspace/main.go"]
+}
+
+PREWARMED_CONTAINERS = Counter(
+    'worker_prewarmed_containers_total', 'Containers pre-warmed for new deployments', ['runtime', 'result']
+)
+INVOCATION_TIMEOUTS = Counter(
+    'worker_invocation_timeouts_total', 'Timed-out invocations by how they were stopped', ['result']
+)
+
 class TaskExecutor:
     """
     Orchestrates the Function-as-a-Service execution flow:
@@ -33,7 +74,9 @@ class TaskExecutor:
                  container_manager: ContainerManager = None,
                  storage_adapter: StorageAdapter = None,
                  metrics_collector: MetricsCollector = None,
-                 uploader: OutputUploader = None):
+                 uploader: OutputUploader = None,
+                 reporter: ReportingPipeline = None,
+                 system_bundle: SystemBundle = None):
         
         self.cfg = config_dict or {}
         
@@ -47,24 +90,45 @@ class TaskExecutor:
             bucket_name=self.cfg.get("S3_USER_DATA_BUCKET", config.S3_USER_DATA_BUCKET),
             region=self.cfg.get("AWS_REGION", config.AWS_REGION)
         )
+        self.reporter = reporter or ReportingPipeline(self.metrics, self.uploader)
+        # Runner/SDK files, packed once and sent once per container
+        self.system_bundle = system_bundle or SystemBundle()
 
     def run(self, task: TaskMessage) -> ExecutionResult:
         start_time = time.time()
         container = None
         host_work_dir = None
         container_reusable = False
+        reporting_submitted = False
         
         acquired = self.metrics.global_limit.acquire(blocking=True, timeout=30)
         if not acquired:
             logger.error("Global container limit reached", request_id=task.request_id)
             return self._create_busy_response(task, start_time)
 
+        pool = task.runtime
+        # I/O-bound functions may run several invocations in one container;
+        # each then gets its own output directory and payload file.
+        max_concurrency = self._container_concurrency(task)
+        shared = max_concurrency > 1
+        invocation_id = uuid.uuid4().hex
+        output_path = f"/output/{invocation_id}" if shared else "/output"
+        payload_path = f"/workspace/payload-{invocation_id}.json" if shared else PAYLOAD_FILE
+        ledger = None
         try:
-            # Acquire Container
+            # Acquire Container (from the pool of the runtime or its image variant)
+            pool = self._select_pool(
+                task.function_id, task.runtime, task.s3_key, task.s3_bucket, task.runtime_variant
+            )
             try:
-                container = self.containers.acquire_container(
-                    task.runtime, task.function_id, task.s3_key
-                )
+                if shared:
+                    container = self.containers.acquire_shared(
+                        pool, task.function_id, task.s3_key, max_concurrency, task.memory_mb
+                    )
+                else:
+                    container = self.containers.acquire_container(
+                        pool, task.function_id, task.s3_key
+                    )
             except Exception as e:
                 logger.error("Failed to acquire container", error=str(e))
                 raise e
@@ -74,11 +138,12 @@ class TaskExecutor:
             # Resource Limits
             current_mem = getattr(container, "_mem_limit_mb", None)
             if not is_warm or current_mem != task.memory_mb:
-                self.containers.update_resources(container, task.memory_mb)
+                self.containers.update_resources(container, task.memory_mb, pool)
                 container._mem_limit_mb = task.memory_mb
 
             
             # Workspace Preparation
+            code_archive = None
             if is_warm:
                 logger.info("⚡ Warm Start: Skipping Host Workspace Prep", id=container.id[:12])
                 host_work_dir = Path(config.DOCKER_WORK_DIR_ROOT) / task.request_id
@@ -87,70 +152,100 @@ class TaskExecutor:
                 host_work_dir = self.storage.prepare_workspace(
                     task.request_id, task.function_id, task.s3_key, task.s3_bucket
                 )
-                self.storage.inject_dependencies(host_work_dir)
+                code_archive = self.storage.find_code_archive(host_work_dir)
 
             # Command & Payload Setup
             host_output_dir = host_work_dir / "output"
             host_output_dir.mkdir(parents=True, exist_ok=True)
             
-            payload_str = json.dumps(task.payload)
-            use_payload_file = len(payload_str) > 100 * 1024
+            # Large inputs (inline above 100 KB, or claim-check references)
+            # are delivered as a file instead of the PAYLOAD env var. The
+            # payload is serialised once, for both the size check and delivery.
+            payload_json = None if task.payload_ref else json_codec.dumps(task.payload)
+            use_payload_file = bool(task.payload_ref) or len(payload_json) > 100 * 1024
             
-            if use_payload_file:
-                with open(host_work_dir / "payload.json", "w") as f:
-                    f.write(payload_str)
-            
-            # Inject into Container
-            # Logic: If Cold Start OR Payload file needed, we copy.
-            if not is_warm or use_payload_file:
+            # Inject into Container (code only on cold start)
+            if not is_warm:
+                self._inject_dependency_layers(container, host_work_dir)
+            if code_archive is not None:
+                # Pre-built tar artifacts stream from disk into the exec socket.
+                self.containers.stream_archive_to_container(
+                    container, code_archive, "/workspace",
+                    compression="zstd" if code_archive.suffix == ".zst" else None
+                )
+            elif not is_warm:
                 self.containers.copy_to_container(container, host_work_dir, "/workspace")
+
+            # The payload file is streamed on its own, so it never forces a
+            # workspace copy on warm starts.
+            if use_payload_file:
+                payload_chunks = (
+                    self.storage.open_payload(task.payload_ref) if task.payload_ref
+                    else (payload_json,)
+                )
+                self.containers.stream_file_to_container(container, payload_chunks, payload_path)
             
-            # Inject System Files (Runner, SDK, AI Client) for Python
+            # Inject System Files (Runner, SDK, AI Client) for Python, once per container
             if task.runtime == "python":
                 self._inject_system_files(container)
 
-            required_files = {
-                "python": ["/workspace/main.py", "/workspace/runner.py", "/workspace/sdk.py"],
-                "nodejs": ["/workspace/index.js"],
-                "cpp": ["/workspace/main.cpp"],
-                "go": ["/workspace/main.go"]
-            }
             self.containers.verify_files_readable(
-                container,
-                required_files.get(task.runtime, required_files["python"])
+                container, REQUIRED_FILES.get(task.runtime, REQUIRED_FILES["python"])
             )
 
-            # Establish the trusted process baseline after setup commands have
-            # completed and before any user-controlled code starts.
-            baseline_processes = self.containers.get_process_ids(container)
-            
-            cmd, env_vars = self._build_command(task, use_payload_file)
-            
-            # Execute with Timeout
-            self.containers.reset_cgroup_peak(container.id)
-            
-            start_cpu = self.containers.get_cgroup_cpu_usage(container.id)
-            start_rx, start_tx = self.containers.get_network_stats(container)
-            start_dr, start_dw = self.containers.get_disk_stats(container.id)
-            
-            exit_code, output_bytes = self._execute_in_container(container, cmd, env_vars, task.timeout_ms, host_output_dir)
-            
-            # Metrics & Cleanup
-            end_cpu = self.containers.get_cgroup_cpu_usage(container.id)
-            end_rx, end_tx = self.containers.get_network_stats(container)
-            end_dr, end_dw = self.containers.get_disk_stats(container.id)
-            peak_memory = self.containers.get_cgroup_memory_peak(container.id)
-            
-            output_str = output_bytes.decode('utf-8', errors='replace')
+            cmd, env_vars = self._build_command(
+                task, use_payload_file, payload_json, output_path, payload_path
+            )
+
+            if shared:
+                # The workspace is ready: further invocations may join. Their
+                # processes cannot be told apart, so the per-invocation
+                # baseline is replaced by an idle check in release_shared.
+                self.containers.share_container(container, task.function_id, pool, task.s3_key)
+                ledger = self.containers.usage_ledger(container)
+                ledger.join(invocation_id)
+
+                exit_code, output_bytes = self._execute_in_container(
+                    container, cmd, env_vars, task.timeout_ms, host_output_dir, task.request_id,
+                    shared=True
+                )
+
+                # Counter growth split with the invocations running alongside;
+                # the memory peak is the container's (it cannot be split).
+                cpu_usage_us, net_rx, net_tx, disk_r, disk_w = ledger.leave(invocation_id)
+                peak_memory = self.containers.get_cgroup_memory_peak(container.id)
+            else:
+                # Establish the trusted process baseline after setup commands have
+                # completed and before any user-controlled code starts.
+                baseline_processes = self.containers.get_process_ids(container)
+
+                # Execute with Timeout
+                self.containers.reset_cgroup_peak(container.id)
+
+                start_cpu = self.containers.get_cgroup_cpu_usage(container.id)
+                start_rx, start_tx = self.containers.get_network_stats(container)
+                start_dr, start_dw = self.containers.get_disk_stats(container.id)
+
+                exit_code, output_bytes = self._execute_in_container(
+                    container, cmd, env_vars, task.timeout_ms, host_output_dir, task.request_id,
+                    baseline_processes
+                )
+
+                # Metrics & Cleanup
+                end_cpu = self.containers.get_cgroup_cpu_usage(container.id)
+                end_rx, end_tx = self.containers.get_network_stats(container)
+                end_dr, end_dw = self.containers.get_disk_stats(container.id)
+                peak_memory = self.containers.get_cgroup_memory_peak(container.id)
+
+                # Calculate Deltas
+                cpu_usage_us = max(0, end_cpu - start_cpu)
+                net_rx = max(0, end_rx - start_rx)
+                net_tx = max(0, end_tx - start_tx)
+                disk_r = max(0, end_dr - start_dr)
+                disk_w = max(0, end_dw - start_dw)
+
             duration_ms = int((time.time() - start_time) * 1000)
             
-            # Calculate Deltas
-            cpu_usage_us = max(0, end_cpu - start_cpu)
-            net_rx = max(0, end_rx - start_rx)
-            net_tx = max(0, end_tx - start_tx)
-            disk_r = max(0, end_dr - start_dr)
-            disk_w = max(0, end_dw - start_dw)
-            
             # Analysis
             metrics_data = {
                 "peak_memory": peak_memory,
@@ -164,42 +259,36 @@ class TaskExecutor:
             tip, savings, rec_mb = self.metrics.analyze_execution(metrics_data)
             
             # Retrieve Output Files
-            self.containers.copy_from_container(container, "/output", host_output_dir)
+            streamed_outputs = []
+            if config.OUTPUT_STREAMING_ENABLED:
+                streamed_outputs = self._stream_outputs(container, task, host_output_dir, output_path)
+            else:
+                self.containers.copy_from_container(container, output_path, host_output_dir)
+
+            if task.runtime == "nodejs" and not is_warm and exit_code == 0:
+                self._store_compile_cache(container, task)
 
             # Runtime metrics are platform metadata, not user output. Read and
             # remove the reserved file before output upload/listing.
             handler_duration_ms = self._read_handler_duration(host_output_dir)
+
+            # Small results are returned inline, large ones as an S3 reference.
+            result_body, result_ref = self._collect_result(task, host_output_dir, streamed_outputs)
             
             # Extract LLM Usage
             llm_tokens = self._read_llm_usage(host_output_dir)
 
-            # Docker init reaps exited children, while this comparison catches
-            # user processes that are still alive after the handler returns.
-            # Fail closed when inspection is unavailable: an unverified
-            # container must not cross invocation boundaries through the pool.
-            final_processes = self.containers.get_process_ids(container)
-            residual_processes = (
-                final_processes - baseline_processes
-                if baseline_processes is not None and final_processes is not None
-                else None
-            )
-            container_reusable = residual_processes == frozenset()
-            if residual_processes is None:
-                logger.warning(
-                    "Container process state could not be verified; discarding",
-                    container_id=container.id
-                )
-            elif residual_processes:
-                logger.warning(
-                    "Residual user processes detected; discarding container",
-                    container_id=container.id,
-                    process_ids=sorted(residual_processes)
-                )
+            if shared:
+                # Neighbours keep running, so only this invocation's files go
+                container_reusable = self.containers.remove_paths(container, [output_path, payload_path])
+            else:
+                container_reusable = self._verify_no_residual_processes(container, baseline_processes)
 
             # Background Upload & Reporting
             self._trigger_background_reporting(
                 task, peak_memory, host_output_dir, host_work_dir
             )
+            reporting_submitted = True
 
             cpu_util = (cpu_usage_us / 1000.0) / duration_ms if duration_ms > 0 else 0
 
@@ -208,8 +297,8 @@ class TaskExecutor:
                 function_id=task.function_id,
                 success=(exit_code == 0),
                 exit_code=exit_code,
-                stdout=output_str,
-                stderr="",
+                stdout=output_bytes,
+                stderr=f"Execution timed out after {task.timeout_ms}ms" if exit_code == TIMEOUT_EXIT_CODE else "",
                 duration_ms=duration_ms,
                 handler_duration_ms=handler_duration_ms,
                 worker_id=socket.gethostname(),
@@ -223,7 +312,9 @@ class TaskExecutor:
                 network_tx=net_tx,
                 disk_read=disk_r,
                 disk_write=disk_w,
-                output_files=[f.name for f in host_output_dir.glob("*")],
+                output_files=self._list_output_files(host_output_dir, streamed_outputs),
+                result=result_body,
+                result_ref=result_ref,
                 llm_token_count=llm_tokens
             )
 
@@ -234,47 +325,288 @@ class TaskExecutor:
                 function_id=task.function_id,
                 success=False,
                 exit_code=-1,
-                stdout="",
+                stdout=b"",
                 stderr=str(e),
                 duration_ms=int((time.time() - start_time) * 1000)
             )
         finally:
             self.metrics.global_limit.release()
+            # Failed invocations upload nothing, but their workspace still
+            # has to leave the host disk.
+            if host_work_dir is not None and not reporting_submitted:
+                self.reporter.schedule_cleanup(host_work_dir)
+            if ledger is not None:
+                ledger.leave(invocation_id)  # No-op unless the invocation failed mid-way
             # Reuse only containers that completed setup and execution safely.
-            if container:
+            if container and shared:
+                self.containers.release_shared(
+                    container, task.function_id, pool, task.s3_key, container_reusable
+                )
+            elif container:
                 if container_reusable:
                     self.containers.release_container(
-                        container, task.function_id, task.runtime, task.s3_key
+                        container, task.function_id, pool, task.s3_key
                     )
                 else:
                     self.containers.discard_container(container)
 
+    @staticmethod
+    def batch_key(task: TaskMessage) -> tuple:
+        """
+        Key of the micro-batch a task may join.
+
+        A batch runs with the settings of its first task, so only tasks that
+        agree on everything but payload, memory and timeout share one (e.g.
+        two callers asking for different models never do).
+        """
+        return (
+            task.function_id, task.s3_bucket, task.s3_key, task.runtime, task.runtime_variant,
+            task.model_id, tuple(sorted(task.env_vars.items()))
+        )
+
+    def run_batch(self, tasks: List[TaskMessage]) -> List[ExecutionResult]:
+        """
+        Run a micro-batch of invocations of one function with a single handler call.
+
+        The handler receives the list of events (in task order) and the
+        request ids as context["batch_request_ids"], and must return a list
+        with one result per event. The combined result is split back into
+        one ExecutionResult per task; metrics and output files of the shared
+        execution are reported on every one of them, and the log with a
+        header marking it as the batch's shared output. Tasks with another
+        batch_key than the first are run as batches of their own.
+        """
+        groups = {}
+        for task in tasks:
+            groups.setdefault(self.batch_key(task), []).append(task)
+        if len(groups) > 1:
+            results = {}
+            for group in groups.values():
+                for task, result in zip(group, self.run_batch(group)):
+                    results[task.request_id] = result
+            return [results[task.request_id] for task in tasks]
+
+        if len(tasks) == 1:
+            return [self.run(tasks[0])]
+        lead = tasks[0]
+        batch_task = dataclasses.replace(
+            lead,
+            memory_mb=max(task.memory_mb for task in tasks),
+            timeout_ms=max(task.timeout_ms for task in tasks),
+            payload=[task.payload for task in tasks],
+            batch_request_ids=[task.request_id for task in tasks]
+        )
+        return self._split_batch_result(tasks, self.run(batch_task))
+
+    @staticmethod
+    def _split_batch_result(tasks: List[TaskMessage], result: ExecutionResult) -> List[ExecutionResult]:
+        items = None
+        if result.success and result.result is not None:
+            try:
+                items = json_codec.loads(result.result)
+            except ValueError:
+                items = None
+            if not isinstance(items, list) or len(items) != len(tasks):
+                items = None
+
+        success, stderr = result.success, result.stderr
+        if success and items is None and result.result_ref is None:
+            success = False
+            stderr = f"Batch handler must return a list with one result per event ({len(tasks)})"
+
+        # One log for the whole batch: say so rather than pass it off as the request's own
+        header = BATCH_LOG_HEADER.format(count=len(tasks)).encode()
+        stdout = bytearray(len(header) + len(result.stdout))
+        stdout[:len(header)] = header
+        stdout[len(header):] = result.stdout
+
+        split = []
+        for index, task in enumerate(tasks):
+            body = None
+            if items is not None:
+                item = items[index]
+                # Same rendering as the SDK: strings as is, anything else as JSON
+                body = item if isinstance(item, str) else json_codec.dumps(item).decode("utf-8")
+            split.append(dataclasses.replace(
+                result,
+                request_id=task.request_id,
+                function_id=task.function_id,
+                success=success,
+                stdout=stdout,
+                stderr=stderr,
+                output_files=list(result.output_files),
+                result=body,
+                # A result too large to inline stays one S3 object for the batch
+                result_ref=dict(result.result_ref, batchIndex=index) if result.result_ref else None
+            ))
+        return split
+
+    def _verify_no_residual_processes(self, container, baseline_processes: Optional[frozenset]) -> bool:
+        # Docker init reaps exited children, while this comparison catches
+        # user processes that are still alive after the handler returns.
+        # Fail closed when inspection is unavailable: an unverified
+        # container must not cross invocation boundaries through the pool.
+        final_processes = self.containers.get_process_ids(container)
+        residual_processes = (
+            final_processes - baseline_processes
+            if baseline_processes is not None and final_processes is not None
+            else None
+        )
+        if residual_processes is None:
+            logger.warning(
+                "Container process state could not be verified; discarding",
+                container_id=container.id
+            )
+        elif residual_processes:
+            logger.warning(
+                "Residual user processes detected; discarding container",
+                container_id=container.id,
+                process_ids=sorted(residual_processes)
+            )
+        return residual_processes == frozenset()
+
+    @staticmethod
+    def _container_concurrency(task: TaskMessage) -> int:
+        """Invocations of the task's function that may share a container (1: exclusive)."""
+        # The per-invocation output directory and payload file are honoured
+        # by the Python runner and SDK only.
+        if task.runtime != "python":
+            return 1
+        return max(1, min(task.max_concurrency_per_container, config.CONTAINER_MAX_CONCURRENCY))
+
+    def prewarm(self, function_id: str, runtime: str, s3_key: str,
+                s3_bucket: Optional[str] = None, memory_mb: int = 128,
+                runtime_variant: Optional[str] = None) -> int:
+        """
+        Prepare a new deployment before its first invocation.
+
+        Fetches the artifact into the local caches, then fills the function
+        pool of the new S3 key with as many containers as the function keeps
+        warm for its previous deployments (capped at MAX_POOL_SIZE_PER_FUNC).
+        Containers are only taken while the Worker has spare capacity, so
+        pre-warming never delays invocations. Returns the number created.
+        """
+        self.storage.prefetch(function_id, s3_key, s3_bucket)
+        pool = self._select_pool(function_id, runtime, s3_key, s3_bucket, runtime_variant)
+        self.containers.mark_deployed(function_id, pool, s3_key)
+
+        pool_sizes = self.containers.function_pool_sizes(function_id, pool)
+        warm_count = sum(size for artifact_id, size in pool_sizes.items() if artifact_id != s3_key)
+        missing = min(warm_count, config.MAX_POOL_SIZE_PER_FUNC) - pool_sizes.get(s3_key, 0)
+
+        created = 0
+        for _ in range(max(0, missing)):
+            if not self.metrics.global_limit.acquire(blocking=False):
+                logger.info("Pre-warm stopped: Worker at capacity", function_id=function_id)
+                break
+            container = None
+            host_work_dir = None
+            ready = False
+            try:
+                container = self.containers.acquire_container(pool)
+                self.containers.update_resources(container, memory_mb, pool)
+                container._mem_limit_mb = memory_mb
+
+                host_work_dir = self.storage.prepare_workspace(
+                    f"prewarm-{uuid.uuid4().hex}", function_id, s3_key, s3_bucket
+                )
+                code_archive = self.storage.find_code_archive(host_work_dir)
+                self._inject_dependency_layers(container, host_work_dir)
+                if code_archive is not None:
+                    self.containers.stream_archive_to_container(
+                        container, code_archive, "/workspace",
+                        compression="zstd" if code_archive.suffix == ".zst" else None
+                    )
+                else:
+                    self.containers.copy_to_container(container, host_work_dir, "/workspace")
+                if runtime == "python":
+                    self._inject_system_files(container)
+                self.containers.verify_files_readable(
+                    container, REQUIRED_FILES.get(runtime, REQUIRED_FILES["python"])
+                )
+                ready = True
+            except Exception as e:
+                logger.warning("Failed to pre-warm container", function_id=function_id, error=str(e))
+            finally:
+                self.metrics.global_limit.release()
+                if host_work_dir is not None:
+                    self.reporter.schedule_cleanup(host_work_dir)
+                if container is not None:
+                    if ready:
+                        self.containers.release_container(container, function_id, pool, s3_key)
+                    else:
+                        self.containers.discard_container(container)
+            PREWARMED_CONTAINERS.labels(runtime=pool, result="ready" if ready else "failed").inc()
+            if not ready:
+                break
+            created += 1
+
+        logger.info("🔥 Deployment pre-warmed", function_id=function_id, containers=created)
+        return created
+
     def _create_busy_response(self, task, start_time):
         return ExecutionResult(
             request_id=task.request_id,
             function_id=task.function_id,
             success=False,
             exit_code=-1,
-            stdout="",
+            stdout=b"",
             stderr="Server Busy (503): Too many concurrent executions",
             duration_ms=int((time.time() - start_time) * 1000),
             worker_id=socket.gethostname()
         )
 
-    def _build_command(self, task: TaskMessage, use_payload_file: bool):
+    def _select_pool(self, function_id: str, runtime: str, s3_key: str,
+                     s3_bucket: Optional[str], declared_variant: Optional[str] = None) -> str:
+        """Return the warm pool for a function: a declared or detected image variant, else its runtime."""
+        variant = declared_variant
+        if not variant and config.RUNTIME_VARIANT_DETECTION:
+            try:
+                variant = self.storage.detect_runtime_variant(function_id, runtime, s3_key, s3_bucket)
+            except Exception as e:
+                logger.warning("Runtime variant detection failed", function_id=function_id, error=str(e))
+                variant = None
+        if variant and config.RUNTIME_VARIANTS.get(variant) != runtime:
+            logger.warning("Ignoring image variant of another runtime", function_id=function_id, variant=variant)
+            variant = None
+        return self.containers.resolve_pool(variant or runtime)
+
+    @staticmethod
+    def _payload_content_type(task: TaskMessage) -> str:
+        # Inline payloads travel inside the JSON task body, so only
+        # claim-check payloads can carry another content type.
+        content_type = task.payload_content_type if task.payload_ref else None
+        if content_type not in PAYLOAD_CONTENT_TYPES:
+            if content_type:
+                logger.warning("Unsupported payload content type", content_type=content_type)
+            return PAYLOAD_CONTENT_TYPES[0]
+        return content_type
+
+    def _build_command(self, task: TaskMessage, use_payload_file: bool,
+                       payload_json: Optional[bytes] = None, output_dir: str = "/output",
+                       payload_file: str = PAYLOAD_FILE):
         env_vars = {
             "JOB_ID": task.request_id,
             "FUNCTION_ID": task.function_id,
             "MEMORY_MB": str(task.memory_mb),
             "LLM_MODEL": task.model_id,
-            "OUTPUT_DIR": "/output",
+            "OUTPUT_DIR": output_dir,
             # Runtime and compiler caches must use writable tmpfs because the
             # container root filesystem is read-only.
             "HOME": "/tmp",
             "TMPDIR": "/tmp",
-            "AI_ENDPOINT": config.AI_ENDPOINT  # For faas_sdk
+            "AI_ENDPOINT": config.AI_ENDPOINT,  # For faas_sdk
+            # Result channel of the SDK, kept apart from stdout logs
+            "RESULT_FILE": f"{output_dir}/{RESULT_FILE_NAME}"
         }
         
+        if task.runtime == "python":
+            # User code, the SDK, and the dependency layer from requirements.txt (if any)
+            env_vars["PYTHONPATH"] = f"/workspace:{SYSTEM_DIR}:/workspace/.python_deps"
+        elif task.runtime == "nodejs":
+            # Injected on cold starts when stored for this artifact (Node >= 22.1)
+            env_vars["NODE_COMPILE_CACHE"] = f"/workspace/{NODE_COMPILE_CACHE_DIR}"
+
         # Merge user-defined environment variables
         if task.env_vars:
             for key, value in task.env_vars.items():
@@ -282,18 +614,24 @@ class TaskExecutor:
                 if key not in env_vars:
                     env_vars[key] = str(value)
         
+        env_vars["PAYLOAD_CONTENT_TYPE"] = self._payload_content_type(task)
+        if task.batch_request_ids:
+            env_vars["BATCH_REQUEST_IDS"] = ",".join(task.batch_request_ids)
         if use_payload_file:
-            env_vars["PAYLOAD_FILE"] = "/workspace/payload.json"
+            env_vars["PAYLOAD_FILE"] = payload_file
         else:
-            env_vars["PAYLOAD"] = json.dumps(task.payload)
+            if payload_json is None:
+                payload_json = json_codec.dumps(task.payload)
+            env_vars["PAYLOAD"] = payload_json.decode("utf-8")
 
-        setup_cmd = "mkdir -p /output && rm -rf /output/* 2>/dev/null || true"
+        # Also clear platform dotfiles (e.g. the result) left by a previous invocation
+        setup_cmd = f"mkdir -p {output_dir} && rm -rf {output_dir}/* {output_dir}/.faas_* 2>/dev/null || true"
         
         # Simple command builder (can be moved to a Factory if complex)
         cmd_str = ""
         if task.runtime == "python":
             # Use runner.py as the entry point to handle SDK logic purely
-            cmd_str = f"{setup_cmd} && python /workspace/runner.py"
+            cmd_str = f"{setup_cmd} && python {SYSTEM_DIR}/runner.py"
         elif task.runtime == "nodejs":
             cmd_str = f"{setup_cmd} && node /workspace/index.js"
         elif task.runtime == "cpp":
@@ -304,76 +642,137 @@ class TaskExecutor:
             
         return ["sh", "-c", cmd_str], env_vars
 
-    def _execute_in_container(self, container, cmd, env, timeout_ms, output_dir: Path):
-        result = {"exit_code": -1, "output": b""}
-        log_file = output_dir / "stdout.log"
-        
-        # Inject exit code capture into the command
-        final_cmd = cmd
-        if cmd[0] == "sh" and cmd[1] == "-c":
-             final_cmd = ["sh", "-c", f"{{ {cmd[2]} ; }} ; echo $? > /workspace/exit_code.txt"]
-
-        # Streaming execution (faster, may have occasional issues)
-        def _run_streaming():
-            try:
-                exec_result = container.exec_run(
-                    final_cmd,
-                    workdir="/workspace",
-                    environment=env,
-                    stream=True,
-                    user="65534:65534"
-                )
-                
-                # Handle both tuple (exit_code, generator) and just generator
-                if isinstance(exec_result, tuple):
-                    stream = exec_result[1]
-                else:
-                    stream = exec_result
-                
-                with open(log_file, "wb") as f:
-                    for chunk in stream:
-                        if chunk:
-                            f.write(chunk)
-            except Exception as e:
-                logger.error("Stream error", error=str(e))
-                with open(log_file, "wb") as f:
-                    f.write(f"[Stream Error] {str(e)}".encode())
-
-        t = threading.Thread(target=_run_streaming, daemon=True)
-        t.start()
-        t.join(timeout=timeout_ms / 1000.0)
-        
-        if t.is_alive():
+    def _execute_in_container(self, container, cmd, env, timeout_ms, output_dir: Path,
+                              request_id: Optional[str] = None,
+                              baseline_processes: Optional[frozenset] = None,
+                              shared: bool = False):
+        live = None
+        if config.LOG_STREAM_ENABLED and request_id and getattr(self.storage, "redis", None) is not None:
+            live = LiveLogStream(self.storage.redis, request_id)
+        # Bounded head + tail preview; only long logs reach the host disk (compressed)
+        capture = LogCapture(output_dir / LOG_SPILL_NAME, live=live)
+
+        # The exec multiplexer reads the output and enforces the deadline, so
+        # this thread only waits, waking up to write the log spill and send
+        # live log batches.
+        try:
+            handle = self.containers.start_exec(
+                container, cmd, env, "65534:65534", "/workspace", capture.write, timeout_ms / 1000.0
+            )
+        except Exception as e:
+            logger.error("Stream error", error=str(e))
+            capture.write(f"[Stream Error] {str(e)}".encode())
+            return -1, capture.close()
+
+        while not handle.wait(capture.drain_interval):
+            capture.drain()
+
+        if handle.timed_out:
+            capture.write(b"\n...[TIMEOUT]...")
+            if shared:
+                # Other invocations keep running: kill only this exec's
+                # processes, and retire the container if that fails.
+                if self.containers.kill_exec_processes(container, handle.exec_id):
+                    INVOCATION_TIMEOUTS.labels(result="reclaimed").inc()
+                    return TIMEOUT_EXIT_CODE, capture.close()
+                INVOCATION_TIMEOUTS.labels(result="retired").inc()
+                capture.close()
+                raise TimeoutError(f"Execution timed out after {timeout_ms}ms")
+            # Kill only the invocation's processes so the container stays warm.
+            if self.containers.kill_invocation_processes(container, baseline_processes):
+                INVOCATION_TIMEOUTS.labels(result="reclaimed").inc()
+                logger.warning("Invocation timed out; its processes were killed", container_id=container.id[:12])
+                return TIMEOUT_EXIT_CODE, capture.close()
+            INVOCATION_TIMEOUTS.labels(result="stopped").inc()
             try: container.stop(timeout=1)
             except: pass
-            # Give Docker's stream iterator a chance to close before the host
-            # workspace is cleaned up by the caller.
-            t.join(timeout=5)
-            with open(log_file, "ab") as f:
-                f.write(b"\n...[TIMEOUT]...")
+            capture.close()
             raise TimeoutError(f"Execution timed out after {timeout_ms}ms")
-            
-        # Read Exit Code
+
         try:
-            ec_out = container.exec_run(
-                "cat /workspace/exit_code.txt",
-                workdir="/workspace",
-                user="65534:65534"
+            exit_code = self.containers.exec_exit_code(handle.exec_id)
+        except Exception:
+            exit_code = -1 # exec not found or error
+
+        # Head and tail of the log for DynamoDB (Preview)
+        return exit_code, capture.close()
+
+    def _stream_outputs(self, container, task: TaskMessage, host_output_dir: Path,
+                        source_path: str = "/output") -> List[Dict]:
+        """Pipe /output straight from the container tar stream into S3.
+
+        Only the reserved platform files are written to host_output_dir so
+        they can be read as usual; user outputs never touch the host disk.
+        If the stream fails part-way, the files already uploaded are still
+        returned, so their S3 objects are listed in the result.
+        """
+        uploaded = []
+
+        def _handle_file(relative_path, fileobj, size):
+            if relative_path == RESULT_FILE_NAME and size <= config.RESULT_INLINE_MAX_BYTES:
+                with open(host_output_dir / relative_path, "wb") as f:
+                    shutil.copyfileobj(fileobj, f)
+                return None
+            if relative_path in RESERVED_OUTPUT_FILES and size <= config.MAX_OUTPUT_SIZE:
+                with open(host_output_dir / relative_path, "wb") as f:
+                    shutil.copyfileobj(fileobj, f)
+                return None
+            entry = self.uploader.upload_stream(
+                task.request_id, relative_path, fileobj, size, scope=task.function_id
             )
-            result["exit_code"] = int(ec_out.output.decode().strip())
-        except:
-            result["exit_code"] = -1 # content not found or error
-            
-        # Read Head of Log for DynamoDB (Preview)
+            if entry is not None:
+                uploaded.append(entry)
+            return entry
+
         try:
-            with open(log_file, "rb") as f:
-                result["output"] = f.read(config.MAX_OUTPUT_SIZE)
-                if os.path.getsize(log_file) > config.MAX_OUTPUT_SIZE:
-                     result["output"] += b"\n...[TRUNCATED: Full logs in S3]..."
-        except:
-            result["output"] = b""
+            return self.containers.stream_from_container(container, source_path, _handle_file)
+        except Exception as e:
+            logger.warning("Failed to stream outputs from container", error=str(e), uploaded=len(uploaded))
+            return uploaded
+
+    def _collect_result(self, task: TaskMessage, host_output_dir: Path,
+                        streamed_outputs: List[Dict]):
+        """
+        Return (inline result, result reference) for the SDK result channel.
+
+        Results up to RESULT_INLINE_MAX_BYTES are embedded in the execution
+        result; larger ones are uploaded to S3 and only their manifest entry
+        is returned, so they never travel through Redis pub/sub.
+        """
+        for entry in streamed_outputs:
+            if entry["path"] == RESULT_FILE_NAME:
+                # Already uploaded while streaming /output
+                streamed_outputs.remove(entry)
+                return None, entry
+
+        result_file = host_output_dir / RESULT_FILE_NAME
+        if not result_file.exists():
+            return None, None
+        try:
+            size = result_file.stat().st_size
+            if size <= config.RESULT_INLINE_MAX_BYTES:
+                return result_file.read_bytes().decode("utf-8", errors="replace"), None
+            with open(result_file, "rb") as f:
+                entry = self.uploader.upload_stream(
+                    task.request_id, RESULT_FILE_NAME, f, size, scope=task.function_id
+                )
+            if entry is None:
+                logger.warning("Failed to offload large result", request_id=task.request_id, size=size)
+            return None, entry
+        except OSError as e:
+            logger.warning("Failed to read result", request_id=task.request_id, error=str(e))
+            return None, None
+        finally:
+            result_file.unlink(missing_ok=True)
 
-        return result["exit_code"], result["output"]
+    @staticmethod
+    def _list_output_files(host_output_dir: Path, streamed_outputs: List[Dict]) -> List[str]:
+        names = [f.name for f in host_output_dir.glob("*")]
+        for entry in streamed_outputs:
+            top_level = entry["path"].split("/", 1)[0]
+            if top_level not in names:
+                names.append(top_level)
+        return names
 
     def _read_handler_duration(self, output_dir: Path):
         candidates = [
@@ -413,39 +812,33 @@ class TaskExecutor:
         return count
 
     def _trigger_background_reporting(self, task, peak_mem, host_out_dir, work_dir):
-        def _bg():
-            try:
-                self.metrics.cw.publish_peak_memory(task.function_id, task.runtime, peak_mem)
-                self.uploader.upload_outputs(task.request_id, str(host_out_dir))
-            except: pass
-            finally:
-                if work_dir.exists():
-                    try: shutil.rmtree(work_dir)
-                    except: pass
-        
-        threading.Thread(target=_bg, daemon=True).start()
+        # Bounded worker pools; may block briefly when the upload stage is saturated.
+        self.reporter.submit(task, peak_mem, host_out_dir, work_dir)
+
+    def _inject_dependency_layers(self, container, host_work_dir: Path):
+        """Extract the shared dependency layers and compile cache (if any) before the user code."""
+        layers = list(self.storage.find_dependency_layers(host_work_dir))
+        compile_cache = self.storage.find_compile_cache(host_work_dir)
+        if compile_cache is not None:
+            layers.append(compile_cache)
+        for layer in layers:
+            self.containers.stream_archive_to_container(container, layer, "/workspace")
+            # Keep the layer out of the workspace copy that follows.
+            layer.unlink()
+
+    def _store_compile_cache(self, container, task: TaskMessage):
+        """Keep the V8 compile cache written by the first cold start of a Node artifact."""
+        self.storage.store_compile_cache(
+            task.function_id, task.s3_key, task.s3_bucket,
+            lambda target: self.containers.copy_from_container(
+                container, f"/workspace/{NODE_COMPILE_CACHE_DIR}", target
+            )
+        )
 
     def _inject_system_files(self, container):
-        """Inject runner.py, sdk.py, and ai_client.py into container."""
-        import tempfile
-        import shutil
-
-        files_to_inject = {
-            "runner.py": Path(__file__).parent / "runner.py",
-            "sdk.py": Path(__file__).parent / "sdk.py",
-            "ai_client.py": Path(config.AI_SDK_PATH)
-        }
-        missing_files = [str(path) for path in files_to_inject.values() if not path.is_file()]
-        if missing_files:
-            raise FileNotFoundError(f"Worker system files are missing: {missing_files}")
-
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp_path = Path(tmpdir)
-            for filename, src_path in files_to_inject.items():
-                shutil.copy(src_path, tmp_path / filename)
-
-            self.containers.copy_to_container(container, tmp_path, "/workspace")
-            logger.debug(
-                f"System files injected: {len(files_to_inject)}",
-                container_id=container.id[:12]
-            )
+        """Send the system bundle unless the container already holds this version."""
+        if getattr(container, "_system_bundle_hash", None) == self.system_bundle.digest:
+            return
+        self.containers.install_system_files(container, self.system_bundle.archive)
+        container._system_bundle_hash = self.system_bundle.digest
+        logger.debug("System files injected", container_id=container.id[:12])
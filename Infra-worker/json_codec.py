@@ -0,0 +1,48 @@
+"""
+JSON encoding for the Worker's hot paths (task bodies, payloads, results).
+
+orjson is used when it is installed: it encodes straight to UTF-8 bytes, so
+a result is serialised once and handed to Redis without a str -> bytes
+copy. Without it the stdlib json module produces the same documents.
+
+orjson only handles 64-bit integers: it refuses to encode larger ones and
+parses them as floats, and it rejects NaN/Infinity. Documents it cannot
+represent exactly go through the stdlib module instead, so user payloads
+and results are never silently rounded.
+"""
+import json
+import re
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib encoder
+    orjson = None
+
+# Any run of 19+ digits may be an integer beyond orjson's 64-bit range
+# (digits inside strings or fractions only cost the stdlib fallback)
+_LONG_DIGITS = re.compile(rb"\d{19}")
+_LONG_DIGITS_STR = re.compile(r"\d{19}")
+
+
+def dumps(obj) -> bytes:
+    """Serialise obj to UTF-8 encoded JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+        except orjson.JSONEncodeError:
+            pass  # e.g. an integer beyond 64 bits; the stdlib decides
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data):
+    """Parse JSON from bytes, bytearray, memoryview or str."""
+    if orjson is not None:
+        pattern = _LONG_DIGITS_STR if isinstance(data, str) else _LONG_DIGITS
+        if not pattern.search(data):
+            try:
+                return orjson.loads(data)
+            except orjson.JSONDecodeError:
+                pass  # e.g. NaN; the stdlib accepts it or raises the same error type
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
@@ -0,0 +1,267 @@
+import gzip
+import threading
+import time
+import structlog
+from pathlib import Path
+from prometheus_client import Counter
+
+import config
+
+logger = structlog.get_logger()
+
+LOG_CAPTURED_BYTES = Counter(
+    'worker_log_captured_bytes_total', 'Function log bytes received from exec streams'
+)
+LOG_SPILLS = Counter(
+    'worker_log_spills_total', 'Logs spilled to a compressed file', ['result']
+)
+
+# Written to the output directory (and uploaded with it) when a log spills
+LOG_SPILL_NAME = "stdout.log.gz"
+
+# Placed between head and tail in the preview when bytes were left out
+TRUNCATION_MARKER = "\n...[TRUNCATED: {omitted} bytes omitted, full log in S3]...\n"
+SPILL_LIMIT_MARKER = b"\n...[LOG SPILL LIMIT REACHED]...\n"
+
+
+class RingBuffer:
+    """Fixed-size byte ring that keeps the most recent bytes written to it."""
+    def __init__(self, size: int):
+        self.size = size
+        self._buffer = bytearray(size)
+        self._start = 0
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def write(self, data):
+        view = memoryview(data)
+        if not self.size or not len(view):
+            return
+        if len(view) >= self.size:
+            self._buffer[:] = view[len(view) - self.size:]
+            self._start, self._length = 0, self.size
+            return
+        end = (self._start + self._length) % self.size
+        first = min(len(view), self.size - end)
+        self._buffer[end:end + first] = view[:first]
+        self._buffer[:len(view) - first] = view[first:]
+        overflow = self._length + len(view) - self.size
+        if overflow > 0:
+            self._start = (self._start + overflow) % self.size
+            self._length = self.size
+        else:
+            self._length += len(view)
+
+    def copy_into(self, target: bytearray, offset: int) -> int:
+        """Copy the buffered bytes, oldest first, into target at offset."""
+        source = memoryview(self._buffer)
+        first = min(self._length, self.size - self._start)
+        target[offset:offset + first] = source[self._start:self._start + first]
+        target[offset + first:offset + self._length] = source[:self._length - first]
+        return offset + self._length
+
+
+class LiveLogStream:
+    """
+    Batches log chunks into a Redis stream so running invocations can be tailed.
+
+    A batch is sent with XADD (MAXLEN ~ LOG_STREAM_MAXLEN) once it reaches
+    LOG_STREAM_BATCH_BYTES or LOG_STREAM_FLUSH_MS has passed. The stream
+    ends with an entry carrying "eof" (the total log size) and expires after
+    LOG_STREAM_TTL_SECONDS. Redis errors stop the live stream, never the
+    invocation.
+
+    append() only buffers; the owner sends ready batches with take() and
+    flush(), so no network I/O happens on the thread producing the log.
+    """
+    def __init__(self, redis_client, request_id: str, batch_bytes: int = None,
+                 flush_interval: float = None, maxlen: int = None, ttl_seconds: int = None):
+        self.redis = redis_client
+        self.key = f"{config.LOG_STREAM_PREFIX}{request_id}"
+        self.batch_bytes = batch_bytes or config.LOG_STREAM_BATCH_BYTES
+        self.flush_interval = (
+            flush_interval if flush_interval is not None else config.LOG_STREAM_FLUSH_MS / 1000.0
+        )
+        self.maxlen = maxlen or config.LOG_STREAM_MAXLEN
+        self.ttl = ttl_seconds or config.LOG_STREAM_TTL_SECONDS
+        self._batch = bytearray()
+        self._last_flush = time.monotonic()
+
+    def append(self, chunk):
+        if self.redis is not None:
+            self._batch += chunk
+
+    def ready(self) -> bool:
+        return bool(self._batch) and (len(self._batch) >= self.batch_bytes or self.due())
+
+    def take(self) -> bytes:
+        """Remove and return the buffered batch."""
+        batch = bytes(self._batch)
+        self._batch.clear()
+        return batch
+
+    def flush(self, batch: bytes = b"", fields: dict = None):
+        now = time.monotonic()
+        if self.redis is None or not (batch or fields):
+            self._last_flush = now
+            return
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            if batch:
+                pipe.xadd(self.key, {"data": batch}, maxlen=self.maxlen, approximate=True)
+            if fields:
+                pipe.xadd(self.key, fields, maxlen=self.maxlen, approximate=True)
+            pipe.expire(self.key, self.ttl)
+            pipe.execute()
+        except Exception as e:
+            logger.warning("Live log stream failed; disabling", key=self.key, error=str(e))
+            self.redis = None
+        self._last_flush = now
+
+    def due(self) -> bool:
+        return time.monotonic() - self._last_flush >= self.flush_interval
+
+
+class LogCapture:
+    """
+    Bounded in-memory capture of a function's log stream.
+
+    The first bytes are kept as the head and the most recent ones in a
+    ring-buffer tail (where errors usually are); together they make the
+    stdout preview, at most MAX_OUTPUT_SIZE bytes plus the marker. Only a
+    log that no longer fits the preview is spilled, gzip-compressed, to
+    LOG_SPILL_NAME in the output directory, capped at LOG_SPILL_MAX_MB of
+    raw log, so a chatty function cannot fill the host disk.
+
+    write() is the exec multiplexer's sink and only touches memory: bytes
+    to spill and live batches are queued, and drain() writes them out from
+    the executor thread every drain_interval and on close(). A slow disk
+    or Redis therefore never stalls the output of other invocations.
+    State is guarded by one lock; drain() holds a second one for its I/O.
+    """
+    def __init__(self, spill_path: Path, head_bytes: int = None, tail_bytes: int = None,
+                 spill_max_bytes: int = None, live: LiveLogStream = None):
+        tail_bytes = tail_bytes if tail_bytes is not None else min(config.LOG_TAIL_BYTES, config.MAX_OUTPUT_SIZE)
+        self.head_bytes = head_bytes if head_bytes is not None else config.MAX_OUTPUT_SIZE - tail_bytes
+        self.spill_path = Path(spill_path)
+        self.spill_max_bytes = (
+            spill_max_bytes if spill_max_bytes is not None else config.LOG_SPILL_MAX_MB * 1024 * 1024
+        )
+        self.live = live
+        self.drain_interval = config.LOG_SPILL_DRAIN_MS / 1000.0
+        if live is not None:
+            self.drain_interval = min(self.drain_interval, live.flush_interval)
+        self.total = 0
+        self._head = bytearray()
+        self._tail = RingBuffer(tail_bytes)
+        self._spilling = False
+        self._pending_spill = bytearray()
+        self._spill_queued = 0
+        self._spill = None
+        self._spill_capped = False
+        self._closed = False
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+
+    @property
+    def spilled(self) -> bool:
+        return self._spill is not None
+
+    def write(self, chunk):
+        with self._lock:
+            if self._closed or not chunk:
+                return
+            self.total += len(chunk)
+            LOG_CAPTURED_BYTES.inc(len(chunk))
+            if self.live is not None:
+                self.live.append(chunk)
+
+            view = memoryview(chunk)
+            room = self.head_bytes - len(self._head)
+            if room > 0:
+                self._head += view[:room]
+                view = view[room:]
+            if not len(view):
+                return
+            if (not self._spilling and not self._spill_capped
+                    and len(self._tail) + len(view) > self._tail.size):
+                # Start with everything captured so far
+                self._spilling = True
+                self._queue_spill(self._head)
+                tail = bytearray(len(self._tail))
+                self._tail.copy_into(tail, 0)
+                self._queue_spill(tail)
+            if self._spilling:
+                self._queue_spill(view)
+            self._tail.write(view)
+
+    def drain(self, final: bool = False):
+        """Write queued spill bytes and send a ready live batch (all of it when final)."""
+        with self._io_lock:
+            with self._lock:
+                pending, self._pending_spill = self._pending_spill, bytearray()
+                batch = None
+                if self.live is not None and (final or self.live.ready()):
+                    batch = self.live.take()
+            if pending:
+                self._write_spill(pending)
+            if batch is not None:
+                self.live.flush(batch)
+
+    def close(self) -> bytearray:
+        """Finish the capture and return the preview (head, marker, tail)."""
+        with self._lock:
+            if self._closed:
+                return bytearray()
+            self._closed = True
+        self.drain(final=True)
+        with self._io_lock:
+            if self._spill is not None:
+                try:
+                    self._spill.close()
+                except OSError as e:
+                    logger.warning("Failed to finish log spill", path=str(self.spill_path), error=str(e))
+                LOG_SPILLS.labels(result="capped" if self._spill_capped else "complete").inc()
+            if self.live is not None:
+                self.live.flush(fields={"eof": str(self.total)})
+
+        with self._lock:
+            omitted = self.total - len(self._head) - len(self._tail)
+            marker = TRUNCATION_MARKER.format(omitted=omitted).encode() if omitted > 0 else b""
+            preview = bytearray(len(self._head) + len(marker) + len(self._tail))
+            offset = len(self._head)
+            preview[:offset] = self._head
+            preview[offset:offset + len(marker)] = marker
+            self._tail.copy_into(preview, offset + len(marker))
+            self._head = bytearray()
+            return preview
+
+    def _queue_spill(self, data):
+        """Queue bytes for the spill file, up to spill_max_bytes (caller holds the lock)."""
+        if self._spill_capped:
+            return
+        room = self.spill_max_bytes - self._spill_queued
+        if len(data) > room:
+            self._pending_spill += data[:room]
+            self._pending_spill += SPILL_LIMIT_MARKER
+            self._spill_queued = self.spill_max_bytes
+            self._spill_capped = True
+            return
+        self._pending_spill += data
+        self._spill_queued += len(data)
+
+    def _write_spill(self, data):
+        """Append to the spill file, opening it on first use (caller holds the I/O lock)."""
+        try:
+            if self._spill is None:
+                self._spill = gzip.open(self.spill_path, "wb", compresslevel=config.LOG_SPILL_COMPRESSLEVEL)
+            self._spill.write(data)
+        except OSError as e:
+            logger.warning("Log spill write failed", path=str(self.spill_path), error=str(e))
+            with self._lock:
+                # Stop queueing: the rest of the log stays in the preview only
+                self._spilling = False
+                self._spill_capped = True
+                self._pending_spill = bytearray()
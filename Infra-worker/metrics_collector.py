@@ -2,13 +2,31 @@ import boto3
 import structlog
 import threading
 import os
+import sys
+import json
+import time
+from collections import Counter
 from datetime import datetime
 from typing import Tuple, Optional
+from prometheus_client import Counter as PromCounter, Histogram
 
 import config
+from cpu_sizing import cores_for_memory, max_cores
 
 logger = structlog.get_logger()
 
+# Self-observability of the CloudWatch pipeline (scraped from :8000/metrics)
+CW_FLUSH_DURATION = Histogram(
+    'worker_cloudwatch_flush_duration_seconds', 'Time spent flushing buffered CloudWatch metrics', ['mode']
+)
+CW_BATCH_SIZE = Histogram(
+    'worker_cloudwatch_batch_size', 'Datums per PutMetricData request (lines per EMF flush)',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+CW_DROPPED_POINTS = PromCounter(
+    'worker_cloudwatch_dropped_points_total', 'Datapoints dropped before reaching CloudWatch', ['reason']
+)
+
 class AutoTuner:
     @staticmethod
     def analyze(metrics: dict) -> Tuple[Optional[str], Optional[str], Optional[int]]:
@@ -36,12 +54,17 @@ class AutoTuner:
         if duration_ms > 0:
             cpu_util = (cpu_us / 1000.0) / duration_ms
             
+        # CPU is granted in proportion to memory (see cpu_sizing), so memory
+        # of a CPU-bound function is not waste.
+        allocated_cores = cores_for_memory(allocated_mb)
+        cpu_bound = cpu_util > 0.8 * allocated_cores
+
         tip = None
         rec_mb = None
         status = "optimal" # optimal, waste, risk
         
         # --- 1. Memory Analysis ---
-        if mem_ratio < 0.3:
+        if mem_ratio < 0.3 and not cpu_bound:
             # Resource Waste
             rec_mb = max(int(peak_mb * 2.0), 32) # 2x buffer, min 32MB
             if rec_mb < allocated_mb:
@@ -57,9 +80,13 @@ class AutoTuner:
 
         # --- 2. CPU / Performance Analysis ---
         cpu_msg = ""
-        if cpu_util > 0.8:
-            cpu_msg = "🚀 CPU Bound: High computation load. Increasing memory (CPU) may improve speed."
-        elif cpu_util < 0.2 and duration_ms > 500:
+        if cpu_bound:
+            if allocated_cores < max_cores():
+                cpu_msg = (f"🚀 CPU Bound: Using {cpu_util:.2f} of {allocated_cores:g} vCPU. "
+                           "Increasing memory adds CPU and may improve speed.")
+            else:
+                cpu_msg = f"🚀 CPU Bound: Already at the {allocated_cores:g} vCPU maximum."
+        elif cpu_util < 0.2 * allocated_cores and duration_ms > 500:
              # I/O Bound detection
              if net_bytes > 5 * 1024 * 1024:
                  cpu_msg = "🐢 I/O Bound: High network traffic detected. Consider async processing."
@@ -85,24 +112,177 @@ class AutoTuner:
         return tip, savings_str, rec_mb
 
 class CloudWatchPublisher:
-    def __init__(self, region):
-        self.client = boto3.client("cloudwatch", region_name=region)
-        
+    """
+    Aggregates per-invocation datapoints in process and publishes them in
+    batches instead of issuing one PutMetricData call per invocation.
+
+    Datapoints are bucketed by (MetricName, FunctionId, Runtime, Unit) and
+    flushed every CW_FLUSH_INTERVAL_SECONDS:
+    - "api" mode sends Values/Counts, or StatisticValues once a bucket has more
+      distinct values than a single datum accepts, packed up to the API limit.
+    - "emf" mode writes Embedded Metric Format log lines and makes no API calls.
+    """
+    MAX_VALUES_PER_DATUM = 150
+    MAX_DATUMS_PER_REQUEST = 1000
+    MAX_REQUEST_BYTES = 900 * 1024  # Headroom under the 1MB request limit
+    MAX_EMF_VALUES_PER_LINE = 100
+
+    def __init__(self, region, mode: str = None, flush_interval: float = None,
+                 max_buffered_points: int = None, client=None):
+        self.mode = (mode or config.CW_METRICS_MODE).lower()
+        self.namespace = config.CW_NAMESPACE
+        self.flush_interval = flush_interval or config.CW_FLUSH_INTERVAL_SECONDS
+        self.max_buffered_points = max_buffered_points or config.CW_MAX_BUFFERED_POINTS
+        self.client = client
+        if self.client is None and self.mode == "api":
+            self.client = boto3.client("cloudwatch", region_name=region)
+
+        self._buckets = {}
+        self._buffered_entries = 0
+        self._lock = threading.Lock()
+        self._emf_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+
     def publish_peak_memory(self, func_id, runtime, bytes_used):
+        if bytes_used is None: return
+        self.record("PeakMemoryBytes", func_id, runtime, bytes_used, "Bytes")
+
+    def record(self, metric_name: str, func_id: str, runtime: str, value, unit: str = "None"):
+        """Buffer a datapoint for the next flush. Never blocks on the network."""
+        value = float(value)
+        key = (metric_name, func_id, runtime, unit)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            # Memory grows only with distinct (metric, dimensions, value)
+            # entries; repeated values and collapsed buckets cost nothing more.
+            new_entry = bucket is None or (not bucket["collapsed"] and value not in bucket["values"])
+            if new_entry and self._buffered_entries >= self.max_buffered_points:
+                CW_DROPPED_POINTS.labels(reason="buffer_full").inc()
+                return
+            if bucket is None:
+                bucket = self._buckets[key] = {
+                    "values": Counter(), "collapsed": False,
+                    "count": 0, "sum": 0.0, "min": value, "max": value
+                }
+            bucket["count"] += 1
+            bucket["sum"] += value
+            bucket["min"] = min(bucket["min"], value)
+            bucket["max"] = max(bucket["max"], value)
+            if new_entry:
+                self._buffered_entries += 1
+            if not bucket["collapsed"]:
+                bucket["values"][value] += 1
+                # A datum carries at most 150 distinct values. Past that the
+                # bucket is reported as a statistic set, which keeps memory per
+                # bucket constant no matter how many invocations it absorbs.
+                if self.mode == "api" and len(bucket["values"]) > self.MAX_VALUES_PER_DATUM:
+                    self._buffered_entries -= len(bucket["values"]) - 1
+                    bucket["collapsed"] = True
+                    bucket["values"] = Counter()
+
+    def flush(self):
+        """Publish every buffered bucket and reset the buffer."""
+        with self._lock:
+            buckets, self._buckets = self._buckets, {}
+            self._buffered_entries = 0
+        if not buckets:
+            return
+
+        started = time.perf_counter()
         try:
-            if bytes_used is None: return
-            self.client.put_metric_data(
-                Namespace="FaaS/FunctionRunner",
-                MetricData=[{
-                    "MetricName": "PeakMemoryBytes",
-                    "Dimensions": [{"Name": "FunctionId", "Value": func_id}, {"Name": "Runtime", "Value": runtime}],
-                    "Value": float(bytes_used),
-                    "Unit": "Bytes",
-                    "Timestamp": datetime.utcnow()
-                }]
-            )
-        except Exception as e:
-            logger.warning("CloudWatch publish failed", error=str(e))
+            if self.mode == "emf":
+                self._write_emf(buckets)
+            else:
+                self._put_metric_data(buckets)
+        finally:
+            CW_FLUSH_DURATION.labels(mode=self.mode).observe(time.perf_counter() - started)
+
+    def close(self):
+        """Stop the background flusher and publish what is still buffered."""
+        self._stop_event.set()
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("CloudWatch flush failed", error=str(e))
+
+    def _put_metric_data(self, buckets: dict):
+        timestamp = datetime.utcnow()
+        datums = []
+        for (metric_name, func_id, runtime, unit), bucket in buckets.items():
+            datum = {
+                "MetricName": metric_name,
+                "Dimensions": [{"Name": "FunctionId", "Value": func_id}, {"Name": "Runtime", "Value": runtime}],
+                "Unit": unit,
+                "Timestamp": timestamp
+            }
+            if bucket["collapsed"]:
+                datum["StatisticValues"] = {
+                    "SampleCount": float(bucket["count"]),
+                    "Sum": bucket["sum"],
+                    "Minimum": bucket["min"],
+                    "Maximum": bucket["max"]
+                }
+            else:
+                datum["Values"] = list(bucket["values"].keys())
+                datum["Counts"] = [float(c) for c in bucket["values"].values()]
+            datums.append((datum, bucket["count"]))
+
+        for batch in self._batches(datums):
+            try:
+                self.client.put_metric_data(
+                    Namespace=self.namespace,
+                    MetricData=[datum for datum, _ in batch]
+                )
+                CW_BATCH_SIZE.observe(len(batch))
+            except Exception as e:
+                CW_DROPPED_POINTS.labels(reason="publish_error").inc(sum(n for _, n in batch))
+                logger.warning("CloudWatch publish failed", error=str(e), datums=len(batch))
+
+    def _batches(self, datums: list):
+        """Split datums into PutMetricData requests within count and size limits."""
+        batch, batch_bytes = [], 0
+        for item in datums:
+            # Rough wire-size estimate; only needs to stay under the hard limit.
+            size = len(json.dumps(item[0], default=str))
+            if batch and (len(batch) >= self.MAX_DATUMS_PER_REQUEST
+                          or batch_bytes + size > self.MAX_REQUEST_BYTES):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(item)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    def _write_emf(self, buckets: dict):
+        """Emit one EMF document per bucket (chunked to 100 values per line)."""
+        timestamp_ms = int(time.time() * 1000)
+        lines = []
+        for (metric_name, func_id, runtime, unit), bucket in buckets.items():
+            values = [v for v, c in bucket["values"].items() for _ in range(c)]
+            for start in range(0, len(values), self.MAX_EMF_VALUES_PER_LINE):
+                lines.append(json.dumps({
+                    "_aws": {
+                        "Timestamp": timestamp_ms,
+                        "CloudWatchMetrics": [{
+                            "Namespace": self.namespace,
+                            "Dimensions": [["FunctionId", "Runtime"]],
+                            "Metrics": [{"Name": metric_name, "Unit": unit}]
+                        }]
+                    },
+                    "FunctionId": func_id,
+                    "Runtime": runtime,
+                    metric_name: values[start:start + self.MAX_EMF_VALUES_PER_LINE]
+                }))
+        CW_BATCH_SIZE.observe(len(lines))
+        with self._emf_lock:
+            sys.stdout.write("\n".join(lines) + "\n")
+            sys.stdout.flush()
 
 class MetricsCollector:
     """
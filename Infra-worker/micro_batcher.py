@@ -0,0 +1,89 @@
+import threading
+import time
+import structlog
+from typing import Callable, Hashable, List
+from prometheus_client import Counter, Histogram
+
+import config
+
+logger = structlog.get_logger()
+
+MICRO_BATCH_SIZE = Histogram(
+    'worker_micro_batch_size', 'Invocations per micro-batch',
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+MICRO_BATCHES = Counter(
+    'worker_micro_batches_total', 'Dispatched micro-batches by what closed them', ['trigger']
+)
+
+
+class _PendingBatch:
+    __slots__ = ("items", "max_size", "deadline")
+
+    def __init__(self, max_size: int, deadline: float):
+        self.items = []
+        self.max_size = max_size
+        self.deadline = deadline
+
+
+class MicroBatcher:
+    """
+    Groups invocations of the same function code that arrive close together.
+
+    add() puts an item into the open batch of its key; the batch is handed
+    to dispatch(items) once it holds max_size items ("size") or the window
+    after its first item has passed ("window"), whichever comes first. Full
+    batches are dispatched on the caller's thread and expired ones on the
+    batcher thread, so dispatch must not block.
+    """
+    def __init__(self, dispatch: Callable[[List], None], window_seconds: float = None):
+        self.dispatch = dispatch
+        self.window = (
+            window_seconds if window_seconds is not None else config.MICRO_BATCH_WINDOW_MS / 1000.0
+        )
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def add(self, key: Hashable, item, max_size: int):
+        with self._cond:
+            batch = self._pending.get(key)
+            if batch is None:
+                batch = self._pending[key] = _PendingBatch(max_size, time.monotonic() + self.window)
+                self._cond.notify()
+            batch.items.append(item)
+            full = len(batch.items) >= batch.max_size
+            if full:
+                del self._pending[key]
+        if full:
+            self._flush(batch.items, "size")
+
+    def flush_all(self):
+        """Dispatch every open batch now (used on shutdown)."""
+        with self._cond:
+            batches = list(self._pending.values())
+            self._pending.clear()
+        for batch in batches:
+            self._flush(batch.items, "shutdown")
+
+    def _run(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                expired = [key for key, batch in self._pending.items() if batch.deadline <= now]
+                batches = [self._pending.pop(key) for key in expired]
+                if not batches:
+                    next_deadline = min((batch.deadline for batch in self._pending.values()), default=None)
+                    self._cond.wait(None if next_deadline is None else next_deadline - now)
+                    continue
+            for batch in batches:
+                self._flush(batch.items, "window")
+
+    def _flush(self, items: List, trigger: str):
+        MICRO_BATCH_SIZE.observe(len(items))
+        MICRO_BATCHES.labels(trigger=trigger).inc()
+        try:
+            self.dispatch(items)
+        except Exception as e:
+            logger.error("Micro-batch dispatch failed", size=len(items), error=str(e))
@@ -1,6 +1,8 @@
 from dataclasses import dataclass, field
 from typing import List, Optional, Dict
 
+import json_codec
+
 @dataclass
 class TaskMessage:
     """Represents a task received from SQS."""
@@ -14,6 +16,19 @@ class TaskMessage:
     payload: Dict = field(default_factory=dict)
     model_id: str = "llama3:8b"
     env_vars: Dict[str, str] = field(default_factory=dict)
+    # Image variant of the runtime (e.g. "python-fat"), if declared at upload
+    runtime_variant: Optional[str] = None
+    # Claim check for large inputs: "redis://<key>" or "s3://<bucket>/<key>"
+    payload_ref: Optional[str] = None
+    # Content type of the referenced payload (application/json, application/x-ndjson,
+    # application/octet-stream)
+    payload_content_type: Optional[str] = None
+    # Micro-batching opt-in declared at upload: max invocations per handler call
+    batch_max_size: int = 1
+    # Set on the combined task of a micro-batch: the request of each event
+    batch_request_ids: Optional[List[str]] = None
+    # Invocations that may share one warm container (I/O-bound functions)
+    max_concurrency_per_container: int = 1
 
 @dataclass
 class ExecutionResult:
@@ -22,7 +37,8 @@ class ExecutionResult:
     function_id: str
     success: bool
     exit_code: int
-    stdout: str
+    # Raw log head; decoded only when the result is serialised
+    stdout: bytes
     stderr: str
     duration_ms: int
     handler_duration_ms: Optional[float] = None
@@ -39,15 +55,22 @@ class ExecutionResult:
     disk_write: int = 0
     output_files: List[str] = field(default_factory=list)
     llm_token_count: Optional[int] = 0
+    # Handler result from the SDK result channel: inline, or an S3 manifest entry
+    result: Optional[str] = None
+    result_ref: Optional[Dict] = None
 
     def to_dict(self):
+        stdout = self.stdout
+        if not isinstance(stdout, str):
+            # Decodes bytes or a bytearray in place, without a bytes() copy
+            stdout = str(stdout, "utf-8", "replace")
         return {
             "requestId": self.request_id,
             "functionId": self.function_id,
             "workerId": self.worker_id,
             "status": "SUCCESS" if self.success else "FAILED",
             "exitCode": self.exit_code,
-            "stdout": self.stdout,
+            "stdout": stdout,
             "stderr": self.stderr,
             "durationMs": self.duration_ms,
             "handlerDurationMs": self.handler_duration_ms,
@@ -62,5 +85,11 @@ class ExecutionResult:
             "diskRead": self.disk_read,
             "diskWrite": self.disk_write,
             "outputFiles": self.output_files,
-            "llm_token_count": self.llm_token_count
+            "llm_token_count": self.llm_token_count,
+            "result": self.result,
+            "resultRef": self.result_ref
         }
+
+    def to_json(self) -> bytes:
+        """Serialise the result once, as the bytes published to Redis."""
+        return json_codec.dumps(self.to_dict())
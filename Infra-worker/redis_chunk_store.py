@@ -0,0 +1,98 @@
+import json
+import hashlib
+import structlog
+from pathlib import Path
+
+import config
+
+logger = structlog.get_logger()
+
+
+class ChunkedRedisStore:
+    """
+    Stores large blobs in Redis as a manifest plus fixed-size chunks.
+
+    Layout for a key prefix P:
+    - P:manifest  -> {"version": 1, "size": ..., "chunkSize": ..., "chunks": [sha256, ...]}
+    - P:chunk:<i> -> raw bytes of chunk i
+
+    Chunks are written and read with pipelines of REDIS_CODE_PIPELINE_CHUNKS
+    commands and streamed to/from disk, so neither the Worker nor Redis ever
+    handles the whole bundle as one value. The manifest is written last, so
+    readers never see a partially written blob. Every read verifies each
+    chunk against its SHA-256 and refreshes the TTL of what it read.
+    """
+    VERSION = 1
+
+    def __init__(self, redis_client, chunk_size: int = None, ttl_seconds: int = None,
+                 pipeline_chunks: int = None):
+        self.redis = redis_client
+        self.chunk_size = chunk_size or config.REDIS_CODE_CHUNK_SIZE_MB * 1024 * 1024
+        self.ttl = ttl_seconds or config.REDIS_CODE_TTL_SECONDS
+        self.pipeline_chunks = pipeline_chunks or config.REDIS_CODE_PIPELINE_CHUNKS
+
+    def write_file(self, prefix: str, path: Path):
+        """Store the file at path under prefix."""
+        digests = []
+        size = 0
+        pipe = self.redis.pipeline(transaction=False)
+        with open(path, "rb") as f:
+            for index, chunk in enumerate(iter(lambda: f.read(self.chunk_size), b"")):
+                pipe.setex(self._chunk_key(prefix, index), self.ttl, chunk)
+                digests.append(hashlib.sha256(chunk).hexdigest())
+                size += len(chunk)
+                if len(digests) % self.pipeline_chunks == 0:
+                    pipe.execute()
+        manifest = {
+            "version": self.VERSION,
+            "size": size,
+            "chunkSize": self.chunk_size,
+            "chunks": digests
+        }
+        pipe.setex(self._manifest_key(prefix), self.ttl, json.dumps(manifest))
+        pipe.execute()
+
+    def read_to_file(self, prefix: str, path: Path) -> bool:
+        """Stream the blob under prefix into path. Returns False on miss or corruption."""
+        raw_manifest = self.redis.get(self._manifest_key(prefix))
+        if not raw_manifest:
+            return False
+        try:
+            manifest = json.loads(raw_manifest)
+            digests = manifest["chunks"]
+            expected_size = int(manifest["size"])
+            if manifest.get("version") != self.VERSION:
+                return False
+        except (ValueError, TypeError, KeyError):
+            logger.warning("Invalid chunk manifest in Redis", prefix=prefix)
+            return False
+
+        size = 0
+        with open(path, "wb") as f:
+            for start in range(0, len(digests), self.pipeline_chunks):
+                pipe = self.redis.pipeline(transaction=False)
+                batch = range(start, min(start + self.pipeline_chunks, len(digests)))
+                for index in batch:
+                    pipe.get(self._chunk_key(prefix, index))
+                    pipe.expire(self._chunk_key(prefix, index), self.ttl)
+                replies = pipe.execute()
+                for index, chunk in zip(batch, replies[0::2]):
+                    if chunk is None or hashlib.sha256(chunk).hexdigest() != digests[index]:
+                        logger.warning("Redis chunk missing or corrupt", prefix=prefix, chunk=index)
+                        return False
+                    f.write(chunk)
+                    size += len(chunk)
+
+        if size != expected_size:
+            logger.warning("Redis blob size mismatch", prefix=prefix, expected=expected_size, actual=size)
+            return False
+        self.redis.expire(self._manifest_key(prefix), self.ttl)
+        return True
+
+    @staticmethod
+    def _manifest_key(prefix: str) -> str:
+        return f"{prefix}:manifest"
+
+    @staticmethod
+    def _chunk_key(prefix: str, index: int) -> str:
+        return f"{prefix}:chunk:{index}"
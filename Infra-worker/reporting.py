@@ -0,0 +1,142 @@
+import os
+import queue
+import shutil
+import threading
+import time
+import structlog
+from pathlib import Path
+from prometheus_client import Counter, Gauge, Histogram
+
+import config
+
+logger = structlog.get_logger()
+
+REPORTING_QUEUE_DEPTH = Gauge(
+    'worker_reporting_queue_depth', 'Pending post-invocation work items per stage', ['stage']
+)
+REPORTING_STAGE_DURATION = Histogram(
+    'worker_reporting_stage_duration_seconds', 'Time spent processing one work item per stage', ['stage']
+)
+REPORTING_DROPPED = Counter(
+    'worker_reporting_dropped_total', 'Post-invocation work items dropped under backpressure', ['stage']
+)
+
+
+class ReportingPipeline:
+    """
+    Runs post-invocation work on fixed worker pools fed by bounded queues.
+
+    The CloudWatch datapoint is buffered inline: the publisher already
+    aggregates in memory and never blocks on the network. Each remaining
+    stage has its own queue and workers, so a slow S3 period only backs up
+    the upload stage:
+    - upload: push output files to S3, then hand the workspace to cleanup
+    - cleanup: remove the host workspace (never dropped)
+
+    When the upload queue is full, submit() blocks for up to
+    REPORTING_SUBMIT_TIMEOUT_SECONDS. The executor thread holds a dispatch
+    slot meanwhile, which slows SQS intake instead of growing host threads.
+    """
+    def __init__(self, metrics_collector, uploader,
+                 queue_size: int = None, upload_workers: int = None,
+                 cleanup_workers: int = None, submit_timeout: float = None):
+        self.metrics = metrics_collector
+        self.uploader = uploader
+        self.submit_timeout = (
+            submit_timeout if submit_timeout is not None else config.REPORTING_SUBMIT_TIMEOUT_SECONDS
+        )
+        size = queue_size or config.REPORTING_QUEUE_SIZE
+        workers = {
+            "upload": upload_workers or config.REPORTING_UPLOAD_WORKERS,
+            "cleanup": cleanup_workers or config.REPORTING_CLEANUP_WORKERS
+        }
+        handlers = {
+            "upload": self._upload_outputs,
+            "cleanup": self._cleanup_workspace
+        }
+
+        self.queues = {}
+        for stage, count in workers.items():
+            stage_queue = queue.Queue(maxsize=size)
+            self.queues[stage] = stage_queue
+            REPORTING_QUEUE_DEPTH.labels(stage=stage).set_function(stage_queue.qsize)
+            for index in range(count):
+                threading.Thread(
+                    target=self._worker, args=(stage, handlers[stage]),
+                    name=f"reporting-{stage}-{index}", daemon=True
+                ).start()
+
+    def submit(self, task, peak_mem, host_out_dir: Path, work_dir: Path):
+        """Record metrics, then schedule upload and cleanup for a finished invocation."""
+        try:
+            self.metrics.cw.publish_peak_memory(task.function_id, task.runtime, peak_mem)
+        except Exception as e:
+            logger.warning("Failed to record metrics", request_id=task.request_id, error=str(e))
+
+        if self._has_files(host_out_dir):
+            try:
+                self.queues["upload"].put(
+                    (task.request_id, task.function_id, host_out_dir, work_dir),
+                    timeout=self.submit_timeout
+                )
+                return
+            except queue.Full:
+                REPORTING_DROPPED.labels(stage="upload").inc()
+                logger.warning("Upload queue full, dropping outputs", request_id=task.request_id)
+
+        self.schedule_cleanup(work_dir)
+
+    def schedule_cleanup(self, work_dir: Path):
+        """Queue a workspace for removal without uploading anything from it."""
+        try:
+            self.queues["cleanup"].put_nowait(work_dir)
+        except queue.Full:
+            # Workspaces are never leaked: clean up on the caller's thread.
+            self._cleanup_workspace(work_dir)
+
+    def _worker(self, stage: str, handler):
+        stage_queue = self.queues[stage]
+        while True:
+            item = stage_queue.get()
+            started = time.perf_counter()
+            try:
+                handler(item)
+            except Exception as e:
+                logger.warning("Reporting stage failed", stage=stage, error=str(e))
+            finally:
+                REPORTING_STAGE_DURATION.labels(stage=stage).observe(time.perf_counter() - started)
+                stage_queue.task_done()
+
+    def _upload_outputs(self, item):
+        request_id, function_id, host_out_dir, work_dir = item
+        try:
+            # Deduplicate only within a function so objects never cross tenants.
+            manifest = self.uploader.upload_outputs(request_id, str(host_out_dir), scope=function_id)
+            if manifest:
+                # The result was already reported; the manifest goes to the
+                # reporting log with each object's key, size, hash and dedup source.
+                logger.info(
+                    "📤 Outputs uploaded", request_id=request_id, function_id=function_id,
+                    files=len(manifest), bytes=sum(entry["size"] for entry in manifest),
+                    deduplicated=sum(1 for entry in manifest if entry.get("deduplicated")),
+                    manifest=manifest
+                )
+        finally:
+            self.schedule_cleanup(work_dir)
+
+    def _cleanup_workspace(self, work_dir: Path):
+        if work_dir and Path(work_dir).exists():
+            try:
+                shutil.rmtree(work_dir)
+            except Exception as e:
+                logger.warning("Failed to cleanup workspace", path=str(work_dir), error=str(e))
+
+    @staticmethod
+    def _has_files(path: Path) -> bool:
+        try:
+            for _root, _dirs, files in os.walk(path):
+                if files:
+                    return True
+        except OSError:
+            pass
+        return False
@@ -38,9 +38,11 @@ def run_user_handler():
             sys.exit(1)
 
         # 2. Get Input Context & Payload via SDK
-        # The SDK handles reading from env vars or files automatically.
+        # The SDK handles reading from env vars or files automatically and
+        # picks the view for PAYLOAD_CONTENT_TYPE (JSON value, memoryview of
+        # raw bytes, or an iterator of ndjson records).
         context = sdk.get_context()
-        event = sdk.get_input()
+        event = sdk.get_event()
 
         # 3. Locate Handler Function
         # We default to 'handler' function in main.py
@@ -62,8 +64,10 @@ def run_user_handler():
             write_handler_duration(perf_counter_ns() - handler_started_ns)
 
         # 5. Return Output via SDK
-        # The SDK handles JSON formatting and standard output
-        sdk.return_output(result)
+        # The SDK handles JSON formatting and the result channel. A handler
+        # that streamed its result with sdk.write_output() returns None.
+        if result is not None or not sdk.output_streamed():
+            sdk.return_output(result)
 
     except Exception as e:
         # Catch-all for user code errors
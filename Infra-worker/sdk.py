@@ -1,32 +1,62 @@
 import os
 import json
+import mmap
 import sys
 
+# Values of PAYLOAD_CONTENT_TYPE set by the Worker
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_NDJSON = "application/x-ndjson"
+CONTENT_TYPE_BINARY = "application/octet-stream"
+
+# Characters read per step while iterating a JSON array payload
+JSON_READ_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\n\r"
+
+
 class FaaSSDK:
     def __init__(self):
         self._input_data = None
+        self._input_map = None
+        self._output_streamed = False
 
     def get_context(self):
         """
         Returns execution context including Request ID and Model ID.
         """
-        return {
+        context = {
             "request_id": os.environ.get("JOB_ID"),
             "function_id": os.environ.get("FUNCTION_ID"),
             "model_id": os.environ.get("LLM_MODEL"),
             "memory_mb": os.environ.get("MEMORY_MB")
         }
+        # Micro-batched invocation: the event is a list with one entry per
+        # request, and the handler returns a list of results in the same order
+        if os.environ.get("BATCH_REQUEST_IDS"):
+            context["batch_request_ids"] = os.environ["BATCH_REQUEST_IDS"].split(",")
+        return context
+
+    def get_content_type(self):
+        """Content type of the input payload (PAYLOAD_CONTENT_TYPE)."""
+        return os.environ.get("PAYLOAD_CONTENT_TYPE", CONTENT_TYPE_JSON)
 
     def get_input(self):
         """
         Parses input payload from environment variable or file.
         Automatically handles large payloads passed via file.
+        Binary payloads are returned as bytes and ndjson payloads as a
+        list of records.
         """
         if self._input_data is not None:
             return self._input_data
 
+        content_type = self.get_content_type()
         try:
-            if "PAYLOAD_FILE" in os.environ:
+            if content_type == CONTENT_TYPE_BINARY:
+                self._input_data = self.get_input_bytes()
+            elif content_type == CONTENT_TYPE_NDJSON:
+                self._input_data = list(self.iter_input_records())
+            elif "PAYLOAD_FILE" in os.environ:
                 with open(os.environ["PAYLOAD_FILE"], "r") as f:
                     self._input_data = json.load(f)
             elif "PAYLOAD" in os.environ:
@@ -36,17 +66,175 @@ class FaaSSDK:
         except Exception as e:
             print(f"Error parsing input: {e}", file=sys.stderr)
             self._input_data = {}
-        
+
         return self._input_data
 
+    def get_input_bytes(self):
+        """Returns the raw input payload as bytes, without any decoding."""
+        if "PAYLOAD_FILE" in os.environ:
+            with open(os.environ["PAYLOAD_FILE"], "rb") as f:
+                return f.read()
+        return os.environ.get("PAYLOAD", "").encode("utf-8")
+
+    def get_input_view(self):
+        """
+        Returns a read-only memoryview of the input payload.
+
+        A payload file is memory-mapped (it lives on the workspace tmpfs),
+        so large inputs are not copied into the process heap.
+        """
+        if "PAYLOAD_FILE" not in os.environ:
+            return memoryview(self.get_input_bytes())
+        if self._input_map is None:
+            with open(os.environ["PAYLOAD_FILE"], "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return memoryview(b"")
+                self._input_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._input_map)
+
+    def iter_input_records(self):
+        """
+        Yields input records one at a time.
+
+        ndjson payloads yield one record per non-empty line; JSON payloads
+        whose top level is an array yield its elements, parsed incrementally
+        without loading the whole document.
+        """
+        if "PAYLOAD_FILE" in os.environ:
+            with open(os.environ["PAYLOAD_FILE"], "r", encoding="utf-8") as f:
+                yield from self._iter_records(f)
+        else:
+            from io import StringIO
+            yield from self._iter_records(StringIO(os.environ.get("PAYLOAD", "")))
+
+    def _iter_records(self, stream):
+        if self.get_content_type() == CONTENT_TYPE_NDJSON:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from iter_json_array(stream)
+
+    def get_event(self):
+        """
+        Returns the handler event in the view matching the payload content
+        type: parsed JSON, a memoryview for binary data, or a record
+        iterator for ndjson.
+        """
+        content_type = self.get_content_type()
+        if content_type == CONTENT_TYPE_BINARY:
+            return self.get_input_view()
+        if content_type == CONTENT_TYPE_NDJSON:
+            return self.iter_input_records()
+        return self.get_input()
+
     def return_output(self, data):
         """
-        Standardizes output return (JSON over stdout).
+        Standardizes output return (JSON).
+
+        The result goes to the platform result channel (RESULT_FILE), apart
+        from anything the function prints; without one it is printed to
+        stdout as before.
+        """
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            body = bytes(data)
+        elif isinstance(data, dict) or isinstance(data, list):
+            body = json.dumps(data).encode("utf-8")
+        else:
+            body = str(data).encode("utf-8")
+
+        result_file = os.environ.get("RESULT_FILE")
+        if not result_file:
+            print(body.decode("utf-8", errors="replace"))
+            return
+        with open(result_file, "wb") as f:
+            f.write(body)
+
+    def write_output(self, chunk):
+        """
+        Appends a chunk to the result, for responses too big to build in
+        memory. A handler that streams its result this way should return
+        None; its chunks then form the whole result.
         """
-        if isinstance(data, dict) or isinstance(data, list):
-            print(json.dumps(data))
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        result_file = os.environ.get("RESULT_FILE")
+        if not result_file:
+            sys.stdout.buffer.write(chunk)
+            sys.stdout.flush()
         else:
-            print(str(data))
+            with open(result_file, "ab") as f:
+                f.write(chunk)
+        self._output_streamed = True
+
+    def output_streamed(self):
+        """True once the result has been written in chunks via write_output."""
+        return self._output_streamed
+
+
+def iter_json_array(stream, read_size=JSON_READ_SIZE):
+    """Yield the elements of a top-level JSON array read from a text stream."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+
+    def _fill(size):
+        nonlocal buffer, pos, eof
+        chunk = stream.read(size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+    def _skip(chars):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in chars:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            _fill(read_size)
+
+    _skip(_WHITESPACE)
+    if buffer[pos:pos + 1] != "[":
+        raise ValueError("Input payload is not a JSON array")
+    pos += 1
+
+    expect_value = True
+    after_comma = False
+    while True:
+        _skip(_WHITESPACE)
+        if pos >= len(buffer):
+            raise ValueError("Unterminated JSON array in input payload")
+        if buffer[pos] == "]":
+            if after_comma:
+                raise ValueError(f"Trailing ',' in JSON array at offset {pos}")
+            return
+        if not expect_value:
+            if buffer[pos] != ",":
+                raise ValueError(f"Expected ',' in JSON array at offset {pos}")
+            pos += 1
+            expect_value = after_comma = True
+            continue
+
+        size = read_size
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A value ending at the buffer edge may be a truncated number.
+                if end < len(buffer) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            # Grow reads geometrically so a large record is not re-parsed per chunk.
+            _fill(size)
+            size *= 2
+        pos = end
+        expect_value = after_comma = False
+        yield value
+
 
 # Singleton instance
 _sdk = FaaSSDK()
@@ -58,5 +246,23 @@ def get_context():
 def get_input():
     return _sdk.get_input()
 
+def get_input_bytes():
+    return _sdk.get_input_bytes()
+
+def get_input_view():
+    return _sdk.get_input_view()
+
+def iter_input_records():
+    return _sdk.iter_input_records()
+
+def get_event():
+    return _sdk.get_event()
+
 def return_output(data):
     return _sdk.return_output(data)
+
+def write_output(chunk):
+    return _sdk.write_output(chunk)
+
+def output_streamed():
+    return _sdk.output_streamed()
@@ -0,0 +1,185 @@
+import os
+import shutil
+import tarfile
+import threading
+import structlog
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+from prometheus_client import Counter, Gauge
+
+import config
+
+logger = structlog.get_logger()
+
+SNAPSHOT_REQUESTS = Counter(
+    'worker_snapshot_cache_requests_total', 'Prepared snapshot lookups', ['kind', 'result']
+)
+SNAPSHOT_CACHE_SIZE = Gauge(
+    'worker_snapshot_cache_size_bytes', 'Bytes held by prepared snapshots', ['kind']
+)
+
+SNAPSHOT_ARCHIVE_NAME = "workspace.tar"
+
+
+class SnapshotCache:
+    """
+    Prepared, validated workspaces per artifact, stored as ready-to-stream tars.
+
+    A snapshot is built once per snapshot key (artifact content hash plus the
+    bytecode tag): the artifact is extracted with the usual safety checks and
+    the tree is packed into workspace.tar. Cold starts then only hard-link that tar into their
+    workspace and stream it into the container.
+
+    Each function keeps its SNAPSHOT_KEYS_PER_FUNCTION most recently used
+    keys, so a deploy cutover (prefetch of the new artifact while the old one
+    still serves requests) does not rebuild either side. A snapshot is dropped
+    once it falls out of every function's recent keys, and evicted in LRU order when the
+    cache exceeds SNAPSHOT_CACHE_MAX_MB or the disk runs low on free space.
+
+    The same mechanism stores dependency layers (kind="layer"), which are
+    keyed by their requirements and shared by every function using them.
+    """
+    def __init__(self, root: Path = None, max_bytes: int = None, min_free_bytes: int = None,
+                 kind: str = "workspace", keys_per_function: int = None):
+        self.kind = kind
+        self.root = Path(root or config.SNAPSHOT_CACHE_DIR)
+        self.max_bytes = max_bytes or config.SNAPSHOT_CACHE_MAX_MB * 1024 * 1024
+        self.min_free_bytes = (
+            min_free_bytes if min_free_bytes is not None else config.SNAPSHOT_MIN_FREE_MB * 1024 * 1024
+        )
+        self.keys_per_function = max(1, keys_per_function or config.SNAPSHOT_KEYS_PER_FUNCTION)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._lru = OrderedDict()  # snapshot key -> archive size
+        self._size = 0
+        self._function_snapshots = {}  # function ID -> OrderedDict of recent snapshot keys
+        self._load_existing()
+
+    def materialize(self, snapshot_key: str, function_id: str, destination: Optional[Path],
+                    build: Callable[[Path], None]) -> Optional[Path]:
+        """
+        Hard-link the snapshot archive for snapshot_key to destination.
+
+        build(tree_dir) populates an empty directory with the prepared
+        workspace; it runs at most once per key, even under concurrency.
+        With destination=None the snapshot is only built (prefetch).
+        """
+        while True:
+            with self._lock:
+                self._assign_locked(function_id, snapshot_key)
+                if snapshot_key in self._lru:
+                    self._lru.move_to_end(snapshot_key)
+                    if destination is not None:
+                        os.link(self._archive_path(snapshot_key), destination)
+                    SNAPSHOT_REQUESTS.labels(kind=self.kind, result="hit").inc()
+                    return destination
+                event = self._inflight.get(snapshot_key)
+                if event is None:
+                    event = self._inflight[snapshot_key] = threading.Event()
+                    break
+            event.wait()
+
+        try:
+            self._build(snapshot_key, build)
+            SNAPSHOT_REQUESTS.labels(kind=self.kind, result="miss").inc()
+        finally:
+            with self._lock:
+                self._inflight.pop(snapshot_key, None)
+            event.set()
+        return self.materialize(snapshot_key, function_id, destination, build)
+
+    def link(self, snapshot_key: str, function_id: str, destination: Path) -> bool:
+        """Hard-link an existing snapshot to destination without building it."""
+        with self._lock:
+            self._assign_locked(function_id, snapshot_key)
+            if snapshot_key not in self._lru:
+                SNAPSHOT_REQUESTS.labels(kind=self.kind, result="absent").inc()
+                return False
+            self._lru.move_to_end(snapshot_key)
+            os.link(self._archive_path(snapshot_key), destination)
+            SNAPSHOT_REQUESTS.labels(kind=self.kind, result="hit").inc()
+            return True
+
+    def _build(self, snapshot_key: str, build: Callable[[Path], None]):
+        staging = self.root / f".build-{snapshot_key}-{threading.get_ident()}"
+        tree = staging / "tree"
+        try:
+            tree.mkdir(parents=True)
+            build(tree)
+
+            archive_path = staging / SNAPSHOT_ARCHIVE_NAME
+            with tarfile.open(archive_path, mode="w") as tar:
+                for item in sorted(tree.iterdir(), key=lambda path: path.name):
+                    tar.add(item, arcname=item.name)
+            shutil.rmtree(tree)
+
+            with self._lock:
+                final_dir = self.root / snapshot_key
+                if final_dir.exists():
+                    shutil.rmtree(final_dir)
+                os.replace(staging, final_dir)
+                size = self._archive_path(snapshot_key).stat().st_size
+                self._lru[snapshot_key] = size
+                self._size += size
+                self._evict_locked(keep=snapshot_key)
+            logger.info("🧊 Snapshot prepared", kind=self.kind, snapshot=snapshot_key[:12], size=size)
+        finally:
+            if staging.exists():
+                shutil.rmtree(staging, ignore_errors=True)
+
+    def _assign_locked(self, function_id: str, snapshot_key: str):
+        """Track the snapshots a function uses recently; drop superseded ones."""
+        recent = self._function_snapshots.setdefault(function_id, OrderedDict())
+        recent[snapshot_key] = None
+        recent.move_to_end(snapshot_key)
+        while len(recent) > self.keys_per_function:
+            previous, _ = recent.popitem(last=False)
+            if any(previous in keys for keys in self._function_snapshots.values()):
+                continue
+            self._remove_locked(previous)
+            logger.info("Snapshot invalidated", kind=self.kind, function_id=function_id, snapshot=previous[:12])
+
+    def _evict_locked(self, keep: str):
+        while len(self._lru) > 1 and (self._size > self.max_bytes or self._disk_pressure()):
+            snapshot_key = next(iter(self._lru))
+            if snapshot_key == keep:
+                self._lru.move_to_end(snapshot_key)
+                continue
+            self._remove_locked(snapshot_key)
+            logger.info("Snapshot evicted", kind=self.kind, snapshot=snapshot_key[:12])
+        SNAPSHOT_CACHE_SIZE.labels(kind=self.kind).set(self._size)
+
+    def _remove_locked(self, snapshot_key: str):
+        size = self._lru.pop(snapshot_key, None)
+        if size is None:
+            return
+        self._size -= size
+        # Workspaces hold hard links, so in-flight cold starts keep their data.
+        shutil.rmtree(self.root / snapshot_key, ignore_errors=True)
+        SNAPSHOT_CACHE_SIZE.labels(kind=self.kind).set(self._size)
+
+    def _disk_pressure(self) -> bool:
+        try:
+            return shutil.disk_usage(self.root).free < self.min_free_bytes
+        except OSError:
+            return False
+
+    def _load_existing(self):
+        entries = []
+        for entry in self.root.iterdir():
+            if entry.name.startswith(".build-"):
+                shutil.rmtree(entry, ignore_errors=True)
+                continue
+            archive_path = entry / SNAPSHOT_ARCHIVE_NAME
+            if archive_path.is_file():
+                entries.append((archive_path.stat().st_mtime, entry.name, archive_path.stat().st_size))
+        for _mtime, snapshot_key, size in sorted(entries):
+            self._lru[snapshot_key] = size
+            self._size += size
+        SNAPSHOT_CACHE_SIZE.labels(kind=self.kind).set(self._size)
+
+    def _archive_path(self, snapshot_key: str) -> Path:
+        return self.root / snapshot_key / SNAPSHOT_ARCHIVE_NAME
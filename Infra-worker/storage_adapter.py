@@ -1,24 +1,103 @@
 import os
+import re
+import sys
+import ast
+import threading
 import shutil
 import zipfile
+import subprocess
 import hashlib
 import boto3
 import redis
 import structlog
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, List, Optional
 
 import config
+from artifact_cache import ArtifactCache
+from snapshot_cache import SnapshotCache
+from redis_chunk_store import ChunkedRedisStore
+from bytecode_compiler import BytecodeCompiler, runtime_python_version
 
 logger = structlog.get_logger()
 
+# Pre-built artifact formats that are streamed into the container as-is
+# instead of being unzipped on the host. Anything else is treated as a ZIP.
+TAR_ARTIFACT_SUFFIXES = {
+    ".tar.zst": "tar.zst",
+    ".tzst": "tar.zst",
+    ".tar": "tar"
+}
+CODE_ARCHIVE_NAMES = ("code.tar", "code.tar.zst")
+
+# Dependency layers are linked into the workspace as separate tars and
+# extracted before the user code: Python packages into /workspace/.python_deps
+# (on PYTHONPATH), Node packages into /workspace/node_modules.
+PYTHON_LAYER_NAME = "deps.tar"
+NODE_LAYER_NAME = "node_deps.tar"
+DEPENDENCY_LAYER_NAMES = (PYTHON_LAYER_NAME, NODE_LAYER_NAME)
+PYTHON_DEPS_DIR = ".python_deps"
+MAX_REQUIREMENTS_SIZE = 64 * 1024
+# A requirement by name: optional extras and version specifiers, then an
+# optional environment marker. PEP 508 direct references ("pkg @ URL"),
+# bare URLs and local paths or archive files do not match.
+PLAIN_REQUIREMENT = re.compile(
+    r"(?!.*\.(whl|zip|tar|tgz|tbz2?|txz|tlz|gz|bz2|xz|lz)$)"
+    r"[A-Za-z0-9]([A-Za-z0-9._-]*[A-Za-z0-9])?\s*(\[[A-Za-z0-9._,\s-]*\])?\s*"
+    r"(\(?\s*(~=|===?|!=|<=?|>=?)\s*[A-Za-z0-9.*+!_-]+"
+    r"(\s*,\s*(~=|===?|!=|<=?|>=?)\s*[A-Za-z0-9.*+!_-]+)*\s*\)?)?"
+)
+
+# V8 compile cache of a Node artifact (NODE_COMPILE_CACHE inside the container)
+COMPILE_CACHE_NAME = "compile_cache.tar"
+NODE_COMPILE_CACHE_DIR = ".node_compile_cache"
+
+# Claim-check payloads are streamed in chunks of this size
+PAYLOAD_STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Detected image variants remembered per artifact
+MAX_REMEMBERED_VARIANTS = 4096
+MAX_ENTRYPOINT_SIZE = 1024 * 1024
+
 class StorageAdapter:
     """
     Handles storage operations: S3 downloading, Redis caching, 
     workspace preparation, and file system cleanup.
     """
-    def __init__(self, s3_client=None, redis_client=None):
+    def __init__(self, s3_client=None, redis_client=None, artifact_cache: ArtifactCache = None,
+                 snapshot_cache: SnapshotCache = None, bytecode_compiler: BytecodeCompiler = None,
+                 layer_cache: SnapshotCache = None, compile_cache: SnapshotCache = None):
         self.s3 = s3_client or boto3.client("s3", region_name=config.AWS_REGION)
+        self.artifacts = artifact_cache or ArtifactCache()
+        self._snapshot_fingerprint = None
+        self.snapshots = snapshot_cache
+        if self.snapshots is None and config.SNAPSHOT_CACHE_ENABLED:
+            self.snapshots = SnapshotCache()
+        self.bytecode = bytecode_compiler
+        self.layers = layer_cache
+        if self.layers is None and config.DEPENDENCY_LAYERS_ENABLED:
+            self.layers = SnapshotCache(
+                root=config.LAYER_CACHE_DIR,
+                max_bytes=config.LAYER_CACHE_MAX_MB * 1024 * 1024,
+                kind="layer"
+            )
+        # Layer keys whose build failed; not retried until the Worker restarts
+        self._failed_layers = set()
+        self.compile_caches = compile_cache
+        if self.compile_caches is None and config.NODE_COMPILE_CACHE_ENABLED:
+            self.compile_caches = SnapshotCache(
+                root=config.COMPILE_CACHE_DIR,
+                max_bytes=config.COMPILE_CACHE_MAX_MB * 1024 * 1024,
+                kind="compile_cache"
+            )
+        # Artifacts whose first cold start produced no compile cache
+        self._empty_compile_caches = set()
+        # Artifact ID -> detected image variant (None when the base image fits)
+        self._variants = OrderedDict()
+        self._variants_lock = threading.Lock()
+        if self.bytecode is None and (self.snapshots is not None or self.layers is not None):
+            self.bytecode = BytecodeCompiler()
         
         # Redis connection
         if redis_client:
@@ -35,14 +114,310 @@ class StorageAdapter:
             except Exception as e:
                 logger.warning("⚠️ Redis unavailable, falling back to S3 only", error=str(e))
                 self.redis = None
+        self.redis_chunks = ChunkedRedisStore(self.redis) if self.redis else None
 
     def prepare_workspace(self, request_id: str, function_id: str, s3_key: str, s3_bucket: Optional[str] = None) -> Path:
-        """Download code, unzip safely, and return workspace path."""
+        """Download code, unzip safely, and return workspace path.
+
+        Tar artifacts (see TAR_ARTIFACT_SUFFIXES) are left packed in the
+        workspace, and ZIP artifacts are served as a prepared snapshot tar
+        when the snapshot cache is enabled; find_code_archive() returns
+        either for streaming. Otherwise the ZIP is extracted in place.
+        """
         local_dir = Path(config.DOCKER_WORK_DIR_ROOT) / request_id
         if local_dir.exists(): shutil.rmtree(local_dir)
         local_dir.mkdir(parents=True, exist_ok=True)
         
-        zip_path = local_dir / "code.zip"
+        artifact_format = self.artifact_format(s3_key)
+        artifact_path = local_dir / ("code.zip" if artifact_format == "zip" else f"code.{artifact_format}")
+        artifact_id, _fetch_remote = self._artifact_source(function_id, s3_key, s3_bucket)
+        self._link_compile_cache(function_id, artifact_id, local_dir)
+
+        if artifact_format == "zip" and self.snapshots is not None:
+            # Reuse the prepared snapshot of this exact content: no per-request
+            # unzip, validation or dependency injection.
+            blob = self.artifacts.get_or_fetch(artifact_id, _fetch_remote)
+            node_layer = self._attach_dependency_layers(function_id, blob, local_dir)
+            self._materialize_snapshot(
+                artifact_id, function_id, blob, _fetch_remote, local_dir / "code.tar", node_layer
+            )
+            return local_dir
+
+        self.artifacts.fetch_into(artifact_id, artifact_path, _fetch_remote)
+
+        # Tar artifacts stay packed: the container extracts them from the
+        # byte stream, so the host never unpacks or repacks the code.
+        if artifact_format != "zip":
+            return local_dir
+
+        # Unzip safely (node_modules comes from the Node layer, if there is one)
+        node_layer = self._attach_dependency_layers(function_id, artifact_path, local_dir)
+        self._unzip_safely(
+            artifact_path, local_dir,
+            select=(lambda name: not name.startswith("node_modules/")) if node_layer else None
+        )
+        try:
+            artifact_path.unlink()
+        except: pass
+        
+        return local_dir
+
+    def open_payload(self, payload_ref: str) -> Iterator[bytes]:
+        """
+        Open a claim-check payload and return an iterator over its bytes.
+
+        payload_ref is "redis://<key>" (under PAYLOAD_REF_REDIS_PREFIX) or
+        "s3://<bucket>/<key>" (in PAYLOAD_REF_BUCKETS). The source is opened
+        eagerly so a missing payload fails before anything is sent; the bytes
+        are then read in PAYLOAD_STREAM_CHUNK_SIZE pieces, never as a whole.
+        """
+        if payload_ref.startswith("redis://"):
+            key = payload_ref[len("redis://"):]
+            if not key.startswith(config.PAYLOAD_REF_REDIS_PREFIX):
+                raise ValueError(f"Payload key outside {config.PAYLOAD_REF_REDIS_PREFIX!r}: {key}")
+            if self.redis is None:
+                raise RuntimeError("Redis is unavailable for payload references")
+            size = self.redis.strlen(key)
+            if not size and not self.redis.exists(key):
+                raise KeyError(f"Payload not found: {payload_ref}")
+            return self._iter_redis_payload(key, size)
+
+        if payload_ref.startswith("s3://"):
+            bucket, _, key = payload_ref[len("s3://"):].partition("/")
+            if bucket not in config.PAYLOAD_REF_BUCKETS or not key:
+                raise ValueError(f"Payload reference not allowed: {payload_ref}")
+            body = self.s3.get_object(Bucket=bucket, Key=key)["Body"]
+            return self._iter_s3_payload(body)
+
+        raise ValueError(f"Unsupported payload reference: {payload_ref}")
+
+    def _iter_redis_payload(self, key: str, size: int) -> Iterator[bytes]:
+        for start in range(0, size, PAYLOAD_STREAM_CHUNK_SIZE):
+            yield self.redis.getrange(key, start, start + PAYLOAD_STREAM_CHUNK_SIZE - 1)
+
+    @staticmethod
+    def _iter_s3_payload(body) -> Iterator[bytes]:
+        try:
+            yield from body.iter_chunks(PAYLOAD_STREAM_CHUNK_SIZE)
+        finally:
+            body.close()
+
+    def detect_runtime_variant(self, function_id: str, runtime: str, s3_key: str,
+                               s3_bucket: Optional[str] = None) -> Optional[str]:
+        """
+        Return the image variant a Python ZIP artifact should run in, if any.
+
+        main.py importing a module preinstalled in python-fat (and not
+        vendored in the artifact) routes the function to that image. The
+        result is remembered per artifact, so only the first invocation of a
+        deployment reads the artifact for it.
+        """
+        if runtime != "python" or self.artifact_format(s3_key) != "zip":
+            return None
+        artifact_id, fetch_remote = self._artifact_source(function_id, s3_key, s3_bucket)
+        with self._variants_lock:
+            if artifact_id in self._variants:
+                self._variants.move_to_end(artifact_id)
+                return self._variants[artifact_id]
+
+        blob = self.artifacts.get_or_fetch(artifact_id, fetch_remote)
+        variant = "python-fat" if self._imports_fat_modules(blob) else None
+        with self._variants_lock:
+            self._variants[artifact_id] = variant
+            while len(self._variants) > MAX_REMEMBERED_VARIANTS:
+                self._variants.popitem(last=False)
+        if variant:
+            logger.info("Routing function to image variant", function_id=function_id, variant=variant)
+        return variant
+
+    @staticmethod
+    def _imports_fat_modules(zip_path: Path) -> bool:
+        try:
+            with zipfile.ZipFile(zip_path, "r") as zf:
+                info = zf.getinfo("main.py")
+                if info.file_size > MAX_ENTRYPOINT_SIZE:
+                    return False
+                tree = ast.parse(zf.read(info))
+                vendored = {name.split("/", 1)[0].removesuffix(".py") for name in zf.namelist()}
+        except (KeyError, OSError, SyntaxError, ValueError, zipfile.BadZipFile):
+            return False
+
+        imported = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                imported.update(alias.name.split(".", 1)[0] for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                imported.add(node.module.split(".", 1)[0])
+        return bool((imported & config.PYTHON_FAT_MODULES) - vendored)
+
+    def prefetch(self, function_id: str, s3_key: str, s3_bucket: Optional[str] = None):
+        """Warm the local caches for an artifact without preparing a workspace.
+
+        Used on deploy events so the first invocation of a new version is
+        served from disk (and, for ZIPs, from a prepared snapshot).
+        """
+        artifact_id, fetch_remote = self._artifact_source(function_id, s3_key, s3_bucket)
+        blob = self.artifacts.get_or_fetch(artifact_id, fetch_remote)
+        if self.artifact_format(s3_key) != "zip":
+            return
+        node_layer = self._attach_dependency_layers(function_id, blob, None)
+        if self.snapshots is not None:
+            self._materialize_snapshot(artifact_id, function_id, blob, fetch_remote, None, node_layer)
+
+    def _materialize_snapshot(self, artifact_id: str, function_id: str, blob: Path, fetch_remote,
+                              destination: Optional[Path], without_node_modules: bool = False):
+        # node_modules served by a Node layer is left out of the code snapshot.
+        variant = "without-node-modules" if without_node_modules else ""
+        self.snapshots.materialize(
+            self._snapshot_key(blob.name, variant), function_id, destination,
+            lambda tree: self._build_snapshot(artifact_id, fetch_remote, tree, without_node_modules)
+        )
+
+    def _attach_dependency_layers(self, function_id: str, zip_path: Path, workspace: Optional[Path]) -> bool:
+        """Link the Python and Node dependency layers of a ZIP artifact into workspace.
+
+        Returns True when a Node layer provides node_modules, so the code
+        itself no longer has to carry it.
+        """
+        if self.layers is None:
+            return False
+        python_key, python_build = self._python_layer_source(zip_path)
+        self._attach_layer(f"{function_id}:python", python_key, python_build,
+                           workspace / PYTHON_LAYER_NAME if workspace is not None else None)
+        node_key, node_build = self._node_layer_source(zip_path)
+        return self._attach_layer(f"{function_id}:nodejs", node_key, node_build,
+                                  workspace / NODE_LAYER_NAME if workspace is not None else None)
+
+    def _attach_layer(self, owner: str, layer_key: Optional[str], build, destination: Optional[Path]) -> bool:
+        """Materialize a layer (built at most once per key) at destination.
+
+        A failed build leaves the function without the layer (as before
+        layers existed) instead of failing the invocation.
+        """
+        if layer_key is None or layer_key in self._failed_layers:
+            return False
+        try:
+            self.layers.materialize(layer_key, owner, destination, build)
+            return True
+        except Exception as e:
+            self._failed_layers.add(layer_key)
+            logger.warning("Dependency layer build failed", owner=owner, layer=layer_key[:12], error=str(e))
+            return False
+
+    def _python_layer_source(self, zip_path: Path):
+        """Return (layer key, build) for the artifact's requirements.txt, or (None, None)."""
+        requirements = self._read_requirements(zip_path)
+        if requirements is None:
+            return None, None
+        return self._layer_key(requirements), lambda tree: self._build_python_layer(requirements, tree)
+
+    def _node_layer_source(self, zip_path: Path):
+        """Return (layer key, build) for the artifact's package-lock.json, or (None, None).
+
+        The layer is keyed by the lock file and the Node runtime version, so
+        functions locking the same dependency tree share it. A bundled
+        node_modules comes from the uploader, not the offline cache, so its
+        content (names and bytes of every file) is part of the key: a
+        layer is only shared by artifacts that ship an identical tree.
+        """
+        try:
+            with zipfile.ZipFile(zip_path, "r") as zf:
+                names = zf.namelist()
+                if "package-lock.json" not in names:
+                    return None, None
+                digest = hashlib.sha256()
+                with zf.open("package-lock.json") as lock_file:
+                    for chunk in iter(lambda: lock_file.read(1024 * 1024), b""):
+                        digest.update(chunk)
+                bundled = sorted(name for name in names if name.startswith("node_modules/"))
+                for name in bundled:
+                    digest.update(b"\0file:" + name.encode("utf-8") + b"\0")
+                    with zf.open(name) as member:
+                        for chunk in iter(lambda: member.read(1024 * 1024), b""):
+                            digest.update(chunk)
+        except (OSError, zipfile.BadZipFile):
+            return None, None
+        digest.update(b"\0nodejs:" + config.DOCKER_IMAGES["nodejs"].encode("utf-8"))
+        return digest.hexdigest(), lambda tree: self._build_node_layer(zip_path, bool(bundled), tree)
+
+    def _build_node_layer(self, zip_path: Path, bundled: bool, tree: Path):
+        """Populate tree/node_modules from the artifact, or with npm from the offline cache."""
+        if bundled:
+            self._unzip_safely(zip_path, tree, select=lambda name: name.startswith("node_modules/"))
+            return
+
+        npm = shutil.which("npm")
+        if npm is None:
+            raise RuntimeError("package-lock.json without node_modules requires npm on the Worker host")
+        self._unzip_safely(zip_path, tree, select=lambda name: name in ("package.json", "package-lock.json"))
+        result = subprocess.run(
+            [npm, "ci", "--offline", "--ignore-scripts", "--no-audit", "--no-fund",
+             "--cache", config.NPM_OFFLINE_CACHE],
+            cwd=tree, capture_output=True, timeout=config.LAYER_BUILD_TIMEOUT_SECONDS
+        )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode("utf-8", errors="replace")[-500:])
+        for name in ("package.json", "package-lock.json"):
+            (tree / name).unlink(missing_ok=True)
+
+    @staticmethod
+    def _read_requirements(zip_path: Path) -> Optional[bytes]:
+        """Return the top-level requirements.txt of a ZIP artifact, if any."""
+        try:
+            with zipfile.ZipFile(zip_path, "r") as zf:
+                info = zf.getinfo("requirements.txt")
+                if info.file_size > MAX_REQUIREMENTS_SIZE:
+                    logger.warning("requirements.txt too large for a dependency layer", size=info.file_size)
+                    return None
+                return zf.read(info)
+        except (KeyError, OSError, zipfile.BadZipFile):
+            return None
+
+    def _layer_key(self, requirements: bytes) -> str:
+        digest = hashlib.sha256()
+        digest.update(requirements.replace(b"\r\n", b"\n").strip())
+        # Wheels and bytecode are specific to the runtime Python version.
+        digest.update(b"\0" + (runtime_python_version(config.DOCKER_IMAGES["python"]) or "").encode("utf-8"))
+        return digest.hexdigest()
+
+    def _build_python_layer(self, requirements: bytes, tree: Path):
+        """Install requirements from the local wheel mirror into tree/.python_deps."""
+        # Only plain requirement specifiers are honoured: option lines could
+        # point pip at other indexes, local paths or additional files.
+        lines = []
+        for line in requirements.decode("utf-8", errors="replace").splitlines():
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith("-"):
+                logger.warning("Ignoring requirements option", line=line[:100])
+                continue
+            # Direct references would make pip fetch or read sources other
+            # than the wheel mirror; the layer is not built for them.
+            if not PLAIN_REQUIREMENT.fullmatch(line.split(";", 1)[0].strip()):
+                raise RuntimeError(f"Unsupported requirement (only names and version specifiers): {line[:100]}")
+            lines.append(line)
+        requirements_file = tree.parent / "requirements.txt"
+        requirements_file.write_text("\n".join(lines) + "\n")
+
+        command = [
+            sys.executable, "-m", "pip", "install",
+            "--no-index", "--find-links", config.PYTHON_WHEEL_MIRROR,
+            "--only-binary", ":all:", "--no-compile", "--disable-pip-version-check",
+            "--target", str(tree / PYTHON_DEPS_DIR),
+            "-r", str(requirements_file)
+        ]
+        python_version = runtime_python_version(config.DOCKER_IMAGES["python"])
+        if python_version:
+            command += ["--python-version", python_version, "--implementation", "cp"]
+        result = subprocess.run(command, capture_output=True, timeout=config.LAYER_BUILD_TIMEOUT_SECONDS)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.decode("utf-8", errors="replace")[-500:])
+        if self.bytecode is not None:
+            self.bytecode.compile_tree(tree)
+
+    def _artifact_source(self, function_id: str, s3_key: str, s3_bucket: Optional[str]):
+        """Return the artifact ID and a fetch(destination) -> tier callable."""
         bucket = s3_bucket if s3_bucket else config.S3_CODE_BUCKET
         # A function ID is stable across code updates, while the S3 object key
         # identifies the deployed artifact. Include both bucket and key so a
@@ -51,45 +426,137 @@ class StorageAdapter:
         artifact_hash = hashlib.sha256(artifact_id.encode("utf-8")).hexdigest()
         cache_key = f"code:{function_id}:{artifact_hash}"
         
-        # 1. Try Redis cache
-        cache_hit = False
-        if self.redis:
-            try:
-                cached_code = self.redis.get(cache_key)
-                if cached_code:
-                    with open(zip_path, "wb") as f:
-                        f.write(cached_code)
-                    cache_hit = True
-                    logger.info("⚡ Code cache HIT", function_id=function_id)
-            except Exception as e:
-                logger.warning("Redis cache read failed", error=str(e))
-        
-        # 2. Cache MISS -> Download from S3
-        if not cache_hit:
+        # Local disk cache (content-addressed) -> Redis -> S3. Concurrent cold
+        # starts of the same artifact share a single Redis/S3 fetch.
+        def _fetch_remote(destination: Path) -> str:
+            # 1. Try Redis cache (chunked, streamed to disk)
+            if self.redis_chunks:
+                try:
+                    if self.redis_chunks.read_to_file(cache_key, destination):
+                        logger.info("⚡ Code cache HIT", function_id=function_id)
+                        return "redis"
+                except Exception as e:
+                    logger.warning("Redis cache read failed", error=str(e))
+
+            # 2. Cache MISS -> Download from S3
             logger.info("📥 Code cache MISS, downloading from S3", function_id=function_id)
-            self.s3.download_file(bucket, s3_key, str(zip_path))
-            
+            self.s3.download_file(bucket, s3_key, str(destination))
+
             # 3. Store in Redis
-            if self.redis:
+            if self.redis_chunks:
                 try:
-                    with open(zip_path, "rb") as f:
-                        self.redis.setex(cache_key, 600, f.read()) # 10 min TTL
+                    self.redis_chunks.write_file(cache_key, destination)
                     logger.info("📦 Code cached to Redis", function_id=function_id)
                 except Exception as e:
                     logger.warning("Redis cache write failed", error=str(e))
-        
-        # Unzip safely
-        self._unzip_safely(zip_path, local_dir)
+            return "s3"
+
+        return artifact_id, _fetch_remote
+
+    def _build_snapshot(self, artifact_id: str, fetch_remote, tree: Path, without_node_modules: bool = False):
+        """Populate a snapshot tree: safe unzip, bytecode."""
+        zip_path = tree.parent / "code.zip"
+        self.artifacts.fetch_into(artifact_id, zip_path, fetch_remote)
         try:
+            self._unzip_safely(
+                zip_path, tree,
+                select=(lambda name: not name.startswith("node_modules/")) if without_node_modules else None
+            )
+        finally:
             zip_path.unlink()
-        except: pass
-        
-        return local_dir
+        if self.bytecode is not None:
+            self.bytecode.compile_tree(tree)
+
+    def _snapshot_key(self, content_hash: str, variant: str = "") -> str:
+        # Snapshots hold only user code (the SDK ships in the system bundle),
+        # but precompiled bytecode is only valid for one interpreter version.
+        if self._snapshot_fingerprint is None:
+            digest = hashlib.sha256()
+            if self.bytecode is not None:
+                digest.update(self.bytecode.tag.encode("utf-8"))
+            self._snapshot_fingerprint = digest.hexdigest()
+        return hashlib.sha256(
+            f"{content_hash}:{self._snapshot_fingerprint}:{variant}".encode("utf-8")
+        ).hexdigest()
+
+    def _link_compile_cache(self, function_id: str, artifact_id: str, workspace: Path):
+        if self.compile_caches is not None:
+            self.compile_caches.link(
+                self._compile_cache_key(artifact_id), function_id, workspace / COMPILE_CACHE_NAME
+            )
+
+    def store_compile_cache(self, function_id: str, s3_key: str, s3_bucket: Optional[str],
+                            harvest: Callable[[Path], None]) -> bool:
+        """Keep the V8 compile cache produced by a cold start of this artifact.
+
+        harvest(directory) copies the container's NODE_COMPILE_CACHE directory
+        to the host. It runs once per artifact; later cold starts receive
+        the stored cache via find_compile_cache(). Runtimes that write no
+        cache are remembered and not asked again.
+        """
+        if self.compile_caches is None:
+            return False
+        artifact_id, _ = self._artifact_source(function_id, s3_key, s3_bucket)
+        cache_key = self._compile_cache_key(artifact_id)
+        if cache_key in self._empty_compile_caches:
+            return False
+
+        def _build(tree: Path):
+            cache_dir = tree / NODE_COMPILE_CACHE_DIR
+            cache_dir.mkdir()
+            harvest(cache_dir)
+            if not any(cache_dir.iterdir()):
+                raise FileNotFoundError("No compile cache was written")
+
+        try:
+            self.compile_caches.materialize(cache_key, function_id, None, _build)
+            return True
+        except Exception as e:
+            self._empty_compile_caches.add(cache_key)
+            logger.info("Compile cache unavailable", function_id=function_id, reason=str(e))
+            return False
+
+    @staticmethod
+    def _compile_cache_key(artifact_id: str) -> str:
+        # V8 code caches are only valid for the exact Node build that wrote them.
+        return hashlib.sha256(f"{artifact_id}\0{config.DOCKER_IMAGES['nodejs']}".encode("utf-8")).hexdigest()
 
-    def _unzip_safely(self, zip_path: Path, target_dir: Path):
-        """Zip Slip prevention"""
+    @staticmethod
+    def artifact_format(s3_key: str) -> str:
+        """Return "tar", "tar.zst" or "zip" based on the artifact key suffix."""
+        lowered = s3_key.lower()
+        for suffix, artifact_format in TAR_ARTIFACT_SUFFIXES.items():
+            if lowered.endswith(suffix):
+                return artifact_format
+        return "zip"
+
+    @staticmethod
+    def find_code_archive(workspace: Path) -> Optional[Path]:
+        """Return the packed tar artifact of a prepared workspace, if any."""
+        for name in CODE_ARCHIVE_NAMES:
+            candidate = Path(workspace) / name
+            if candidate.is_file():
+                return candidate
+        return None
+
+    @staticmethod
+    def find_dependency_layers(workspace: Path) -> List[Path]:
+        """Return the dependency layer tars linked into a prepared workspace."""
+        candidates = [Path(workspace) / name for name in DEPENDENCY_LAYER_NAMES]
+        return [candidate for candidate in candidates if candidate.is_file()]
+
+    @staticmethod
+    def find_compile_cache(workspace: Path) -> Optional[Path]:
+        """Return the compile cache tar linked into a prepared workspace, if any."""
+        candidate = Path(workspace) / COMPILE_CACHE_NAME
+        return candidate if candidate.is_file() else None
+
+    def _unzip_safely(self, zip_path: Path, target_dir: Path, select: Callable[[str], bool] = None):
+        """Zip Slip prevention; select(name) limits extraction to matching members"""
         with zipfile.ZipFile(zip_path, "r") as zf:
             for member in zf.namelist():
+                if select is not None and not select(member):
+                    continue
                 target_path = (target_dir / member).resolve()
                 try:
                     target_path.relative_to(target_dir.resolve())
@@ -104,19 +571,6 @@ class StorageAdapter:
                     with zf.open(member) as source, open(target_path, "wb") as dest:
                         shutil.copyfileobj(source, dest)
 
-    def inject_dependencies(self, target_dir: Path):
-        """Inject sdk.py and ai_client.py into workspace."""
-        try:
-            current_dir = Path(__file__).parent
-            for file_name in ["sdk.py", "ai_client.py"]:
-                src = current_dir / file_name
-                if src.exists():
-                    shutil.copy(str(src), str(target_dir / file_name))
-                else:
-                    logger.warning(f"{file_name} not found, skipping injection")
-        except Exception as e:
-            logger.error("Failed to inject dependencies", error=str(e))
-
     def cleanup_workspace(self, path: Path):
         if path.exists():
             try:
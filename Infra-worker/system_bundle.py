@@ -0,0 +1,56 @@
+import io
+import tarfile
+import hashlib
+import structlog
+from pathlib import Path
+from typing import Dict
+
+import config
+
+logger = structlog.get_logger()
+
+# Installed root-owned and read-only: the function user can neither replace
+# the files nor plant bytecode next to them, so they stay trusted across the
+# warm invocations that reuse them.
+SYSTEM_DIR = "/workspace/.faas"
+
+
+def default_system_files() -> Dict[str, Path]:
+    """Worker files every Python container needs in SYSTEM_DIR."""
+    return {
+        "runner.py": Path(__file__).parent / "runner.py",
+        "sdk.py": Path(__file__).parent / "sdk.py",
+        "ai_client.py": Path(config.AI_SDK_PATH)
+    }
+
+
+class SystemBundle:
+    """
+    The runner, SDK and AI client packed once as an in-memory tar.
+
+    digest is the SHA-256 of the bundled names and contents. Containers
+    remember the digest they received, so the bundle is only sent to a
+    container once (or again after the Worker ships different files)
+    instead of on every invocation.
+    """
+    def __init__(self, files: Dict[str, Path] = None):
+        self.files = files or default_system_files()
+        missing_files = [str(path) for path in self.files.values() if not Path(path).is_file()]
+        if missing_files:
+            raise FileNotFoundError(f"Worker system files are missing: {missing_files}")
+
+        digest = hashlib.sha256()
+        stream = io.BytesIO()
+        with tarfile.open(fileobj=stream, mode="w") as tar:
+            for name in sorted(self.files):
+                path = Path(self.files[name])
+                data = path.read_bytes()
+                digest.update(name.encode("utf-8") + b"\0" + data + b"\0")
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mode = 0o444
+                info.mtime = int(path.stat().st_mtime)
+                tar.addfile(info, io.BytesIO(data))
+        self.archive = stream.getvalue()
+        self.digest = digest.hexdigest()
+        logger.info("📦 System bundle built", files=len(self.files), digest=self.digest[:12])
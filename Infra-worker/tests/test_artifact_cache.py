@@ -0,0 +1,102 @@
+import sys
+from unittest.mock import MagicMock
+
+# Mock dependencies before import
+sys.modules.setdefault("structlog", MagicMock())
+sys.modules.setdefault("prometheus_client", MagicMock())
+
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifact_cache import ArtifactCache
+
+
+class TestArtifactCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.root = Path(self.tmpdir.name)
+        self.cache = ArtifactCache(self.root / "cache", max_bytes=1024)
+
+    def fetcher(self, content: bytes, calls: list, tier="s3"):
+        def fetch(destination):
+            calls.append(destination)
+            destination.write_bytes(content)
+            return tier
+        return fetch
+
+    def test_second_lookup_is_served_locally(self):
+        calls = []
+        first = self.cache.get_or_fetch("bucket/v1.zip", self.fetcher(b"code", calls))
+        second = self.cache.get_or_fetch("bucket/v1.zip", self.fetcher(b"code", calls))
+
+        self.assertEqual(first, second)
+        self.assertEqual(first.read_bytes(), b"code")
+        self.assertEqual(len(calls), 1)
+
+    def test_identical_content_under_different_ids_shares_one_blob(self):
+        calls = []
+        first = self.cache.get_or_fetch("bucket/func-a/v1.zip", self.fetcher(b"same", calls))
+        second = self.cache.get_or_fetch("bucket/func-b/v1.zip", self.fetcher(b"same", calls))
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(list(self.cache.blob_dir.iterdir())), 1)
+
+    def test_concurrent_misses_fetch_once(self):
+        release = threading.Event()
+        calls = []
+
+        def slow_fetch(destination):
+            calls.append(destination)
+            release.wait(5)
+            destination.write_bytes(b"bundle")
+            return "s3"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.cache.get_or_fetch("bucket/v1.zip", slow_fetch)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(len(results), 5)
+
+    def test_lru_eviction_keeps_size_bound(self):
+        calls = []
+        old = self.cache.get_or_fetch("bucket/old.zip", self.fetcher(b"a" * 600, calls))
+        self.cache.get_or_fetch("bucket/new.zip", self.fetcher(b"b" * 600, calls))
+
+        self.assertFalse(old.exists())
+        self.cache.get_or_fetch("bucket/old.zip", self.fetcher(b"a" * 600, calls))
+        self.assertEqual(len(calls), 3)
+
+    def test_fetch_into_links_blob_into_workspace(self):
+        destination = self.root / "workspace-code.zip"
+        blob = self.cache.fetch_into("bucket/v1.zip", destination, self.fetcher(b"code", []))
+
+        self.assertEqual(destination.read_bytes(), b"code")
+        self.assertEqual(os.stat(destination).st_ino, os.stat(blob).st_ino)
+
+    def test_index_survives_restart(self):
+        calls = []
+        self.cache.get_or_fetch("bucket/v1.zip", self.fetcher(b"code", calls))
+
+        restarted = ArtifactCache(self.root / "cache", max_bytes=1024)
+        restarted.get_or_fetch("bucket/v1.zip", self.fetcher(b"code", calls))
+
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
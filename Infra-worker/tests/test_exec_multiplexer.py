@@ -0,0 +1,108 @@
+import sys
+from unittest.mock import MagicMock
+
+# Mock dependencies before import
+sys.modules.setdefault("structlog", MagicMock())
+sys.modules.setdefault("prometheus_client", MagicMock())
+
+import os
+import socket
+import struct
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from exec_multiplexer import DockerStreamDemuxer, ExecMultiplexer, TimerWheel, STDERR, STDOUT
+
+
+def frame(stream_type: int, payload: bytes) -> bytes:
+    return struct.pack(">BxxxI", stream_type, len(payload)) + payload
+
+
+class TestDockerStreamDemuxer(unittest.TestCase):
+    def test_frames_split_across_reads(self):
+        data = frame(STDOUT, b"hello ") + frame(STDERR, b"oops") + frame(STDOUT, b"world")
+        demuxer = DockerStreamDemuxer()
+        pieces = []
+        for start in range(0, len(data), 5):
+            pieces.extend((stream, bytes(payload)) for stream, payload in demuxer.feed(data[start:start + 5]))
+
+        self.assertEqual(b"".join(payload for stream, payload in pieces if stream == STDOUT), b"hello world")
+        self.assertEqual(b"".join(payload for stream, payload in pieces if stream == STDERR), b"oops")
+
+
+class _Timer:
+    deadline = None
+    timer_slot = None
+
+
+class TestTimerWheel(unittest.TestCase):
+    def test_expires_only_due_items_across_revolutions(self):
+        wheel = TimerWheel(tick_seconds=1.0, slots=4)
+        wheel._last_tick = 100
+        soon, later, cancelled = _Timer(), _Timer(), _Timer()
+        wheel.schedule(soon, 102.5)
+        wheel.schedule(later, 106.5)  # Same slot, one revolution later
+        wheel.schedule(cancelled, 103.0)
+        wheel.cancel(cancelled)
+
+        self.assertEqual(wheel.advance(101.5), [])
+        self.assertEqual(wheel.advance(102.9), [])  # Due, but its tick has not started
+        self.assertEqual(wheel.advance(103.0), [soon])
+        self.assertEqual(wheel.advance(105.0), [])
+        self.assertEqual(wheel.advance(107.0), [later])
+
+    def test_advance_within_deadline_tick_does_not_skip_item(self):
+        wheel = TimerWheel(tick_seconds=0.05, slots=512)
+        wheel._last_tick = int(10.0 / 0.05)
+        item = _Timer()
+        wheel.schedule(item, 10.03)
+
+        self.assertEqual(wheel.advance(10.01), [])
+        self.assertEqual(wheel.advance(10.06), [item])
+
+
+class TestExecMultiplexer(unittest.TestCase):
+    def setUp(self):
+        self.mux = ExecMultiplexer(tick_seconds=0.01, slots=64)
+        self.sockets = []
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+
+    def _pair(self):
+        ours, theirs = socket.socketpair()
+        self.sockets.append(theirs)
+        return ours, theirs
+
+    def test_streams_are_demultiplexed_into_their_sinks(self):
+        outputs = {}
+        handles = []
+        for name in ("a", "b"):
+            ours, theirs = self._pair()
+            outputs[name] = bytearray()
+            handles.append((self.mux.register(f"exec-{name}", ours, outputs[name].extend, 5), theirs))
+
+        for (handle, theirs), name in zip(handles, ("a", "b")):
+            theirs.sendall(frame(STDOUT, name.encode() * 3) + frame(STDERR, b"!"))
+            theirs.shutdown(socket.SHUT_WR)
+
+        for handle, _theirs in handles:
+            self.assertTrue(handle.wait(5))
+            self.assertEqual(handle.outcome, "eof")
+        self.assertEqual(outputs, {"a": b"aaa!", "b": b"bbb!"})
+
+    def test_deadline_closes_stream_and_marks_timeout(self):
+        ours, theirs = self._pair()
+        output = bytearray()
+        handle = self.mux.register("exec-slow", ours, output.extend, 0.05)
+        theirs.sendall(frame(STDOUT, b"started"))
+
+        self.assertTrue(handle.wait(5))
+        self.assertTrue(handle.timed_out)
+        self.assertEqual(output, b"started")
+
+
+if __name__ == '__main__':
+    unittest.main()
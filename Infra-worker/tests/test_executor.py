@@ -5,7 +5,10 @@ from unittest.mock import MagicMock
 sys.modules["structlog"] = MagicMock()
 sys.modules["docker"] = MagicMock()
 sys.modules["boto3"] = MagicMock()
+sys.modules["boto3.s3"] = MagicMock()
+sys.modules["boto3.s3.transfer"] = MagicMock()
 sys.modules["redis"] = MagicMock() 
+sys.modules["prometheus_client"] = MagicMock()
 
 import unittest
 from pathlib import Path
@@ -15,6 +18,7 @@ import io
 import tarfile
 import zipfile
 import json
+import gzip
 from collections import deque
 from unittest.mock import patch
 
@@ -28,12 +32,19 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 # So mocking sys.modules["docker"] handles container_manager's import.
 
 from executor import TaskExecutor, logger
-from models import TaskMessage
+from models import TaskMessage, ExecutionResult
+from exec_multiplexer import ExecHandle
 from container_manager import ContainerManager
 from storage_adapter import StorageAdapter
 from metrics_collector import MetricsCollector
 from uploader import OutputUploader
+from reporting import ReportingPipeline
+from artifact_cache import ArtifactCache
+from snapshot_cache import SnapshotCache
+from redis_chunk_store import ChunkedRedisStore
+from bytecode_compiler import BytecodeCompiler
 import config
+import json_codec
 import shutil
 import socket
 
@@ -43,6 +54,7 @@ class TestTaskExecutor(unittest.TestCase):
         self.mock_storage = MagicMock(spec=StorageAdapter)
         self.mock_metrics = MagicMock(spec=MetricsCollector)
         self.mock_uploader = MagicMock(spec=OutputUploader)
+        self.mock_reporter = MagicMock(spec=ReportingPipeline)
         
         # Setup Global Semaphore Mock
         self.mock_max_sema = MagicMock()
@@ -54,7 +66,8 @@ class TestTaskExecutor(unittest.TestCase):
             container_manager=self.mock_containers,
             storage_adapter=self.mock_storage,
             metrics_collector=self.mock_metrics,
-            uploader=self.mock_uploader
+            uploader=self.mock_uploader,
+            reporter=self.mock_reporter
         )
         
         # Set return values for stats to avoid TypeError in math ops
@@ -64,6 +77,12 @@ class TestTaskExecutor(unittest.TestCase):
         self.mock_containers.get_cgroup_memory_peak.return_value = 1024 * 1024 * 50 # 50MB
         self.mock_containers.get_process_ids.return_value = frozenset({1, 2})
         
+        self.mock_storage.find_code_archive.return_value = None
+        self.mock_storage.detect_runtime_variant.return_value = None
+        self.mock_containers.resolve_pool.side_effect = lambda runtime: runtime
+        self.mock_storage.find_dependency_layers.return_value = []
+        self.mock_storage.find_compile_cache.return_value = None
+
         # Set return value for metrics analysis
         self.mock_metrics.analyze_execution.return_value = (None, None, None)
         
@@ -116,7 +135,8 @@ class TestTaskExecutor(unittest.TestCase):
         if not result.success:
             print(f"LOGGER ERROR CALLS: {logger.error.call_args_list}")
         self.assertTrue(result.success, msg=f"Execution failed: {result.stderr} | {result.stdout}")
-        self.assertEqual(result.stdout, "Success")
+        self.assertEqual(result.stdout, b"Success")
+        self.assertEqual(json.loads(result.to_json())["stdout"], "Success")
         
         # Verify Flow
         self.mock_metrics.global_limit.acquire.assert_called()
@@ -129,6 +149,97 @@ class TestTaskExecutor(unittest.TestCase):
             mock_container, "func-1", "python", "key"
         )
 
+    def test_cold_start_streams_prebuilt_tar_artifact(self):
+        task = TaskMessage(
+            request_id="req-tar", function_id="func-1", runtime="python", s3_key="v1.tar.zst"
+        )
+        mock_container = MagicMock()
+        mock_container.id = "container-tar"
+        mock_container.is_warm = False
+        self.mock_containers.acquire_container.return_value = mock_container
+
+        work_dir = Path(self.test_dir.name) / "tar_req"
+        work_dir.mkdir()
+        archive = work_dir / "code.tar.zst"
+        archive.write_bytes(b"packed")
+        self.mock_storage.prepare_workspace.return_value = work_dir
+        self.mock_storage.find_code_archive.return_value = archive
+
+        with patch.object(self.executor, '_execute_in_container', return_value=(0, b"ok")):
+            with patch.object(self.executor, '_inject_system_files'):
+                result = self.executor.run(task)
+
+        self.assertTrue(result.success, msg=result.stderr)
+        self.mock_containers.stream_archive_to_container.assert_called_once_with(
+            mock_container, archive, "/workspace", compression="zstd"
+        )
+        self.mock_containers.copy_to_container.assert_not_called()
+
+    def test_cold_start_injects_dependency_layer_before_code(self):
+        task = TaskMessage(
+            request_id="req-layer", function_id="func-1", runtime="python", s3_key="v1.zip"
+        )
+        mock_container = MagicMock()
+        mock_container.id = "container-layer"
+        mock_container.is_warm = False
+        self.mock_containers.acquire_container.return_value = mock_container
+
+        work_dir = Path(self.test_dir.name) / "layer_req"
+        work_dir.mkdir()
+        layer = work_dir / "deps.tar"
+        layer.write_bytes(b"layer")
+        self.mock_storage.prepare_workspace.return_value = work_dir
+        self.mock_storage.find_dependency_layers.return_value = [layer]
+
+        calls = []
+        self.mock_containers.stream_archive_to_container.side_effect = lambda *args, **_: calls.append("layer")
+        self.mock_containers.copy_to_container.side_effect = (
+            lambda _container, source, _target: calls.append(sorted(p.name for p in Path(source).iterdir()))
+        )
+        with patch.object(self.executor, '_execute_in_container', return_value=(0, b"ok")) as execute:
+            with patch.object(self.executor, '_inject_system_files'):
+                result = self.executor.run(task)
+
+        self.assertTrue(result.success, msg=result.stderr)
+        self.mock_containers.stream_archive_to_container.assert_called_once_with(
+            mock_container, layer, "/workspace"
+        )
+        # The layer is extracted first and not copied again with the code.
+        self.assertEqual(calls, ["layer", ["output"]])
+        self.assertEqual(execute.call_args.args[2]["PYTHONPATH"], "/workspace:/workspace/.faas:/workspace/.python_deps")
+
+    def test_node_cold_start_injects_and_stores_compile_cache(self):
+        task = TaskMessage(
+            request_id="req-node", function_id="func-1", runtime="nodejs", s3_key="v1.zip"
+        )
+        mock_container = MagicMock()
+        mock_container.id = "container-node"
+        mock_container.is_warm = False
+        self.mock_containers.acquire_container.return_value = mock_container
+
+        work_dir = Path(self.test_dir.name) / "node_req"
+        work_dir.mkdir()
+        compile_cache = work_dir / "compile_cache.tar"
+        compile_cache.write_bytes(b"cache")
+        self.mock_storage.prepare_workspace.return_value = work_dir
+        self.mock_storage.find_compile_cache.return_value = compile_cache
+
+        with patch.object(self.executor, '_execute_in_container', return_value=(0, b"ok")) as execute:
+            result = self.executor.run(task)
+
+        self.assertTrue(result.success, msg=result.stderr)
+        self.mock_containers.stream_archive_to_container.assert_called_once_with(
+            mock_container, compile_cache, "/workspace"
+        )
+        self.assertFalse(compile_cache.exists())
+        self.assertEqual(execute.call_args.args[2]["NODE_COMPILE_CACHE"], "/workspace/.node_compile_cache")
+
+        harvest = self.mock_storage.store_compile_cache.call_args.args[3]
+        harvest(work_dir)
+        self.mock_containers.copy_from_container.assert_any_call(
+            mock_container, "/workspace/.node_compile_cache", work_dir
+        )
+
     def test_residual_process_discards_completed_container(self):
         task = TaskMessage(
             request_id="req-residual", function_id="func-1", runtime="python", s3_key="key"
@@ -186,6 +297,7 @@ class TestTaskExecutor(unittest.TestCase):
         mock_container = MagicMock()
         mock_container.id = "container-1"
         mock_container.is_warm = True
+        mock_container._system_bundle_hash = self.executor.system_bundle.digest
         self.mock_containers.acquire_container.return_value = mock_container
         
         with patch.object(self.executor, '_execute_in_container', return_value=(0, b"Warm Success")):
@@ -199,11 +311,81 @@ class TestTaskExecutor(unittest.TestCase):
         
         # Verify Flow
         self.mock_storage.prepare_workspace.assert_not_called() # Warm start skips download
-        # User code remains in the warm container, but trusted system files are
-        # injected and verified on every execution.
-        self.mock_containers.copy_to_container.assert_called_once()
+        # User code and the system bundle remain in the warm container. The
+        # trusted system files are root-owned and read-only, so user code
+        # cannot replace them; the required files are verified on every execution.
+        self.mock_containers.copy_to_container.assert_not_called()
+        self.mock_containers.install_system_files.assert_not_called()
         self.mock_containers.verify_files_readable.assert_called_once()
 
+    def test_payload_ref_is_streamed_without_workspace_copy(self):
+        task = TaskMessage(
+            request_id="req-ref", function_id="func-1", runtime="python", s3_key="key",
+            payload_ref="redis://payload:req-ref", payload_content_type="application/x-ndjson"
+        )
+        mock_container = MagicMock()
+        mock_container.id = "container-1"
+        mock_container.is_warm = True
+        mock_container._system_bundle_hash = self.executor.system_bundle.digest
+        self.mock_containers.acquire_container.return_value = mock_container
+        chunks = iter([b'{"rows": [', b"1, 2]}"])
+        self.mock_storage.open_payload.return_value = chunks
+
+        with patch.object(self.executor, '_execute_in_container', return_value=(0, b"ok")) as execute:
+            result = self.executor.run(task)
+
+        self.assertTrue(result.success, msg=result.stderr)
+        self.mock_storage.open_payload.assert_called_once_with("redis://payload:req-ref")
+        self.mock_containers.stream_file_to_container.assert_called_once_with(
+            mock_container, chunks, "/workspace/payload.json"
+        )
+        self.mock_containers.copy_to_container.assert_not_called()
+        env_vars = execute.call_args.args[2]
+        self.assertEqual(env_vars["PAYLOAD_FILE"], "/workspace/payload.json")
+        self.assertEqual(env_vars["PAYLOAD_CONTENT_TYPE"], "application/x-ndjson")
+        self.assertEqual(env_vars["RESULT_FILE"], "/output/.faas_result")
+        self.assertNotIn("PAYLOAD", env_vars)
+
+    def test_large_inline_payload_skips_workspace_copy_on_warm_start(self):
+        task = TaskMessage(
+            request_id="req-big", function_id="func-1", runtime="python", s3_key="key",
+            payload={"blob": "x" * (200 * 1024)}
+        )
+        mock_container = MagicMock()
+        mock_container.id = "container-1"
+        mock_container.is_warm = True
+        mock_container._system_bundle_hash = self.executor.system_bundle.digest
+        self.mock_containers.acquire_container.return_value = mock_container
+
+        with patch.object(self.executor, '_execute_in_container', return_value=(0, b"ok")):
+            result = self.executor.run(task)
+
+        self.assertTrue(result.success, msg=result.stderr)
+        self.mock_containers.copy_to_container.assert_not_called()
+        _container, chunks, target = self.mock_containers.stream_file_to_container.call_args.args
+        self.assertEqual(target, "/workspace/payload.json")
+        self.assertEqual(json.loads(b"".join(chunks)), task.payload)
+
+    def test_system_bundle_is_injected_once_per_container(self):
+        container = MagicMock()
+        container.id = "container-bundle"
+        container._system_bundle_hash = None
+
+        self.executor._inject_system_files(container)
+        self.executor._inject_system_files(container)
+
+        self.mock_containers.install_system_files.assert_called_once_with(
+            container, self.executor.system_bundle.archive
+        )
+        with tarfile.open(fileobj=io.BytesIO(self.executor.system_bundle.archive)) as archive:
+            self.assertEqual(archive.getnames(), ["ai_client.py", "runner.py", "sdk.py"])
+            self.assertTrue(all(member.mode == 0o444 and member.uid == 0 for member in archive.getmembers()))
+
+        # A changed bundle (e.g. after a Worker upgrade) is sent again.
+        container._system_bundle_hash = "older-bundle"
+        self.executor._inject_system_files(container)
+        self.assertEqual(self.mock_containers.install_system_files.call_count, 2)
+
     def test_failed_container_setup_discards_container(self):
         task = TaskMessage(
             request_id="req-3", function_id="func-1", runtime="python", s3_key="key"
@@ -225,6 +407,346 @@ class TestTaskExecutor(unittest.TestCase):
         self.mock_containers.discard_container.assert_called_once_with(mock_container)
         self.mock_containers.release_container.assert_not_called()
 
+    def test_streaming_mode_uploads_outputs_without_host_copy(self):
+        task = TaskMessage(
+            request_id="req-stream", function_id="func-1", runtime="python", s3_key="key"
+        )
+        mock_container = MagicMock()
+        mock_container.id = "container-stream"
+        mock_container.is_warm = True
+        self.mock_containers.acquire_container.return_value = mock_container
+
+        def stream_outputs(_container, _source, handle_file):
+            metrics = json.dumps({"handlerDurationNs": 2_000_000}).encode()
+            handle_file(".faas_runtime_metrics.json", io.BytesIO(metrics), len(metrics))
+            return [handle_file("images/a.png", io.BytesIO(b"png"), 3)]
+
+        self.mock_containers.stream_from_container.side_effect = stream_outputs
+        self.mock_uploader.upload_stream.return_value = {"path": "images/a.png", "size": 3}
+
+        with patch('config.OUTPUT_STREAMING_ENABLED', True):
+            with patch.object(self.executor, '_execute_in_container', return_value=(0, b"ok")):
+                result = self.executor.run(task)
+
+        self.assertTrue(result.success)
+        self.assertEqual(result.handler_duration_ms, 2.0)
+        self.assertIn("images", result.output_files)
+        self.mock_containers.copy_from_container.assert_not_called()
+        self.mock_uploader.upload_stream.assert_called_once()
+        self.assertEqual(self.mock_uploader.upload_stream.call_args.args[1], "images/a.png")
+
+    def test_outputs_uploaded_before_a_stream_failure_are_kept(self):
+        task = TaskMessage(request_id="req-partial", function_id="func-1", runtime="python", s3_key="key")
+        entry = {"path": "a.txt", "key": "outputs/req-partial/a.txt", "size": 1}
+        self.mock_uploader.upload_stream.return_value = entry
+
+        def stream_outputs(_container, _source, handle_file):
+            handle_file("a.txt", io.BytesIO(b"a"), 1)
+            raise ValueError("Unsafe output path: ../escape")
+
+        self.mock_containers.stream_from_container.side_effect = stream_outputs
+
+        outputs = self.executor._stream_outputs(MagicMock(), task, Path(self.test_dir.name))
+
+        self.assertEqual(outputs, [entry])
+
+    def test_prewarm_fills_new_artifact_pool_up_to_warm_count(self):
+        self.mock_containers.function_pool_sizes.return_value = {"v1.zip": 2}
+        containers = [MagicMock(id=f"container-{i}") for i in range(2)]
+        self.mock_containers.acquire_container.side_effect = containers
+        self.mock_storage.prepare_workspace.return_value = Path(self.test_dir.name)
+
+        with patch.object(self.executor, '_inject_system_files'):
+            created = self.executor.prewarm("func-1", "python", "v2.zip", "bucket", 256)
+
+        self.assertEqual(created, 2)
+        self.mock_storage.prefetch.assert_called_once_with("func-1", "v2.zip", "bucket")
+        self.mock_containers.mark_deployed.assert_called_once_with("func-1", "python", "v2.zip")
+        self.mock_containers.acquire_container.assert_called_with("python")
+        for container in containers:
+            self.mock_containers.release_container.assert_any_call(container, "func-1", "python", "v2.zip")
+            self.assertEqual(container._mem_limit_mb, 256)
+        self.assertEqual(self.mock_max_sema.release.call_count, 2)
+        self.assertEqual(self.mock_reporter.schedule_cleanup.call_count, 2)
+
+    def test_image_variant_selects_pool_but_keeps_runtime_command(self):
+        task = TaskMessage(
+            request_id="req-fat", function_id="func-1", runtime="python", s3_key="v1.zip"
+        )
+        mock_container = MagicMock()
+        mock_container.id = "container-fat"
+        mock_container.is_warm = False
+        self.mock_containers.acquire_container.return_value = mock_container
+        work_dir = Path(self.test_dir.name) / "fat_req"
+        work_dir.mkdir()
+        self.mock_storage.prepare_workspace.return_value = work_dir
+        self.mock_storage.detect_runtime_variant.return_value = "python-fat"
+
+        with patch.object(self.executor, '_execute_in_container', return_value=(0, b"ok")) as execute:
+            result = self.executor.run(task)
+
+        self.assertTrue(result.success, msg=result.stderr)
+        self.mock_containers.acquire_container.assert_called_once_with("python-fat", "func-1", "v1.zip")
+        self.mock_containers.release_container.assert_called_once_with(
+            mock_container, "func-1", "python-fat", "v1.zip"
+        )
+        self.assertIn("python /workspace/.faas/runner.py", execute.call_args.args[1][-1])
+
+    def test_image_variant_of_another_runtime_is_ignored(self):
+        pool = self.executor._select_pool("func-1", "nodejs", "v1.zip", "bucket", "python-fat")
+
+        self.assertEqual(pool, "nodejs")
+        self.mock_storage.detect_runtime_variant.assert_not_called()
+
+    def test_prewarm_only_prefetches_without_capacity(self):
+        self.mock_containers.function_pool_sizes.return_value = {"v1.zip": 1}
+        self.mock_max_sema.acquire.return_value = False
+
+        created = self.executor.prewarm("func-1", "python", "v2.zip")
+
+        self.assertEqual(created, 0)
+        self.mock_storage.prefetch.assert_called_once()
+        self.mock_containers.acquire_container.assert_not_called()
+
+    def test_small_result_is_inline_and_large_result_is_offloaded(self):
+        task = TaskMessage(request_id="req-res", function_id="func-1", runtime="python", s3_key="key")
+        output_dir = Path(self.test_dir.name) / "result_output"
+        output_dir.mkdir()
+        result_file = output_dir / ".faas_result"
+
+        result_file.write_bytes(b'{"ok": true}')
+        self.assertEqual(self.executor._collect_result(task, output_dir, []), ('{"ok": true}', None))
+        self.assertFalse(result_file.exists())
+
+        entry = {"path": ".faas_result", "key": "outputs/req-res/.faas_result"}
+        self.mock_uploader.upload_stream.return_value = entry
+        result_file.write_bytes(b"x" * 64)
+        with patch('config.RESULT_INLINE_MAX_BYTES', 16):
+            self.assertEqual(self.executor._collect_result(task, output_dir, []), (None, entry))
+        upload = self.mock_uploader.upload_stream.call_args
+        self.assertEqual(upload.args[:2], ("req-res", ".faas_result"))
+        self.assertEqual(upload.args[3], 64)
+        self.assertFalse(result_file.exists())
+
+        # Streaming mode already uploaded it; it is not listed as a user output.
+        streamed = [{"path": "image.png"}, entry]
+        self.assertEqual(self.executor._collect_result(task, output_dir, streamed), (None, entry))
+        self.assertEqual(streamed, [{"path": "image.png"}])
+
+    def test_log_preview_keeps_head_and_tail_and_spills_long_logs(self):
+        output_dir = Path(self.test_dir.name) / "log_output"
+        output_dir.mkdir()
+        container = MagicMock()
+
+        def _start_exec(_container, command, env, user, workdir, sink, timeout):
+            for chunk in (b"head-", b"x" * 100, b"-the-error"):
+                sink(memoryview(chunk))
+            return ExecHandle("exec-1", MagicMock(), sink)
+
+        self.mock_containers.start_exec.side_effect = _start_exec
+        self.mock_containers.exec_exit_code.return_value = 1
+        with patch('config.MAX_OUTPUT_SIZE', 20), patch('config.LOG_TAIL_BYTES', 10), \
+                patch.object(ExecHandle, 'wait', return_value=True):
+            exit_code, preview = self.executor._execute_in_container(
+                container, ["sh", "-c", "true"], {}, 5000, output_dir, "req-log"
+            )
+
+        self.mock_containers.exec_exit_code.assert_called_once_with("exec-1")
+        self.assertEqual(exit_code, 1)
+        self.assertTrue(preview.startswith(b"head-" + b"x" * 5))
+        self.assertIn(b"[TRUNCATED: 95 bytes omitted", preview)
+        self.assertTrue(preview.endswith(b"-the-error"))
+        self.assertEqual(
+            gzip.decompress((output_dir / "stdout.log.gz").read_bytes()),
+            b"head-" + b"x" * 100 + b"-the-error"
+        )
+        self.assertFalse((output_dir / "stdout.log").exists())
+
+    def test_expired_invocation_stops_container_when_processes_survive(self):
+        output_dir = Path(self.test_dir.name) / "timeout_output"
+        output_dir.mkdir()
+        container = MagicMock()
+        handle = ExecHandle("exec-2", MagicMock(), None)
+        handle.outcome = "timeout"
+        self.mock_containers.start_exec.return_value = handle
+        self.mock_containers.kill_invocation_processes.return_value = False
+
+        with patch.object(ExecHandle, 'wait', return_value=True):
+            with self.assertRaises(TimeoutError):
+                self.executor._execute_in_container(container, ["sh", "-c", "sleep 9"], {}, 100, output_dir)
+
+        container.stop.assert_called_once_with(timeout=1)
+        self.mock_containers.exec_exit_code.assert_not_called()
+
+    def test_timed_out_invocation_keeps_reclaimed_container(self):
+        task = TaskMessage(
+            request_id="req-slow", function_id="func-1", runtime="python", s3_key="key", timeout_ms=100
+        )
+        mock_container = MagicMock()
+        mock_container.id = "container-1"
+        mock_container.is_warm = True
+        mock_container._system_bundle_hash = self.executor.system_bundle.digest
+        self.mock_containers.acquire_container.return_value = mock_container
+        self.mock_containers.get_process_ids.return_value = frozenset({1, 7})
+        handle = ExecHandle("exec-3", MagicMock(), None)
+        handle.outcome = "timeout"
+        self.mock_containers.start_exec.return_value = handle
+        self.mock_containers.kill_invocation_processes.return_value = True
+
+        with patch.object(ExecHandle, 'wait', return_value=True):
+            result = self.executor.run(task)
+
+        self.assertFalse(result.success)
+        self.assertEqual(result.exit_code, 124)
+        self.assertIn("timed out", result.stderr)
+        self.assertTrue(bytes(result.stdout).endswith(b"[TIMEOUT]..."))
+        self.mock_containers.kill_invocation_processes.assert_called_once_with(mock_container, frozenset({1, 7}))
+        mock_container.stop.assert_not_called()
+        self.mock_containers.release_container.assert_called_once()
+        self.mock_containers.discard_container.assert_not_called()
+
+    def test_result_stdout_is_decoded_only_when_serialised(self):
+        result = ExecutionResult(
+            request_id="req-log", function_id="func-1", success=True, exit_code=0,
+            stdout=bytearray("caf\u00e9 \xff".encode("utf-8") + b"\xff"), stderr="", duration_ms=1
+        )
+        self.assertEqual(json.loads(result.to_json())["stdout"], "caf\u00e9 \xff\ufffd")
+
+    def test_inline_payload_is_serialised_once(self):
+        task = TaskMessage(
+            request_id="req-env", function_id="func-1", runtime="python", s3_key="key",
+            payload={"name": "caf\u00e9"}
+        )
+        mock_container = MagicMock()
+        mock_container.id = "container-1"
+        mock_container.is_warm = True
+        mock_container._system_bundle_hash = self.executor.system_bundle.digest
+        self.mock_containers.acquire_container.return_value = mock_container
+
+        with patch('json_codec.dumps', wraps=json_codec.dumps) as dumps, \
+                patch.object(self.executor, '_execute_in_container', return_value=(0, b"ok")) as execute:
+            result = self.executor.run(task)
+
+        self.assertTrue(result.success, msg=result.stderr)
+        dumps.assert_called_once_with(task.payload)
+        env_vars = execute.call_args.args[2]
+        self.assertEqual(json.loads(env_vars["PAYLOAD"]), task.payload)
+
+    def test_micro_batch_runs_handler_once_and_splits_results(self):
+        tasks = [
+            TaskMessage(
+                request_id=f"req-{i}", function_id="func-1", runtime="python", s3_key="key",
+                payload={"n": i}, batch_max_size=3
+            )
+            for i in range(3)
+        ]
+        mock_container = MagicMock()
+        mock_container.id = "container-1"
+        mock_container.is_warm = True
+        mock_container._system_bundle_hash = self.executor.system_bundle.digest
+        self.mock_containers.acquire_container.return_value = mock_container
+
+        def _execute(container, cmd, env, timeout_ms, output_dir, *args):
+            (output_dir / ".faas_result").write_text(json.dumps([{"n": 0}, "one", 2]))
+            return 0, b"logs"
+
+        with patch.object(self.executor, '_execute_in_container', side_effect=_execute) as execute:
+            results = self.executor.run_batch(tasks)
+
+        execute.assert_called_once()
+        env_vars = execute.call_args.args[2]
+        self.assertEqual(json.loads(env_vars["PAYLOAD"]), [{"n": 0}, {"n": 1}, {"n": 2}])
+        self.assertEqual(env_vars["BATCH_REQUEST_IDS"], "req-0,req-1,req-2")
+        self.assertEqual([r.request_id for r in results], ["req-0", "req-1", "req-2"])
+        self.assertEqual([r.result for r in results], ['{"n":0}', "one", "2"])
+        self.assertTrue(all(r.success for r in results))
+        self.assertTrue(all(r.stdout == b"[BATCH] Shared log of 3 batched requests\nlogs" for r in results))
+
+    def test_micro_batch_tasks_with_different_models_run_separately(self):
+        tasks = [
+            TaskMessage(request_id="req-a", function_id="func-1", runtime="python", s3_key="key",
+                        payload={"n": 0}, model_id="llama3:8b"),
+            TaskMessage(request_id="req-b", function_id="func-1", runtime="python", s3_key="key",
+                        payload={"n": 1}, model_id="mistral:7b"),
+            TaskMessage(request_id="req-c", function_id="func-1", runtime="python", s3_key="key",
+                        payload={"n": 2}, model_id="llama3:8b"),
+        ]
+        runs = []
+
+        def _run(task):
+            runs.append(task)
+            if task.batch_request_ids:
+                body = json.dumps([f"{task.model_id}:{payload['n']}" for payload in task.payload])
+            else:
+                body = f"{task.model_id}:{task.payload['n']}"
+            return ExecutionResult(
+                request_id=task.request_id, function_id="func-1", success=True, exit_code=0,
+                stdout=b"", stderr="", duration_ms=1, result=body
+            )
+
+        with patch.object(self.executor, 'run', side_effect=_run):
+            results = self.executor.run_batch(tasks)
+
+        self.assertEqual([task.model_id for task in runs], ["llama3:8b", "mistral:7b"])
+        self.assertEqual(runs[0].batch_request_ids, ["req-a", "req-c"])
+        self.assertEqual([r.request_id for r in results], ["req-a", "req-b", "req-c"])
+        self.assertEqual([r.result for r in results], ["llama3:8b:0", "mistral:7b:1", "llama3:8b:2"])
+        self.assertNotEqual(TaskExecutor.batch_key(tasks[0]), TaskExecutor.batch_key(tasks[1]))
+
+    def test_shared_container_invocation_uses_its_own_output_directory(self):
+        task = TaskMessage(
+            request_id="req-shared", function_id="func-1", runtime="python", s3_key="key",
+            max_concurrency_per_container=4
+        )
+        mock_container = MagicMock()
+        mock_container.id = "container-1"
+        mock_container.is_warm = True
+        mock_container._mem_limit_mb = 128
+        mock_container._system_bundle_hash = self.executor.system_bundle.digest
+        self.mock_containers.acquire_shared.return_value = mock_container
+        ledger = MagicMock()
+        ledger.leave.return_value = (4000, 10, 20, 30, 40)
+        self.mock_containers.usage_ledger.return_value = ledger
+        self.mock_containers.remove_paths.return_value = True
+
+        with patch.object(self.executor, '_execute_in_container', return_value=(0, b"ok")) as execute:
+            result = self.executor.run(task)
+
+        self.assertTrue(result.success, msg=result.stderr)
+        self.mock_containers.acquire_shared.assert_called_once_with("python", "func-1", "key", 4, 128)
+        env_vars = execute.call_args.args[2]
+        output_dir = env_vars["OUTPUT_DIR"]
+        self.assertRegex(output_dir, r"^/output/[0-9a-f]{32}$")
+        self.assertEqual(env_vars["RESULT_FILE"], f"{output_dir}/.faas_result")
+        self.assertIn(f"mkdir -p {output_dir} ", execute.call_args.args[1][2])
+        self.assertTrue(execute.call_args.kwargs["shared"])
+        self.mock_containers.copy_from_container.assert_called_once_with(
+            mock_container, output_dir, unittest.mock.ANY
+        )
+        self.assertEqual((result.network_rx, result.network_tx, result.disk_read), (10, 20, 30))
+        self.mock_containers.reset_cgroup_peak.assert_not_called()
+        self.mock_containers.get_process_ids.assert_not_called()
+        self.assertEqual(self.mock_containers.remove_paths.call_args.args[1][0], output_dir)
+        self.mock_containers.release_shared.assert_called_once_with(
+            mock_container, "func-1", "python", "key", True
+        )
+        self.mock_containers.release_container.assert_not_called()
+
+    def test_micro_batch_without_result_list_fails_every_request(self):
+        tasks = [
+            TaskMessage(request_id=f"req-{i}", function_id="func-1", runtime="python", s3_key="key")
+            for i in range(2)
+        ]
+        batch_result = ExecutionResult(
+            request_id="req-0", function_id="func-1", success=True, exit_code=0,
+            stdout=b"", stderr="", duration_ms=5, result='{"n": 1}'
+        )
+        with patch.object(self.executor, 'run', return_value=batch_result):
+            results = self.executor.run_batch(tasks)
+
+        self.assertEqual([r.request_id for r in results], ["req-0", "req-1"])
+        self.assertTrue(all(not r.success and "one result per event" in r.stderr for r in results))
+
     def test_reads_and_removes_handler_duration_metadata(self):
         output_dir = Path(self.test_dir.name) / "metrics_output"
         container_output_dir = output_dir / "output"
@@ -247,10 +769,25 @@ class TestTaskExecutor(unittest.TestCase):
         self.assertFalse(metrics_file.exists())
 
 
+class _InlineThread:
+    """Runs a background target synchronously inside the test."""
+    def __init__(self, target, args=(), daemon=None):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        self.target(*self.args)
+
+
 class TestContainerArchiveCopy(unittest.TestCase):
     def setUp(self):
         self.manager = ContainerManager.__new__(ContainerManager)
         self.manager.docker = MagicMock()
+        self.manager.deployed_artifacts = {}
+        self.manager.recycled = {}
+        self.manager.pool_locks = {runtime: __import__("threading").Lock() for runtime in ("python", "nodejs", "cpp", "go")}
+        self.manager.baseline_processes = {}
+        self.manager.cpu_pinning = False
         self.container = MagicMock()
         self.container.id = "container-1"
         self.container.exec_run.return_value = MagicMock(exit_code=0, output=b"")
@@ -286,6 +823,31 @@ class TestContainerArchiveCopy(unittest.TestCase):
         )
         self.exec_socket.shutdown.assert_called_once_with(socket.SHUT_WR)
 
+    def test_system_files_are_installed_read_only_as_root(self):
+        self.manager.install_system_files(self.container, b"bundle")
+
+        command = self.manager.docker.api.exec_create.call_args.args[1]
+        self.assertEqual(command[-2:], ["sh", "/workspace/.faas"])
+        self.assertIn('tar -xf - -C "$1" && chmod -R a-w "$1"', command[2])
+        self.assertEqual(self.manager.docker.api.exec_create.call_args.kwargs["user"], "0:0")
+        self.exec_socket.sendall.assert_called_once_with(b"bundle")
+
+    def test_stream_file_feeds_chunks_into_exec_stdin(self):
+        self.manager.stream_file_to_container(
+            self.container, iter([b"abc", b"", b"def"]), "/workspace/payload.json"
+        )
+
+        self.manager.docker.api.exec_create.assert_called_once_with(
+            "container-1",
+            ["sh", "-c", 'cat > "$1"', "sh", "/workspace/payload.json"],
+            stdin=True,
+            stdout=True,
+            stderr=True,
+            user="65534:65534"
+        )
+        self.assertEqual([c.args[0] for c in self.exec_socket.sendall.call_args_list], [b"abc", b"def"])
+        self.exec_socket.shutdown.assert_called_once_with(socket.SHUT_WR)
+
     def test_process_snapshot_returns_container_pids(self):
         self.container.top.return_value = {
             "Titles": ["PID"],
@@ -324,6 +886,26 @@ class TestContainerArchiveCopy(unittest.TestCase):
         self.assertTrue(self.manager.docker.containers.run.call_args.kwargs["read_only"])
         self.assertIn("/tmp", self.manager.docker.containers.run.call_args.kwargs["tmpfs"])
 
+    def test_image_variant_has_its_own_pool_and_replenishment(self):
+        fat = MagicMock(id="fat-1")
+        self.manager.pools = {"python": deque(["base-1"]), "python-fat": deque(["fat-1"])}
+        self.manager.pool_locks["python-fat"] = __import__("threading").Lock()
+        self.manager.docker.containers.get.return_value = fat
+
+        with patch.dict('config.WARM_POOL_SIZES', {"python-fat": 0}), \
+                patch.object(self.manager, '_replenish_pool') as replenish:
+            container = self.manager.acquire_container("python-fat")
+
+        self.assertIs(container, fat)
+        self.assertEqual(list(self.manager.pools["python"]), ["base-1"])
+        # A variant configured without a warm pool is not refilled after use.
+        replenish.assert_not_called()
+
+        # Without its image the variant falls back to the base runtime pool.
+        del self.manager.pools["python-fat"]
+        self.assertEqual(self.manager.resolve_pool("python-fat"), "python")
+        self.assertEqual(self.manager.resolve_pool("nodejs-unknown"), "python")
+
     def test_new_artifact_discards_stale_function_pool(self):
         self.manager.function_pool_lock = __import__("threading").Lock()
         stale = MagicMock()
@@ -333,11 +915,266 @@ class TestContainerArchiveCopy(unittest.TestCase):
         self.manager.function_pools = {stale_key: [stale], active_key: []}
         self.manager.pid_cache = {stale.id: 123}
 
-        self.manager._discard_stale_function_pools("func-1", "python", "v2.zip")
+        # Without a recorded process baseline the container cannot be reset.
+        with patch('container_manager.threading.Thread', _InlineThread):
+            self.manager._discard_stale_function_pools("func-1", "python", "v2.zip")
 
         self.assertNotIn(stale_key, self.manager.function_pools)
         stale.remove.assert_called_once_with(force=True)
 
+    def test_stale_container_is_reset_and_reused_for_new_deployment(self):
+        self.manager.function_pool_lock = __import__("threading").Lock()
+        self.manager.pid_cache = {}
+        self.container.top.side_effect = [
+            {"Processes": [["100"], ["101"], ["150"]]},
+            {"Processes": [["100"], ["101"]]},
+        ]
+        self.manager.baseline_processes = {self.container.id: frozenset({100, 101})}
+        self.manager.function_pools = {("func-1", "python", "v1.zip"): [self.container]}
+        self.manager.pools = {"python": deque(), "nodejs": deque(), "cpp": deque(), "go": deque()}
+
+        with patch('container_manager.threading.Thread', _InlineThread), \
+                patch('container_manager.os.kill') as kill:
+            self.manager._discard_stale_function_pools("func-1", "python", "v2.zip")
+            acquired = self.manager.acquire_container("python", "func-1", "v2.zip")
+
+        kill.assert_called_once_with(150, __import__("signal").SIGKILL)
+        reset_command = self.container.exec_run.call_args.args[0]
+        self.assertIn("/workspace /output /tmp", reset_command[2])
+        self.assertIs(acquired, self.container)
+        self.assertFalse(acquired.is_warm)
+        self.container.remove.assert_not_called()
+        self.manager.docker.containers.get.assert_not_called()
+
+    def test_recycled_container_is_only_reused_by_its_own_function(self):
+        self.manager.function_pool_lock = __import__("threading").Lock()
+        self.manager.function_pools = {}
+        self.manager.deployed_artifacts = {}
+        self.manager.pools = {"python": deque(["fresh"])}
+        self.manager.recycled = {("func-1", "python"): deque([self.container])}
+        fresh = MagicMock(id="fresh")
+        self.manager.docker.containers.get.return_value = fresh
+
+        with patch.dict('config.WARM_POOL_SIZES', {"python": 0}):
+            other = self.manager.acquire_container("python", "func-2", "v1.zip")
+            own = self.manager.acquire_container("python", "func-1", "v2.zip")
+
+        self.assertIs(other, fresh)
+        self.assertIs(own, self.container)
+        self.assertEqual(self.manager.recycled, {})
+
+    def test_timed_out_invocation_is_killed_inside_frozen_container(self):
+        self.container.top.side_effect = [
+            {"Processes": [["100"], ["101"], ["150"], ["151"]]},
+            {"Processes": [["100"], ["101"]]},
+        ]
+        events = []
+        self.container.pause.side_effect = lambda: events.append("pause")
+        self.container.unpause.side_effect = lambda: events.append("unpause")
+
+        with patch('container_manager.os.kill', side_effect=lambda pid, sig: events.append(pid)):
+            reclaimed = self.manager.kill_invocation_processes(self.container, frozenset({100, 101}))
+
+        self.assertTrue(reclaimed)
+        self.assertEqual(events[0], "pause")
+        self.assertEqual(sorted(events[1:3]), [150, 151])
+        self.assertEqual(events[3], "unpause")
+        self.container.stop.assert_not_called()
+
+    def test_timed_out_invocation_without_baseline_is_not_reclaimed(self):
+        self.assertFalse(self.manager.kill_invocation_processes(self.container, None))
+        self.container.pause.side_effect = RuntimeError("pause failed")
+        self.assertFalse(self.manager.kill_invocation_processes(self.container, frozenset({100})))
+
+    def test_shared_timeout_kills_only_the_exec_process_tree(self):
+        self.manager.docker.api.exec_inspect.return_value = {"Pid": 150}
+        self.container.top.return_value = {"Processes": [
+            ["100", "0"], ["101", "100"], ["150", "100"], ["151", "150"], ["152", "151"], ["160", "100"]
+        ]}
+
+        with patch('container_manager.os.kill') as kill:
+            self.assertTrue(self.manager.kill_exec_processes(self.container, "exec-1"))
+
+        self.assertEqual(sorted(call.args[0] for call in kill.call_args_list), [150, 151, 152])
+        self.container.pause.assert_called_once()
+        self.container.unpause.assert_called_once()
+
+    def _shared_manager(self):
+        self.manager.function_pool_lock = __import__("threading").Lock()
+        self.manager.function_pools = {}
+        self.manager.shared_containers = {}
+        self.manager.usage_ledgers = {}
+        self.manager.pid_cache = {}
+        self.manager.pools = {"python": deque()}
+        self.manager.baseline_processes = {self.container.id: frozenset({100, 101})}
+        self.manager.acquire_container = MagicMock(return_value=self.container)
+        # Set by the executor when it sizes the container
+        self.container._mem_limit_mb = 128
+
+    def test_shared_container_takes_invocations_up_to_its_concurrency(self):
+        self._shared_manager()
+        first = self.manager.acquire_shared("python", "func-1", "v1.zip", 2, 128)
+        self.manager.share_container(first, "func-1", "python", "v1.zip")
+        second = self.manager.acquire_shared("python", "func-1", "v1.zip", 2, 128)
+        other = MagicMock()
+        self.manager.acquire_container.return_value = other
+        third = self.manager.acquire_shared("python", "func-1", "v1.zip", 2, 128)
+
+        self.assertIs(second, first)
+        self.assertTrue(second.is_warm)
+        self.assertEqual(first.active_invocations, 2)
+        self.assertIs(third, other)
+        self.assertEqual(self.manager.acquire_container.call_count, 2)
+
+    def test_shared_container_is_not_joined_with_another_memory_size(self):
+        self._shared_manager()
+        first = self.manager.acquire_shared("python", "func-1", "v1.zip", 2, 128)
+        self.manager.share_container(first, "func-1", "python", "v1.zip")
+        resized = MagicMock()
+        self.manager.acquire_container.return_value = resized
+
+        second = self.manager.acquire_shared("python", "func-1", "v1.zip", 2, 512)
+
+        self.assertIs(second, resized)
+        self.assertEqual(first.active_invocations, 1)
+
+    def test_last_shared_invocation_returns_clean_container_to_pool(self):
+        self._shared_manager()
+        container = self.manager.acquire_shared("python", "func-1", "v1.zip", 2, 128)
+        self.manager.share_container(container, "func-1", "python", "v1.zip")
+        self.manager.acquire_shared("python", "func-1", "v1.zip", 2, 128)
+        self.container.top.return_value = {"Processes": [["100"], ["101"]]}
+
+        self.manager.release_shared(container, "func-1", "python", "v1.zip")
+        self.assertEqual(self.manager.function_pools, {})
+        self.manager.release_shared(container, "func-1", "python", "v1.zip")
+
+        self.assertEqual(self.manager.function_pools[("func-1", "python", "v1.zip")], [container])
+        self.assertEqual(self.manager.shared_containers, {})
+        self.assertEqual(self.manager.usage_ledgers, {})
+
+    def test_retired_shared_container_is_discarded_after_last_invocation(self):
+        self._shared_manager()
+        container = self.manager.acquire_shared("python", "func-1", "v1.zip", 2, 128)
+        self.manager.share_container(container, "func-1", "python", "v1.zip")
+        self.manager.acquire_shared("python", "func-1", "v1.zip", 2, 128)
+
+        self.manager.release_shared(container, "func-1", "python", "v1.zip", reusable=False)
+        self.assertEqual(self.manager.shared_containers, {})
+        container.remove.assert_not_called()
+        self.manager.release_shared(container, "func-1", "python", "v1.zip")
+
+        container.remove.assert_called_once_with(force=True)
+        self.assertEqual(self.manager.function_pools, {})
+
+    def test_cpu_quota_and_burst_scale_with_memory(self):
+        self.manager.cpu_pinning = True
+        self.manager.cpu_load = [0] * 8
+        self.manager.cpusets = {}
+        self.manager.cpuset_lock = __import__("threading").Lock()
+
+        with tempfile.TemporaryDirectory() as cgroup_dir, \
+                patch('config.CGROUP_PATH_CPU_MAX_BURST', f"{cgroup_dir}/{{container_id}}.burst"), \
+                patch('cpu_sizing.os.cpu_count', return_value=8):
+            burst_file = Path(cgroup_dir) / "container-1.burst"
+            burst_file.write_text("0")
+            self.manager.update_resources(self.container, 3538, "python")
+            burst = burst_file.read_text()
+
+        limits = self.container.update.call_args.kwargs
+        self.assertEqual(limits["mem_limit"], "3538m")
+        self.assertEqual((limits["cpu_period"], limits["cpu_quota"]), (100000, 200000))
+        self.assertEqual(limits["cpuset_cpus"], "0,1")
+        self.assertEqual(burst, "200000")
+
+        # A small function gets the minimum share; its cores are re-assigned.
+        with patch('cpu_sizing.os.cpu_count', return_value=8):
+            self.manager.update_resources(self.container, 128, "python")
+        self.assertEqual(self.container.update.call_args.kwargs["cpu_quota"], 12500)
+        self.assertEqual(self.manager.cpu_load, [1, 0, 0, 0, 0, 0, 0, 0])
+
+        self.manager.pid_cache = {}
+        self.manager.discard_container(self.container)
+        self.assertEqual(self.manager.cpu_load, [0] * 8)
+
+    def test_burst_is_cleared_before_the_quota_shrinks(self):
+        events = []
+        self.container.update.side_effect = lambda **limits: events.append(("quota", limits["cpu_quota"]))
+
+        with patch.object(self.manager, '_set_cpu_burst', side_effect=lambda _id, burst: events.append(("burst", burst))), \
+                patch('cpu_sizing.os.cpu_count', return_value=8):
+            self.manager.update_resources(self.container, 1024, "python")
+            events.clear()
+            self.manager.update_resources(self.container, 128, "python")
+
+        self.assertEqual(events, [("burst", 0), ("quota", 12500), ("burst", 12500)])
+
+    def test_cpuset_is_released_when_pinning_fails_or_container_is_removed(self):
+        self.manager.cpu_pinning = True
+        self.manager.cpu_load = [0] * 4
+        self.manager.cpusets = {}
+        self.manager.cpuset_lock = __import__("threading").Lock()
+        self.manager.pid_cache = {}
+
+        self.container.update.side_effect = RuntimeError("container is gone")
+        with patch('cpu_sizing.os.cpu_count', return_value=4):
+            self.manager.update_resources(self.container, 3538, "python")
+        self.assertEqual(self.manager.cpu_load, [0] * 4)
+
+        self.container.update.side_effect = None
+        with patch('cpu_sizing.os.cpu_count', return_value=4):
+            self.manager.update_resources(self.container, 3538, "python")
+        self.assertEqual(self.manager.cpu_load, [1, 1, 0, 0])
+        # The pool cannot take the container back, so it is removed
+        self.manager.function_pool_lock = MagicMock()
+        self.manager.function_pool_lock.__enter__.side_effect = RuntimeError("lock failed")
+        self.manager.release_container(self.container, "func-1", "python", "v1.zip")
+
+        self.container.remove.assert_called_once_with(force=True)
+        self.assertEqual(self.manager.cpu_load, [0] * 4)
+        self.assertEqual(self.manager.cpusets, {})
+
+    def test_failed_reset_discards_stale_container(self):
+        self.manager.pid_cache = {}
+        self.container.top.return_value = {"Processes": [["100"]]}
+        self.container.exec_run.return_value = MagicMock(exit_code=1, output=b"")
+        self.manager.baseline_processes = {self.container.id: frozenset({100})}
+
+        self.manager._recycle_containers([(self.container, "func-1", "python")])
+
+        self.assertEqual(self.manager.recycled, {})
+        self.container.remove.assert_called_once_with(force=True)
+
+    def test_deployed_artifact_pool_survives_older_invocations(self):
+        self.manager.function_pool_lock = __import__("threading").Lock()
+        prewarmed = MagicMock()
+        old_key = ("func-1", "python", "v1.zip")
+        deployed_key = ("func-1", "python", "v2.zip")
+        self.manager.function_pools = {old_key: [MagicMock()], deployed_key: [prewarmed]}
+        self.manager.pid_cache = {}
+        self.manager.mark_deployed("func-1", "python", "v2.zip")
+
+        # A queued invocation of the previous version must not drop the
+        # containers pre-warmed for the new one.
+        self.manager._discard_stale_function_pools("func-1", "python", "v1.zip")
+
+        self.assertEqual(self.manager.function_pools[deployed_key], [prewarmed])
+        self.assertEqual(self.manager.function_pool_sizes("func-1", "python"), {"v1.zip": 1, "v2.zip": 1})
+        prewarmed.remove.assert_not_called()
+
+    def test_tar_artifact_is_sent_with_sendfile(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive_path = Path(tmpdir) / "code.tar"
+            with tarfile.open(archive_path, "w") as archive:
+                info = tarfile.TarInfo("main.py")
+                archive.addfile(info, io.BytesIO(b""))
+
+            self.manager.stream_archive_to_container(self.container, archive_path, "/workspace")
+
+        self.exec_socket.sendfile.assert_called_once()
+        self.exec_socket.sendall.assert_not_called()
+        self.exec_socket.shutdown.assert_called_once_with(socket.SHUT_WR)
+
     def test_copy_raises_when_archive_extraction_fails(self):
         self.manager.docker.api.exec_inspect.return_value = {"ExitCode": 2}
         with tempfile.TemporaryDirectory() as tmpdir:
@@ -366,11 +1203,64 @@ class TestContainerArchiveCopy(unittest.TestCase):
             self.assertTrue(metrics_file.exists())
 
         self.container.exec_run.assert_called_once_with(
-            ["tar", "-cf", "-", "-C", "/output", "."],
+            ["sh", "-c", 'cd "$1" && [ -n "$(ls -A)" ] && exec tar -cf - . || true', "sh", "/output"],
             stream=True,
             user="65534:65534"
         )
 
+    def test_copy_from_container_skips_empty_output(self):
+        self.container.exec_run.return_value = MagicMock(exit_code=None, output=iter([]))
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            target = Path(tmpdir)
+            with patch("tarfile.open") as tar_open:
+                self.manager.copy_from_container(self.container, "/output", target)
+
+            tar_open.assert_not_called()
+            self.assertEqual(list(target.iterdir()), [])
+
+    def test_stream_from_container_hands_members_to_callback(self):
+        archive_stream = io.BytesIO()
+        with tarfile.open(fileobj=archive_stream, mode="w") as archive:
+            directory = tarfile.TarInfo("./images")
+            directory.type = tarfile.DIRTYPE
+            archive.addfile(directory)
+            for name, data in (("./images/a.png", b"aaaa"), ("./result.json", b"{}")):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                archive.addfile(info, io.BytesIO(data))
+        raw = archive_stream.getvalue()
+        # Deliver the tar in small, unaligned chunks like a Docker exec stream.
+        self.container.exec_run.return_value = MagicMock(
+            exit_code=None,
+            output=iter([raw[i:i + 700] for i in range(0, len(raw), 700)])
+        )
+
+        received = {}
+
+        def handle_file(relative_path, fileobj, size):
+            received[relative_path] = (fileobj.read(), size)
+            return relative_path
+
+        results = self.manager.stream_from_container(self.container, "/output", handle_file)
+
+        self.assertEqual(results, ["images/a.png", "result.json"])
+        self.assertEqual(received["images/a.png"], (b"aaaa", 4))
+        self.assertEqual(received["result.json"], (b"{}", 2))
+
+    def test_stream_from_container_rejects_path_traversal(self):
+        archive_stream = io.BytesIO()
+        with tarfile.open(fileobj=archive_stream, mode="w") as archive:
+            info = tarfile.TarInfo("../escape.txt")
+            info.size = 1
+            archive.addfile(info, io.BytesIO(b"x"))
+        self.container.exec_run.return_value = MagicMock(
+            exit_code=None, output=iter([archive_stream.getvalue()])
+        )
+
+        with self.assertRaisesRegex(ValueError, "Unsafe output path"):
+            self.manager.stream_from_container(self.container, "/output", MagicMock())
+
     def test_output_archive_rejects_symlinks(self):
         archive_stream = io.BytesIO()
         with tarfile.open(fileobj=archive_stream, mode="w") as archive:
@@ -402,11 +1292,56 @@ class TestStorageArtifactCache(unittest.TestCase):
             self.assertTrue((root / "main.py").exists())
             self.assertFalse((Path(tmpdir) / "workspace-escape" / "payload.txt").exists())
 
+    def test_payload_ref_is_read_in_chunks_from_allowed_sources(self):
+        adapter = StorageAdapter.__new__(StorageAdapter)
+        adapter.redis = MagicMock()
+        adapter.redis.strlen.return_value = 5
+        adapter.redis.getrange.side_effect = lambda _key, start, end: b"abcde"[start:end + 1]
+        adapter.s3 = MagicMock()
+        body = MagicMock()
+        body.iter_chunks.return_value = iter([b"s3-", b"data"])
+        adapter.s3.get_object.return_value = {"Body": body}
+
+        with patch('storage_adapter.PAYLOAD_STREAM_CHUNK_SIZE', 2), \
+                patch('config.PAYLOAD_REF_BUCKETS', frozenset({"user-data"})):
+            self.assertEqual(list(adapter.open_payload("redis://payload:req-1")), [b"ab", b"cd", b"e"])
+            self.assertEqual(b"".join(adapter.open_payload("s3://user-data/inputs/req-1.json")), b"s3-data")
+            for ref in ("redis://job:req-1", "s3://faas-user-code/functions/f.zip", "file:///etc/passwd"):
+                with self.assertRaises(ValueError):
+                    adapter.open_payload(ref)
+
+        adapter.s3.get_object.assert_called_once_with(Bucket="user-data", Key="inputs/req-1.json")
+        body.close.assert_called_once()
+
+    def test_tar_artifact_is_left_packed(self):
+        adapter = StorageAdapter.__new__(StorageAdapter)
+        adapter.s3 = MagicMock()
+        adapter.redis = None
+        adapter.redis_chunks = None
+        adapter.compile_caches = None
+        adapter.s3.download_file.side_effect = (
+            lambda _bucket, _key, destination: Path(destination).write_bytes(b"tar")
+        )
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            adapter.artifacts = ArtifactCache(Path(tmpdir) / "artifacts")
+            with patch('config.DOCKER_WORK_DIR_ROOT', tmpdir):
+                with patch.object(adapter, '_unzip_safely') as unzip:
+                    workspace = adapter.prepare_workspace("req-1", "func-1", "functions/func-1/v1.tar.zst", "bucket")
+                    archive = StorageAdapter.find_code_archive(workspace)
+
+                unzip.assert_not_called()
+                self.assertEqual(archive, workspace / "code.tar.zst")
+
+        self.assertEqual(StorageAdapter.artifact_format("v1.TAR"), "tar")
+        self.assertEqual(StorageAdapter.artifact_format("v1.zip"), "zip")
+
     def test_cache_key_changes_with_deployed_s3_artifact(self):
         adapter = StorageAdapter.__new__(StorageAdapter)
         adapter.s3 = MagicMock()
         adapter.redis = MagicMock()
         adapter.redis.get.return_value = None
+        adapter.redis_chunks = ChunkedRedisStore(adapter.redis)
 
         def create_download(_bucket, _key, destination):
             Path(destination).write_bytes(b"zip-placeholder")
@@ -414,6 +1349,10 @@ class TestStorageArtifactCache(unittest.TestCase):
         adapter.s3.download_file.side_effect = create_download
 
         with tempfile.TemporaryDirectory() as tmpdir:
+            adapter.artifacts = ArtifactCache(Path(tmpdir) / "artifacts")
+            adapter.snapshots = None
+            adapter.layers = None
+            adapter.compile_caches = None
             with patch('config.DOCKER_WORK_DIR_ROOT', tmpdir):
                 with patch.object(adapter, '_unzip_safely'):
                     adapter.prepare_workspace("req-1", "func-1", "functions/func-1/v1.zip", "bucket")
@@ -424,5 +1363,317 @@ class TestStorageArtifactCache(unittest.TestCase):
         self.assertNotEqual(cache_keys[0], cache_keys[1])
         self.assertTrue(all(key.startswith("code:func-1:") for key in cache_keys))
 
+    def test_zip_artifact_is_served_from_prepared_snapshot(self):
+        adapter = StorageAdapter.__new__(StorageAdapter)
+        adapter.s3 = MagicMock()
+        adapter.redis = None
+        adapter.redis_chunks = None
+        adapter._snapshot_fingerprint = None
+        adapter.bytecode = BytecodeCompiler(image="python:%d.%d" % sys.version_info[:2])
+        adapter.layers = None
+        adapter.compile_caches = None
+
+        def create_download(_bucket, key, destination):
+            with zipfile.ZipFile(destination, "w") as archive:
+                archive.writestr("main.py", f"# {key}\ndef handler(event, context): return event")
+
+        adapter.s3.download_file.side_effect = create_download
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            adapter.artifacts = ArtifactCache(Path(tmpdir) / "artifacts")
+            adapter.snapshots = SnapshotCache(Path(tmpdir) / "snapshots", min_free_bytes=0)
+            with patch('config.DOCKER_WORK_DIR_ROOT', tmpdir):
+                with patch.object(adapter, '_unzip_safely', wraps=adapter._unzip_safely) as unzip:
+                    first = adapter.prepare_workspace("req-1", "func-1", "functions/func-1/v1.zip", "bucket")
+                    second = adapter.prepare_workspace("req-2", "func-1", "functions/func-1/v1.zip", "bucket")
+
+                self.assertEqual(unzip.call_count, 1)
+                archive = StorageAdapter.find_code_archive(second)
+                self.assertEqual(archive, second / "code.tar")
+                with tarfile.open(archive) as tar:
+                    self.assertIn("main.py", tar.getnames())
+                    # The SDK comes from the read-only system bundle, never the snapshot.
+                    self.assertNotIn("sdk.py", tar.getnames())
+                    # Bytecode is precompiled once and shipped in the snapshot.
+                    self.assertIn(f"__pycache__/main.{sys.implementation.cache_tag}.pyc", tar.getnames())
+                self.assertFalse((first / "main.py").exists())
+
+                # The previous deployment is kept for the cutover; older ones are invalidated.
+                adapter.prepare_workspace("req-3", "func-1", "functions/func-1/v2.zip", "bucket")
+                self.assertEqual(len(adapter.snapshots._lru), 2)
+                adapter.prepare_workspace("req-4", "func-1", "functions/func-1/v3.zip", "bucket")
+                self.assertEqual(len(adapter.snapshots._lru), 2)
+
+    def test_prefetch_prepares_snapshot_without_workspace(self):
+        adapter = StorageAdapter.__new__(StorageAdapter)
+        adapter.s3 = MagicMock()
+        adapter.redis = None
+        adapter.redis_chunks = None
+        adapter._snapshot_fingerprint = None
+        adapter.bytecode = None
+        adapter.layers = None
+        adapter.compile_caches = None
+
+        def create_download(_bucket, _key, destination):
+            with zipfile.ZipFile(destination, "w") as archive:
+                archive.writestr("main.py", "def handler(event, context): return event")
+
+        adapter.s3.download_file.side_effect = create_download
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            adapter.artifacts = ArtifactCache(Path(tmpdir) / "artifacts")
+            adapter.snapshots = SnapshotCache(Path(tmpdir) / "snapshots", min_free_bytes=0)
+            with patch('config.DOCKER_WORK_DIR_ROOT', str(Path(tmpdir) / "workspaces")):
+                adapter.prefetch("func-1", "functions/func-1/v2.zip", "bucket")
+                self.assertEqual(len(adapter.snapshots._lru), 1)
+                self.assertFalse((Path(tmpdir) / "workspaces").exists())
+
+                workspace = adapter.prepare_workspace("req-1", "func-1", "functions/func-1/v2.zip", "bucket")
+
+            self.assertEqual(adapter.s3.download_file.call_count, 1)
+            self.assertIsNotNone(StorageAdapter.find_code_archive(workspace))
+
+    def test_deploy_cutover_keeps_old_and_new_snapshots(self):
+        adapter = StorageAdapter.__new__(StorageAdapter)
+        adapter.s3 = MagicMock()
+        adapter.redis = None
+        adapter.redis_chunks = None
+        adapter._snapshot_fingerprint = None
+        adapter.bytecode = None
+        adapter.layers = None
+        adapter.compile_caches = None
+
+        def create_download(_bucket, key, destination):
+            with zipfile.ZipFile(destination, "w") as archive:
+                archive.writestr("main.py", f"# {key}\ndef handler(event, context): return event")
+
+        adapter.s3.download_file.side_effect = create_download
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            adapter.artifacts = ArtifactCache(Path(tmpdir) / "artifacts")
+            adapter.snapshots = SnapshotCache(Path(tmpdir) / "snapshots", min_free_bytes=0)
+            with patch('config.DOCKER_WORK_DIR_ROOT', tmpdir), \
+                    patch.object(adapter.snapshots, '_build', wraps=adapter.snapshots._build) as build:
+                adapter.prepare_workspace("req-1", "func-1", "functions/func-1/v1.zip", "bucket")
+                adapter.prefetch("func-1", "functions/func-1/v2.zip", "bucket")
+                # Requests already routed to the old artifact interleave with new ones.
+                for index, key in enumerate(["v1", "v2", "v1", "v2", "v1"]):
+                    adapter.prepare_workspace(f"req-{index + 2}", "func-1", f"functions/func-1/{key}.zip", "bucket")
+
+            self.assertEqual(build.call_count, 2)
+            self.assertEqual(len(adapter.snapshots._lru), 2)
+
+    def _layer_adapter(self, tmpdir):
+        adapter = StorageAdapter.__new__(StorageAdapter)
+        adapter.s3 = MagicMock()
+        adapter.redis = None
+        adapter.redis_chunks = None
+        adapter._snapshot_fingerprint = None
+        adapter.bytecode = None
+        adapter.snapshots = None
+        adapter._failed_layers = set()
+        adapter.artifacts = ArtifactCache(Path(tmpdir) / "artifacts")
+        adapter.layers = SnapshotCache(Path(tmpdir) / "layers", min_free_bytes=0, kind="layer")
+        adapter.compile_caches = None
+        adapter._empty_compile_caches = set()
+
+        def create_download(_bucket, key, destination):
+            with zipfile.ZipFile(destination, "w") as archive:
+                archive.writestr("main.py", f"# {key}\nimport pkg")
+                archive.writestr("requirements.txt", "pkg==1.0  # pinned\n--index-url http://example.invalid\n")
+
+        adapter.s3.download_file.side_effect = create_download
+        return adapter
+
+    def test_functions_with_same_requirements_share_dependency_layer(self):
+        installs = []
+
+        def fake_pip(command, **_kwargs):
+            target = Path(command[command.index("--target") + 1])
+            requirements = Path(command[command.index("-r") + 1]).read_text()
+            installs.append(requirements)
+            (target / "pkg").mkdir(parents=True)
+            (target / "pkg" / "__init__.py").write_text("VERSION = '1.0'")
+            return MagicMock(returncode=0)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            adapter = self._layer_adapter(tmpdir)
+            with patch('config.DOCKER_WORK_DIR_ROOT', tmpdir), \
+                    patch('storage_adapter.subprocess.run', side_effect=fake_pip):
+                first = adapter.prepare_workspace("req-1", "func-1", "functions/func-1/v1.zip", "bucket")
+                second = adapter.prepare_workspace("req-2", "func-2", "functions/func-2/v1.zip", "bucket")
+
+            self.assertEqual(installs, ["pkg==1.0\n"])
+            self.assertTrue((first / "main.py").exists())
+            for workspace in (first, second):
+                layer = StorageAdapter.find_dependency_layers(workspace)[0]
+                with tarfile.open(layer) as tar:
+                    self.assertIn(".python_deps/pkg/__init__.py", tar.getnames())
+
+    def test_failed_dependency_layer_build_is_not_retried(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            adapter = self._layer_adapter(tmpdir)
+            with patch('config.DOCKER_WORK_DIR_ROOT', tmpdir), \
+                    patch('storage_adapter.subprocess.run',
+                          return_value=MagicMock(returncode=1, stderr=b"No matching distribution")) as pip:
+                first = adapter.prepare_workspace("req-1", "func-1", "functions/func-1/v1.zip", "bucket")
+                adapter.prepare_workspace("req-2", "func-1", "functions/func-1/v1.zip", "bucket")
+
+            self.assertEqual(pip.call_count, 1)
+            self.assertEqual(StorageAdapter.find_dependency_layers(first), [])
+            self.assertTrue((first / "main.py").exists())
+
+    def test_direct_reference_requirements_fail_the_layer_build(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            adapter = self._layer_adapter(tmpdir)
+            for requirement in ("pkg @ https://example.invalid/pkg-1.0-py3-none-any.whl",
+                                "git+https://example.invalid/pkg.git", "./vendor/pkg", "pkg-1.0.tar.gz"):
+                with self.subTest(requirement=requirement), \
+                        patch('storage_adapter.subprocess.run') as pip, \
+                        self.assertRaises(RuntimeError):
+                    adapter._build_python_layer(f"pkg2>=1.0; python_version >= '3.8'\n{requirement}\n".encode(),
+                                                Path(tmpdir) / "tree")
+                pip.assert_not_called()
+
+
+    def test_node_layer_is_keyed_by_lockfile_and_split_from_code(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            adapter = self._layer_adapter(tmpdir)
+            adapter.snapshots = SnapshotCache(Path(tmpdir) / "snapshots", min_free_bytes=0)
+
+            def create_download(_bucket, key, destination):
+                with zipfile.ZipFile(destination, "w") as archive:
+                    archive.writestr("index.js", f"// {key}\nrequire('left-pad')")
+                    archive.writestr("package-lock.json", '{"lockfileVersion": 3}')
+                    archive.writestr("node_modules/left-pad/index.js", "module.exports = 1")
+
+            adapter.s3.download_file.side_effect = create_download
+            with patch('config.DOCKER_WORK_DIR_ROOT', tmpdir):
+                first = adapter.prepare_workspace("req-1", "func-1", "functions/func-1/v1.zip", "bucket")
+                second = adapter.prepare_workspace("req-2", "func-2", "functions/func-2/v1.zip", "bucket")
+
+            self.assertEqual(len(adapter.layers._lru), 1)
+            for workspace in (first, second):
+                layers = StorageAdapter.find_dependency_layers(workspace)
+                self.assertEqual([layer.name for layer in layers], ["node_deps.tar"])
+                with tarfile.open(layers[0]) as tar:
+                    self.assertEqual(tar.getnames(), ["node_modules", "node_modules/left-pad",
+                                                      "node_modules/left-pad/index.js"])
+                with tarfile.open(StorageAdapter.find_code_archive(workspace)) as tar:
+                    self.assertIn("index.js", tar.getnames())
+                    self.assertNotIn("node_modules", tar.getnames())
+
+    def test_bundled_node_modules_are_not_shared_across_different_trees(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            adapter = self._layer_adapter(tmpdir)
+            adapter.snapshots = SnapshotCache(Path(tmpdir) / "snapshots", min_free_bytes=0)
+
+            def create_download(_bucket, key, destination):
+                with zipfile.ZipFile(destination, "w") as archive:
+                    archive.writestr("index.js", "require('left-pad')")
+                    archive.writestr("package-lock.json", '{"lockfileVersion": 3}')
+                    archive.writestr("node_modules/left-pad/index.js", f"module.exports = '{key}'")
+
+            adapter.s3.download_file.side_effect = create_download
+            with patch('config.DOCKER_WORK_DIR_ROOT', tmpdir):
+                first = adapter.prepare_workspace("req-1", "func-1", "functions/func-1/v1.zip", "bucket")
+                second = adapter.prepare_workspace("req-2", "func-2", "functions/func-2/v1.zip", "bucket")
+
+            self.assertEqual(len(adapter.layers._lru), 2)
+            for workspace, key in ((first, "func-1"), (second, "func-2")):
+                with tarfile.open(StorageAdapter.find_dependency_layers(workspace)[0]) as tar:
+                    source = tar.extractfile("node_modules/left-pad/index.js").read()
+                self.assertIn(key.encode(), source)
+
+    def test_compile_cache_is_stored_once_per_artifact(self):
+        harvests = []
+
+        def harvest(target):
+            harvests.append(target)
+            (target / "v8-cache.bin").write_bytes(b"code-cache")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            adapter = self._layer_adapter(tmpdir)
+            adapter.compile_caches = SnapshotCache(
+                Path(tmpdir) / "compile-cache", min_free_bytes=0, kind="compile_cache"
+            )
+            with patch('config.DOCKER_WORK_DIR_ROOT', tmpdir), \
+                    patch('storage_adapter.subprocess.run', return_value=MagicMock(returncode=1, stderr=b"")):
+                first = adapter.prepare_workspace("req-1", "func-1", "functions/func-1/v1.zip", "bucket")
+                self.assertIsNone(StorageAdapter.find_compile_cache(first))
+
+                self.assertTrue(adapter.store_compile_cache("func-1", "functions/func-1/v1.zip", "bucket", harvest))
+                self.assertTrue(adapter.store_compile_cache("func-1", "functions/func-1/v1.zip", "bucket", harvest))
+                second = adapter.prepare_workspace("req-2", "func-1", "functions/func-1/v1.zip", "bucket")
+
+                # A runtime that writes no cache is only asked once.
+                self.assertFalse(adapter.store_compile_cache("func-1", "functions/func-1/v2.zip", "bucket", list))
+                self.assertFalse(adapter.store_compile_cache("func-1", "functions/func-1/v2.zip", "bucket", harvest))
+
+            self.assertEqual(len(harvests), 1)
+            compile_cache = StorageAdapter.find_compile_cache(second)
+            self.assertIsNotNone(compile_cache)
+            with tarfile.open(compile_cache) as tar:
+                self.assertIn(".node_compile_cache/v8-cache.bin", tar.getnames())
+
+
+
+    def test_fat_image_variant_is_detected_from_main_imports(self):
+        sources = {
+            "fat.zip": {"main.py": "import os\nfrom pandas import DataFrame\n"},
+            "vendored.zip": {"main.py": "import numpy as np\n", "numpy/__init__.py": ""},
+            "plain.zip": {"main.py": "from .numpy import x\nimport json\n"},
+        }
+
+        def create_download(_bucket, key, destination):
+            with zipfile.ZipFile(destination, "w") as archive:
+                for name, data in sources[key.rsplit("/", 1)[-1]].items():
+                    archive.writestr(name, data)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            adapter = self._layer_adapter(tmpdir)
+            adapter._variants = __import__("collections").OrderedDict()
+            adapter._variants_lock = __import__("threading").Lock()
+            adapter.s3.download_file.side_effect = create_download
+
+            detect = adapter.detect_runtime_variant
+            self.assertEqual(detect("func-1", "python", "functions/fat.zip", "bucket"), "python-fat")
+            self.assertEqual(detect("func-1", "python", "functions/fat.zip", "bucket"), "python-fat")
+            self.assertIsNone(detect("func-2", "python", "functions/vendored.zip", "bucket"))
+            self.assertIsNone(detect("func-3", "python", "functions/plain.zip", "bucket"))
+            self.assertIsNone(detect("func-4", "nodejs", "functions/fat.zip", "bucket"))
+
+        self.assertEqual(adapter.s3.download_file.call_count, 3)
+
+
+class TestBytecodeCompiler(unittest.TestCase):
+    def test_interpreter_must_match_runtime_image(self):
+        compiler = BytecodeCompiler(image="faas-runtime/python:2.7.18", interpreter=sys.executable)
+
+        self.assertIsNone(compiler.interpreter)
+        self.assertEqual(compiler.tag, "")
+        with tempfile.TemporaryDirectory() as tmpdir:
+            (Path(tmpdir) / "main.py").write_text("x = 1")
+            self.assertFalse(compiler.compile_tree(Path(tmpdir)))
+            self.assertFalse((Path(tmpdir) / "__pycache__").exists())
+
+    def test_compiles_hash_based_pyc_with_container_paths(self):
+        compiler = BytecodeCompiler(image="python:%d.%d" % sys.version_info[:2])
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            package = Path(tmpdir) / "vendor" / "lib"
+            package.mkdir(parents=True)
+            (package / "util.py").write_text("def f(): return 1")
+            (Path(tmpdir) / "broken.py").write_text("def broken(:")
+
+            self.assertFalse(compiler.compile_tree(Path(tmpdir)))
+
+            pyc = package / "__pycache__" / f"util.{sys.implementation.cache_tag}.pyc"
+            self.assertTrue(pyc.is_file())
+            # PEP 552 flags: bit 0 set = hash-based, bit 1 set = checked
+            self.assertEqual(int.from_bytes(pyc.read_bytes()[4:8], "little"), 0b11)
+            self.assertIn(b"/workspace/vendor/lib/util.py", pyc.read_bytes())
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,31 @@
+import json
+import math
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json_codec
+
+
+class TestJsonCodec(unittest.TestCase):
+    def test_integers_beyond_64_bits_are_kept_exact(self):
+        big = 123456789012345678901
+        document = {"id": big, "negative": -9223372036854775809, "small": 7}
+
+        encoded = json_codec.dumps(document)
+
+        self.assertEqual(json.loads(encoded), document)
+        for data in (encoded, bytearray(encoded), memoryview(encoded), encoded.decode()):
+            self.assertEqual(json_codec.loads(data), document)
+            self.assertIsInstance(json_codec.loads(data)["id"], int)
+
+    def test_documents_only_the_stdlib_accepts_still_parse(self):
+        self.assertTrue(math.isnan(json_codec.loads(b'[NaN]')[0]))
+        with self.assertRaises(ValueError):
+            json_codec.loads(b'[1,]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import sys
+from unittest.mock import MagicMock
+
+# Mock dependencies before import
+sys.modules.setdefault("structlog", MagicMock())
+sys.modules.setdefault("prometheus_client", MagicMock())
+
+import gzip
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_capture import LogCapture, LiveLogStream, RingBuffer
+
+
+class FakeRedis:
+    """Records stream entries and TTLs written through pipelines."""
+    def __init__(self, fail=False):
+        self.entries = []
+        self.ttls = {}
+        self.fail = fail
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def xadd(self, key, fields, maxlen=None, approximate=True):
+        self.commands.append(("xadd", key, fields, maxlen))
+
+    def expire(self, key, ttl):
+        self.commands.append(("expire", key, ttl))
+
+    def execute(self):
+        if self.redis.fail:
+            raise ConnectionError("redis down")
+        for command in self.commands:
+            if command[0] == "xadd":
+                self.redis.entries.append(command[1:])
+            else:
+                self.redis.ttls[command[1]] = command[2]
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_keeps_most_recent_bytes_across_wraps(self):
+        ring = RingBuffer(5)
+        for chunk in (b"abc", b"de", b"fg", b"h"):
+            ring.write(chunk)
+        target = bytearray(len(ring))
+        ring.copy_into(target, 0)
+        self.assertEqual(target, b"defgh")
+
+        ring.write(b"0123456789")
+        ring.copy_into(target, 0)
+        self.assertEqual(target, b"56789")
+
+
+class TestLogCapture(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.TemporaryDirectory()
+        self.spill_path = Path(self.test_dir.name) / "stdout.log.gz"
+
+    def tearDown(self):
+        self.test_dir.cleanup()
+
+    def test_short_log_stays_in_memory(self):
+        capture = LogCapture(self.spill_path, head_bytes=8, tail_bytes=8)
+        capture.write(b"hello ")
+        capture.write(b"world")
+
+        self.assertEqual(capture.close(), b"hello world")
+        self.assertFalse(capture.spilled)
+        self.assertFalse(self.spill_path.exists())
+
+    def test_spill_is_capped(self):
+        capture = LogCapture(self.spill_path, head_bytes=4, tail_bytes=4, spill_max_bytes=10)
+        for chunk in (b"0123", b"4567", b"89ab", b"cdef"):
+            capture.write(chunk)
+
+        preview = capture.close()
+        self.assertTrue(capture.spilled)
+        self.assertEqual(preview, b"0123\n...[TRUNCATED: 8 bytes omitted, full log in S3]...\ncdef")
+        spilled = gzip.decompress(self.spill_path.read_bytes())
+        self.assertTrue(spilled.startswith(b"0123456789"))
+        self.assertIn(b"LOG SPILL LIMIT REACHED", spilled)
+        self.assertNotIn(b"cdef", spilled)
+
+    def test_spill_is_written_by_drain_not_by_write(self):
+        capture = LogCapture(self.spill_path, head_bytes=4, tail_bytes=4)
+        for chunk in (b"0123", b"4567", b"89ab"):
+            capture.write(chunk)
+        self.assertFalse(self.spill_path.exists())
+
+        capture.drain()
+        self.assertTrue(capture.spilled)
+        capture.write(b"cdef")
+        capture.close()
+        self.assertEqual(gzip.decompress(self.spill_path.read_bytes()), b"0123456789abcdef")
+
+    def test_writes_after_close_are_ignored(self):
+        capture = LogCapture(self.spill_path, head_bytes=4, tail_bytes=4)
+        capture.write(b"done")
+        capture.close()
+        capture.write(b"late")
+        self.assertEqual(capture.total, 4)
+
+
+class TestLiveLogStream(unittest.TestCase):
+    def test_batches_chunks_and_ends_with_eof(self):
+        redis = FakeRedis()
+        live = LiveLogStream(redis, "req-1", batch_bytes=8, flush_interval=60, maxlen=100, ttl_seconds=30)
+        capture = LogCapture(Path(tempfile.gettempdir()) / "unused.gz", head_bytes=64, tail_bytes=64, live=live)
+
+        capture.write(b"abc")
+        capture.drain()
+        self.assertEqual(redis.entries, [])
+        capture.write(b"defgh")
+        # Batches are only sent by drain(), never from the writing thread
+        self.assertEqual(redis.entries, [])
+        capture.drain()
+        capture.write(b"ij")
+        capture.close()
+
+        self.assertEqual(redis.entries, [
+            ("logs:req-1", {"data": b"abcdefgh"}, 100),
+            ("logs:req-1", {"data": b"ij"}, 100),
+            ("logs:req-1", {"eof": "10"}, 100)
+        ])
+        self.assertEqual(redis.ttls, {"logs:req-1": 30})
+
+    def test_redis_failure_disables_stream(self):
+        live = LiveLogStream(FakeRedis(fail=True), "req-2", batch_bytes=1, flush_interval=60)
+        live.append(b"x")
+        self.assertTrue(live.ready())
+        live.flush(live.take())
+        self.assertIsNone(live.redis)
+        live.append(b"y")
+        self.assertFalse(live.ready())
+
+
+if __name__ == '__main__':
+    unittest.main()
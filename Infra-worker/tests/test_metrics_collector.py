@@ -0,0 +1,134 @@
+import sys
+from unittest.mock import MagicMock
+
+# Mock dependencies before import
+sys.modules.setdefault("structlog", MagicMock())
+sys.modules.setdefault("boto3", MagicMock())
+sys.modules.setdefault("prometheus_client", MagicMock())
+
+import io
+import json
+import os
+import unittest
+from contextlib import redirect_stdout
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from unittest.mock import patch
+
+from metrics_collector import AutoTuner, CloudWatchPublisher
+
+
+class TestCloudWatchAggregation(unittest.TestCase):
+    def make_publisher(self, mode="api", **kwargs):
+        publisher = CloudWatchPublisher(
+            "ap-northeast-2", mode=mode, flush_interval=3600, client=MagicMock(), **kwargs
+        )
+        self.addCleanup(publisher._stop_event.set)
+        return publisher
+
+    def test_flush_batches_values_and_counts_per_function(self):
+        publisher = self.make_publisher()
+        publisher.publish_peak_memory("func-1", "python", 100)
+        publisher.publish_peak_memory("func-1", "python", 100)
+        publisher.publish_peak_memory("func-1", "python", 200)
+        publisher.publish_peak_memory("func-2", "nodejs", 50)
+
+        publisher.flush()
+
+        publisher.client.put_metric_data.assert_called_once()
+        datums = publisher.client.put_metric_data.call_args.kwargs["MetricData"]
+        self.assertEqual(len(datums), 2)
+        func1 = next(d for d in datums if d["Dimensions"][0]["Value"] == "func-1")
+        self.assertEqual(dict(zip(func1["Values"], func1["Counts"])), {100.0: 2.0, 200.0: 1.0})
+
+        publisher.flush()
+        publisher.client.put_metric_data.assert_called_once()
+
+    def test_many_distinct_values_collapse_into_statistic_set(self):
+        publisher = self.make_publisher()
+        for value in range(CloudWatchPublisher.MAX_VALUES_PER_DATUM + 10):
+            publisher.publish_peak_memory("func-1", "python", value)
+
+        publisher.flush()
+
+        datum = publisher.client.put_metric_data.call_args.kwargs["MetricData"][0]
+        self.assertNotIn("Values", datum)
+        stats = datum["StatisticValues"]
+        self.assertEqual(stats["SampleCount"], 160.0)
+        self.assertEqual(stats["Minimum"], 0.0)
+        self.assertEqual(stats["Maximum"], 159.0)
+
+    def test_buffer_limit_drops_points(self):
+        publisher = self.make_publisher(max_buffered_points=2)
+        for value in (1, 2, 3):
+            publisher.publish_peak_memory("func-1", "python", value)
+
+        publisher.flush()
+
+        datum = publisher.client.put_metric_data.call_args.kwargs["MetricData"][0]
+        self.assertEqual(sum(datum["Counts"]), 2.0)
+
+    def test_buffer_limit_counts_distinct_entries_not_points(self):
+        publisher = self.make_publisher(max_buffered_points=2)
+        for value in (1, 2, 1, 2, 1):
+            publisher.publish_peak_memory("func-1", "python", value)
+        publisher.publish_peak_memory("func-2", "python", 1)
+
+        publisher.flush()
+
+        datums = publisher.client.put_metric_data.call_args.kwargs["MetricData"]
+        self.assertEqual(len(datums), 1)
+        self.assertEqual(dict(zip(datums[0]["Values"], datums[0]["Counts"])), {1.0: 3.0, 2.0: 2.0})
+
+    def test_collapsed_bucket_releases_its_buffered_entries(self):
+        limit = CloudWatchPublisher.MAX_VALUES_PER_DATUM + 1
+        publisher = self.make_publisher(max_buffered_points=limit)
+        for value in range(CloudWatchPublisher.MAX_VALUES_PER_DATUM + 1):
+            publisher.publish_peak_memory("func-1", "python", value)
+        publisher.publish_peak_memory("func-2", "python", 1)
+
+        publisher.flush()
+
+        datums = publisher.client.put_metric_data.call_args.kwargs["MetricData"]
+        self.assertEqual(len(datums), 2)
+
+    def test_emf_mode_writes_log_lines_without_api_calls(self):
+        publisher = self.make_publisher(mode="emf")
+        publisher.publish_peak_memory("func-1", "python", 128)
+
+        buffer = io.StringIO()
+        with redirect_stdout(buffer):
+            publisher.flush()
+
+        publisher.client.put_metric_data.assert_not_called()
+        document = json.loads(buffer.getvalue().strip())
+        self.assertEqual(document["PeakMemoryBytes"], [128.0])
+        self.assertEqual(document["FunctionId"], "func-1")
+        self.assertEqual(document["_aws"]["CloudWatchMetrics"][0]["Dimensions"], [["FunctionId", "Runtime"]])
+
+
+
+class TestAutoTuner(unittest.TestCase):
+    def test_cpu_bound_tip_reflects_memory_proportional_cpu(self):
+        metrics = {"peak_memory": 100 * 1024 * 1024, "duration_ms": 1000}
+        with patch('cpu_sizing.os.cpu_count', return_value=8):
+            tip, _savings, rec_mb = AutoTuner.analyze(
+                dict(metrics, allocated_mb=1769, cpu_usage=950_000)
+            )
+            self.assertIn("of 1 vCPU", tip)
+            # Memory of a CPU-bound function buys its CPU; it is not waste.
+            self.assertIsNone(rec_mb)
+
+            tip, _savings, _rec_mb = AutoTuner.analyze(
+                dict(metrics, allocated_mb=1769, cpu_usage=500_000)
+            )
+            self.assertNotIn("CPU Bound", tip)
+
+            tip, _savings, _rec_mb = AutoTuner.analyze(
+                dict(metrics, allocated_mb=12288, cpu_usage=5_900_000)
+            )
+            self.assertIn("maximum", tip)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import sys
+from unittest.mock import MagicMock
+
+# Mock dependencies before import
+sys.modules.setdefault("structlog", MagicMock())
+sys.modules.setdefault("prometheus_client", MagicMock())
+
+import os
+import threading
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from micro_batcher import MicroBatcher
+
+
+class TestMicroBatcher(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+        self.dispatched = threading.Event()
+
+    def _dispatch(self, items):
+        self.batches.append(items)
+        self.dispatched.set()
+
+    def test_full_batch_is_dispatched_immediately_per_key(self):
+        batcher = MicroBatcher(self._dispatch, window_seconds=60)
+        batcher.add(("f1", "k1"), "a", 2)
+        batcher.add(("f2", "k1"), "x", 2)
+        self.assertEqual(self.batches, [])
+
+        batcher.add(("f1", "k1"), "b", 2)
+        self.assertEqual(self.batches, [["a", "b"]])
+
+        batcher.flush_all()
+        self.assertEqual(self.batches, [["a", "b"], ["x"]])
+
+    def test_partial_batch_is_dispatched_when_window_expires(self):
+        batcher = MicroBatcher(self._dispatch, window_seconds=0.01)
+        batcher.add("key", "a", 10)
+        batcher.add("key", "b", 10)
+
+        self.assertTrue(self.dispatched.wait(5))
+        self.assertEqual(self.batches, [["a", "b"]])
+
+
+if __name__ == '__main__':
+    unittest.main()
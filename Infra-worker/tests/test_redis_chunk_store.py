@@ -0,0 +1,98 @@
+import sys
+from unittest.mock import MagicMock
+
+# Mock dependencies before import
+sys.modules.setdefault("structlog", MagicMock())
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from redis_chunk_store import ChunkedRedisStore
+
+
+class FakeRedis:
+    """Just enough of redis-py (bytes mode) for the chunk store."""
+    def __init__(self):
+        self.values = {}
+        self.ttls = {}
+        self.commands = []
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value.encode() if isinstance(value, str) else value
+        self.ttls[key] = ttl
+
+    def expire(self, key, ttl):
+        self.ttls[key] = ttl
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.queued = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self.queued.append((name, args))
+        return queue
+
+    def execute(self):
+        self.redis.commands.append(len(self.queued))
+        replies = [getattr(self.redis, name)(*args) for name, args in self.queued]
+        self.queued = []
+        return replies
+
+
+class TestChunkedRedisStore(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.root = Path(self.tmpdir.name)
+        self.redis = FakeRedis()
+        self.store = ChunkedRedisStore(self.redis, chunk_size=4, ttl_seconds=60, pipeline_chunks=2)
+        self.source = self.root / "bundle.zip"
+        self.source.write_bytes(b"0123456789abcdefXYZ")
+
+    def test_round_trip_through_chunks(self):
+        self.store.write_file("code:f:h", self.source)
+
+        self.assertEqual(self.redis.values["code:f:h:chunk:0"], b"0123")
+        self.assertIn("code:f:h:manifest", self.redis.values)
+        # 5 chunks with 2 per pipeline: three round trips, the last one with the manifest.
+        self.assertEqual(self.redis.commands, [2, 2, 2])
+
+        target = self.root / "restored.zip"
+        self.assertTrue(self.store.read_to_file("code:f:h", target))
+        self.assertEqual(target.read_bytes(), self.source.read_bytes())
+
+    def test_read_refreshes_ttl(self):
+        self.store.write_file("code:f:h", self.source)
+        self.redis.ttls = {}
+
+        self.store.read_to_file("code:f:h", self.root / "restored.zip")
+
+        self.assertEqual(self.redis.ttls["code:f:h:chunk:4"], 60)
+        self.assertEqual(self.redis.ttls["code:f:h:manifest"], 60)
+
+    def test_corrupt_or_missing_chunk_is_a_miss(self):
+        self.store.write_file("code:f:h", self.source)
+        self.redis.values["code:f:h:chunk:1"] = b"XXXX"
+        self.assertFalse(self.store.read_to_file("code:f:h", self.root / "a.zip"))
+
+        del self.redis.values["code:f:h:chunk:1"]
+        self.assertFalse(self.store.read_to_file("code:f:h", self.root / "b.zip"))
+
+        self.assertFalse(self.store.read_to_file("code:other:h", self.root / "c.zip"))
+
+
+if __name__ == "__main__":
+    unittest.main()
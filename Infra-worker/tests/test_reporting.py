@@ -0,0 +1,119 @@
+import sys
+from unittest.mock import MagicMock
+
+# Mock dependencies before import
+sys.modules.setdefault("structlog", MagicMock())
+sys.modules.setdefault("prometheus_client", MagicMock())
+
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reporting import ReportingPipeline
+
+
+class TestReportingPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.task = SimpleNamespace(request_id="req-1", function_id="func-1", runtime="python")
+
+    def make_workspace(self, name, with_output=True):
+        work_dir = Path(self.tmpdir.name) / name
+        output_dir = work_dir / "output"
+        output_dir.mkdir(parents=True)
+        if with_output:
+            (output_dir / "result.txt").write_text("done")
+        return work_dir, output_dir
+
+    def wait_for(self, condition, timeout=2.0):
+        event = threading.Event()
+        for _ in range(int(timeout / 0.01)):
+            if condition():
+                return True
+            event.wait(0.01)
+        return condition()
+
+    def test_uploads_then_removes_workspace(self):
+        uploader = MagicMock()
+        metrics = MagicMock()
+        pipeline = ReportingPipeline(metrics, uploader)
+        work_dir, output_dir = self.make_workspace("uploaded")
+
+        pipeline.submit(self.task, 1024, output_dir, work_dir)
+
+        # The datapoint is buffered inline, before submit() returns.
+        metrics.cw.publish_peak_memory.assert_called_once_with("func-1", "python", 1024)
+        self.assertTrue(self.wait_for(lambda: not work_dir.exists()))
+        uploader.upload_outputs.assert_called_once_with("req-1", str(output_dir), scope="func-1")
+
+    def test_upload_manifest_is_reported(self):
+        manifest = [
+            {"path": "a.txt", "key": "outputs/req-1/a.txt", "size": 4, "sha256": "ab", "deduplicated": False},
+            {"path": "b.txt", "key": "outputs/req-1/b.txt", "size": 4, "sha256": "ab", "deduplicated": True,
+             "copiedFrom": "outputs/req-1/a.txt"}
+        ]
+        uploader = MagicMock()
+        uploader.upload_outputs.return_value = manifest
+        pipeline = ReportingPipeline(MagicMock(), uploader)
+        work_dir, output_dir = self.make_workspace("manifest")
+
+        with patch("reporting.logger") as logger:
+            pipeline.submit(self.task, 0, output_dir, work_dir)
+            self.assertTrue(self.wait_for(lambda: not work_dir.exists()))
+
+        logger.info.assert_called_once()
+        fields = logger.info.call_args.kwargs
+        self.assertEqual(fields["request_id"], "req-1")
+        self.assertEqual((fields["files"], fields["bytes"], fields["deduplicated"]), (2, 8, 1))
+        self.assertEqual(fields["manifest"], manifest)
+
+    def test_slow_upload_does_not_delay_cleanup_of_other_workspaces(self):
+        release_upload = threading.Event()
+        uploader = MagicMock()
+        uploader.upload_outputs.side_effect = lambda *_, **__: release_upload.wait(5)
+        pipeline = ReportingPipeline(MagicMock(), uploader, upload_workers=1)
+        self.addCleanup(release_upload.set)
+
+        slow_dir, slow_output = self.make_workspace("slow")
+        empty_dir, empty_output = self.make_workspace("empty", with_output=False)
+        pipeline.submit(self.task, 0, slow_output, slow_dir)
+        pipeline.submit(self.task, 0, empty_output, empty_dir)
+
+        self.assertTrue(self.wait_for(lambda: not empty_dir.exists()))
+        self.assertTrue(slow_dir.exists())
+
+        release_upload.set()
+        self.assertTrue(self.wait_for(lambda: not slow_dir.exists()))
+
+    def test_full_upload_queue_drops_outputs_but_cleans_workspace(self):
+        release_upload = threading.Event()
+        uploader = MagicMock()
+        uploader.upload_outputs.side_effect = lambda *_, **__: release_upload.wait(5)
+        pipeline = ReportingPipeline(
+            MagicMock(), uploader, queue_size=1, upload_workers=1, submit_timeout=0.01
+        )
+        self.addCleanup(release_upload.set)
+
+        workspaces = [self.make_workspace(f"ws-{index}") for index in range(3)]
+        pipeline.submit(self.task, 0, workspaces[0][1], workspaces[0][0])
+        self.assertTrue(self.wait_for(lambda: uploader.upload_outputs.called))
+        for work_dir, output_dir in workspaces[1:]:
+            pipeline.submit(self.task, 0, output_dir, work_dir)
+
+        # One upload in flight, one queued, the third is dropped and cleaned.
+        dropped_dir = workspaces[2][0]
+        self.assertTrue(self.wait_for(lambda: not dropped_dir.exists()))
+        release_upload.set()
+        self.assertTrue(self.wait_for(lambda: not any(w.exists() for w, _ in workspaces)))
+        self.assertEqual(uploader.upload_outputs.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+from types import ModuleType
+from unittest.mock import patch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import runner
+import sdk
+
+
+class TestSDKPayloadAccess(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.payload_file = Path(self.tmpdir.name) / "payload.json"
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _env(self, data: bytes, content_type: str):
+        self.payload_file.write_bytes(data)
+        return patch.dict(
+            os.environ,
+            {"PAYLOAD_FILE": str(self.payload_file), "PAYLOAD_CONTENT_TYPE": content_type},
+            clear=False,
+        )
+
+    def test_json_array_is_parsed_incrementally_across_reads(self):
+        records = [{"id": i, "name": "é" * (i % 3), "value": 12345.678} for i in range(50)]
+        text = " [ " + " , ".join(json.dumps(record) for record in records) + " ]\n"
+
+        parsed = list(sdk.iter_json_array(io.StringIO(text), read_size=7))
+
+        self.assertEqual(parsed, records)
+        self.assertEqual(list(sdk.iter_json_array(io.StringIO("[]"))), [])
+        # Numbers split by a read boundary are not cut short.
+        self.assertEqual(list(sdk.iter_json_array(io.StringIO("[123456, 7]"), read_size=4)), [123456, 7])
+        with self.assertRaises(ValueError):
+            list(sdk.iter_json_array(io.StringIO('{"not": "array"}')))
+        with self.assertRaises(ValueError):
+            list(sdk.iter_json_array(io.StringIO("[1, 2")))
+        for malformed in ("[1, 2,]", "[1 , ]", "[,]"):
+            with self.subTest(payload=malformed), self.assertRaises(ValueError):
+                list(sdk.iter_json_array(io.StringIO(malformed), read_size=2))
+
+    def test_ndjson_payload_yields_records(self):
+        with self._env(b'{"a": 1}\n\n{"a": 2}\n', sdk.CONTENT_TYPE_NDJSON):
+            records = sdk.FaaSSDK().get_event()
+            self.assertNotIsInstance(records, list)
+            self.assertEqual(list(records), [{"a": 1}, {"a": 2}])
+
+    def test_binary_payload_is_memory_mapped(self):
+        data = bytes(range(256)) * 4
+        with self._env(data, sdk.CONTENT_TYPE_BINARY):
+            client = sdk.FaaSSDK()
+            view = client.get_event()
+            self.assertIsInstance(view, memoryview)
+            self.assertEqual(view[:4].tobytes(), b"\x00\x01\x02\x03")
+            self.assertEqual(view.nbytes, len(data))
+            self.assertEqual(client.get_input(), data)
+            view.release()
+
+    def test_runner_passes_content_type_view_to_handler(self):
+        received = []
+        user_module = ModuleType("main")
+        user_module.handler = lambda event, context: received.append(event) or {"ok": True}
+
+        with self._env(b"\x89PNG", sdk.CONTENT_TYPE_BINARY), \
+                patch.dict(os.environ, {"OUTPUT_DIR": self.tmpdir.name}, clear=False), \
+                patch.dict(sys.modules, {"main": user_module}), \
+                patch.object(runner, "sdk", sdk.FaaSSDK()), \
+                redirect_stdout(io.StringIO()):
+            runner.run_user_handler()
+
+        self.assertIsInstance(received[0], memoryview)
+        self.assertEqual(bytes(received[0]), b"\x89PNG")
+
+
+class TestSDKResultChannel(unittest.TestCase):
+    def test_result_is_written_to_result_file_not_stdout(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            result_file = Path(tmpdir) / ".faas_result"
+            stdout = io.StringIO()
+            with patch.dict(os.environ, {"RESULT_FILE": str(result_file)}, clear=False), redirect_stdout(stdout):
+                sdk.FaaSSDK().return_output({"rows": [1, 2]})
+
+            self.assertEqual(json.loads(result_file.read_bytes()), {"rows": [1, 2]})
+        self.assertEqual(stdout.getvalue(), "")
+
+    def test_streamed_result_chunks_are_not_overwritten_by_runner(self):
+        user_module = ModuleType("main")
+
+        def handler(event, context):
+            for i in range(3):
+                sdk.write_output(f"{i}\n")
+
+        user_module.handler = handler
+        with tempfile.TemporaryDirectory() as tmpdir:
+            result_file = Path(tmpdir) / ".faas_result"
+            client = sdk.FaaSSDK()
+            with patch.dict(os.environ, {"OUTPUT_DIR": tmpdir, "RESULT_FILE": str(result_file),
+                                         "PAYLOAD": "{}"}, clear=False), \
+                    patch.dict(sys.modules, {"main": user_module}), \
+                    patch.object(sdk, "_sdk", client), \
+                    redirect_stdout(io.StringIO()):
+                runner.run_user_handler()
+
+            self.assertEqual(result_file.read_text(), "0\n1\n2\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
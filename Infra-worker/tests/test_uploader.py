@@ -0,0 +1,110 @@
+import sys
+from unittest.mock import MagicMock
+
+# Mock dependencies before import
+sys.modules.setdefault("structlog", MagicMock())
+sys.modules.setdefault("boto3", MagicMock())
+sys.modules.setdefault("boto3.s3", MagicMock())
+sys.modules.setdefault("boto3.s3.transfer", MagicMock())
+
+import hashlib
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from uploader import OutputUploader
+
+
+class TestOutputUploader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.source = Path(self.tmpdir.name)
+        self.uploader = OutputUploader("bucket", s3_client=MagicMock())
+        self.uploader.transfer = MagicMock()
+
+    def uploaded_keys(self):
+        return sorted(call.args[2] for call in self.uploader.transfer.upload.call_args_list)
+
+    def test_manifest_skips_empty_files_and_records_hashes(self):
+        (self.source / "images").mkdir()
+        (self.source / "images" / "thumb.png").write_bytes(b"png-bytes")
+        (self.source / "empty.txt").write_bytes(b"")
+
+        manifest = self.uploader.upload_outputs("job-1", str(self.source))
+
+        self.assertEqual(self.uploaded_keys(), ["outputs/job-1/images/thumb.png"])
+        self.assertEqual(len(manifest), 1)
+        entry = manifest[0]
+        self.assertEqual(entry["path"], "images/thumb.png")
+        self.assertEqual(entry["size"], len(b"png-bytes"))
+        self.assertEqual(entry["sha256"], hashlib.sha256(b"png-bytes").hexdigest())
+        self.assertFalse(entry["deduplicated"])
+
+    def test_known_content_is_not_uploaded_again(self):
+        (self.source / "a.txt").write_bytes(b"same")
+        (self.source / "b.txt").write_bytes(b"same")
+        first = self.uploader.upload_outputs("job-1", str(self.source), scope="func-1")
+
+        self.assertEqual(self.uploader.transfer.upload.call_count, 1)
+        self.assertEqual(sorted(entry["path"] for entry in first), ["a.txt", "b.txt"])
+        self.assertEqual(sorted(entry["key"] for entry in first), ["outputs/job-1/a.txt", "outputs/job-1/b.txt"])
+
+        second = self.uploader.upload_outputs("job-2", str(self.source), scope="func-1")
+        self.assertEqual(self.uploader.transfer.upload.call_count, 1)
+        self.assertTrue(all(entry["deduplicated"] for entry in second))
+        # Copied server-side to the job's own keys
+        self.assertEqual(sorted(entry["key"] for entry in second), ["outputs/job-2/a.txt", "outputs/job-2/b.txt"])
+        copied_to = [call.args[2] for call in self.uploader.transfer.copy.call_args_list]
+        self.assertIn("outputs/job-2/a.txt", copied_to)
+        self.assertIn("outputs/job-2/b.txt", copied_to)
+        self.assertTrue(all(entry["copiedFrom"].startswith("outputs/job-1/") for entry in second))
+
+        self.uploader.upload_outputs("job-3", str(self.source), scope="func-2")
+        self.assertEqual(self.uploader.transfer.upload.call_count, 2)
+
+    def test_failed_copy_falls_back_to_upload(self):
+        (self.source / "a.txt").write_bytes(b"same")
+        self.uploader.upload_outputs("job-1", str(self.source), scope="func-1")
+        failed = MagicMock()
+        failed.result.side_effect = RuntimeError("NoSuchKey")
+        self.uploader.transfer.copy.return_value = failed
+
+        manifest = self.uploader.upload_outputs("job-2", str(self.source), scope="func-1")
+
+        self.assertEqual(self.uploaded_keys(), ["outputs/job-1/a.txt", "outputs/job-2/a.txt"])
+        self.assertEqual(manifest[0]["key"], "outputs/job-2/a.txt")
+        self.assertFalse(manifest[0]["deduplicated"])
+
+    def test_failed_upload_is_left_out_of_manifest(self):
+        (self.source / "result.json").write_bytes(b"{}")
+        future = MagicMock()
+        future.result.side_effect = RuntimeError("S3 unavailable")
+        self.uploader.transfer.upload.return_value = future
+
+        self.assertEqual(self.uploader.upload_outputs("job-1", str(self.source)), [])
+        self.assertIsNone(self.uploader._lookup(None, hashlib.sha256(b"{}").hexdigest()))
+
+    def test_stream_upload_hashes_while_reading(self):
+        def consume(reader, _bucket, _key):
+            self.assertFalse(hasattr(reader, "seek"))
+            while reader.read(3):
+                pass
+            return MagicMock()
+
+        self.uploader.transfer.upload.side_effect = consume
+
+        entry = self.uploader.upload_stream("job-1", "data/out.bin", io.BytesIO(b"streamed"), 8)
+
+        self.assertEqual(entry["key"], "outputs/job-1/data/out.bin")
+        self.assertEqual(entry["size"], 8)
+        self.assertEqual(entry["sha256"], hashlib.sha256(b"streamed").hexdigest())
+        self.assertIsNone(self.uploader.upload_stream("job-1", "empty", io.BytesIO(b""), 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from usage_ledger import UsageLedger
+
+
+class TestUsageLedger(unittest.TestCase):
+    def test_overlapping_invocations_split_counter_growth(self):
+        readings = iter([(0, 0), (100, 10), (300, 30), (400, 40)])
+        ledger = UsageLedger(lambda: next(readings))
+
+        ledger.join("a")     # (0, 0)
+        ledger.join("b")     # (100, 10): a alone so far
+        a = ledger.leave("a")  # (300, 30): split between a and b
+        b = ledger.leave("b")  # (400, 40): b alone
+
+        self.assertEqual(a, (200, 20))
+        self.assertEqual(b, (200, 20))
+
+    def test_unknown_invocation_gets_no_usage(self):
+        ledger = UsageLedger(lambda: (5, 5))
+        ledger.join("a")
+        self.assertEqual(ledger.leave("b"), (0, 0))
+        self.assertEqual(ledger.leave("a"), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,52 +1,209 @@
 import boto3
+import hashlib
 import os
-import shutil
+import threading
 import structlog
-from typing import List, Optional
+from collections import OrderedDict
+from boto3.s3.transfer import TransferConfig, create_transfer_manager
+from typing import Dict, List, Optional
+
+import config
 
 logger = structlog.get_logger()
 
 class OutputUploader:
-    def __init__(self, bucket_name: str, region: str = "ap-northeast-2"):
+    """
+    Uploads function outputs to S3 through one shared TransferManager.
+
+    All uploads of the Worker share the manager's thread pool, so many small
+    files are sent concurrently and large files (e.g. spilled logs) switch to
+    multipart above OUTPUT_MULTIPART_THRESHOLD_MB.
+    """
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, bucket_name: str, region: str = "ap-northeast-2", s3_client=None):
         self.bucket = bucket_name
         self.region = region
-        self.s3 = boto3.client('s3', region_name=region)
+        self.s3 = s3_client or boto3.client('s3', region_name=region)
+        self.transfer_config = TransferConfig(
+            multipart_threshold=config.OUTPUT_MULTIPART_THRESHOLD_MB * 1024 * 1024,
+            multipart_chunksize=config.OUTPUT_MULTIPART_CHUNKSIZE_MB * 1024 * 1024,
+            max_concurrency=config.OUTPUT_UPLOAD_CONCURRENCY,
+            use_threads=True
+        )
+        self.transfer = create_transfer_manager(self.s3, self.transfer_config)
 
-    def upload_outputs(self, job_id: str, source_dir: str) -> List[str]:
+        # Content hash -> manifest entry of an object already in S3 (LRU)
+        self._known_objects = OrderedDict()
+        self._known_lock = threading.Lock()
+
+    def upload_outputs(self, job_id: str, source_dir: str, scope: Optional[str] = None) -> List[Dict]:
         """
-        Uploads all files from source_dir to S3 and returns list of URLs.
+        Uploads all non-empty files from source_dir to S3 concurrently.
+
+        Returns a manifest entry per file with its S3 key, URL, size and
+        SHA-256. Every file ends up at outputs/<job_id>/<path>. Files whose
+        content was already uploaded within the same scope (e.g. function)
+        are copied there server-side instead of being sent again; their
+        entry is marked "deduplicated" and names the source in "copiedFrom".
         """
-        uploaded_urls = []
-        
+        manifest = []
+
         if not os.path.exists(source_dir):
             logger.warning("Output directory not found", job_id=job_id, path=source_dir)
-            return uploaded_urls
+            return manifest
+        if not self.bucket:
+            logger.warning("Skipping upload: No bucket configured", job_id=job_id)
+            return manifest
 
+        pending = []
+        # Identical files within this upload are sent once, then copied.
+        duplicates = []
+        pending_hashes = set()
         try:
             # Recursive Upload using os.walk (User UX Enhancement)
             for root, dirs, files in os.walk(source_dir):
                 for filename in files:
                     filepath = os.path.join(root, filename)
-                    
+                    size = os.path.getsize(filepath)
+                    if size == 0:
+                        continue
+
                     # Calculate relative path (e.g. "images/v1/result.png")
                     relative_path = os.path.relpath(filepath, source_dir)
-                    
+
                     # Ensure S3 keys always use forward slashes (Windows protection)
                     safe_relative_path = relative_path.replace(os.path.sep, '/')
-                    
+
                     s3_key = f'outputs/{job_id}/{safe_relative_path}'
-                    
-                    if self.bucket:
-                        # logger.debug("Uploading output file", file=safe_relative_path)
-                        self.s3.upload_file(filepath, self.bucket, s3_key)
-                        
-                        # Public URL Generation
-                        url = f'https://{self.bucket}.s3.{self.region}.amazonaws.com/{s3_key}'
-                        uploaded_urls.append(url)
-                    else:
-                         logger.warning("Skipping upload: No bucket configured", file=filename)
-                    
+                    content_hash = self._sha256(filepath)
+                    entry = self._entry(safe_relative_path, s3_key, size, content_hash)
+
+                    if content_hash in pending_hashes or self._lookup(scope, content_hash):
+                        duplicates.append((filepath, entry))
+                        continue
+                    pending_hashes.add(content_hash)
+
+                    future = self.transfer.upload(filepath, self.bucket, s3_key)
+                    pending.append((future, entry))
+
+            for future, entry in pending:
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error("Failed to upload output file", job_id=job_id, file=entry["path"], error=str(e))
+                    continue
+                self._remember(scope, entry)
+                manifest.append(entry)
+
+            copies = []
+            for filepath, entry in duplicates:
+                known = self._lookup(scope, entry["sha256"])
+                if known:
+                    source = {"Bucket": self.bucket, "Key": known["key"]}
+                    future = self.transfer.copy(source, self.bucket, entry["key"])
+                    copies.append((future, filepath, {**entry, "deduplicated": True, "copiedFrom": known["key"]}))
+                else:
+                    # The first copy failed to upload: send this one itself
+                    copies.append((None, filepath, entry))
+
+            for future, filepath, entry in copies:
+                try:
+                    if future is None:
+                        raise RuntimeError("no uploaded source")
+                    future.result()
+                except Exception as e:
+                    try:
+                        self.transfer.upload(filepath, self.bucket, entry["key"]).result()
+                    except Exception as upload_error:
+                        logger.error("Failed to upload output file", job_id=job_id,
+                                     file=entry["path"], error=str(upload_error))
+                        continue
+                    entry = {**entry, "deduplicated": False}
+                    entry.pop("copiedFrom", None)
+                    self._remember(scope, entry)
+                manifest.append(entry)
+
         except Exception as e:
             logger.error("Failed to upload outputs", job_id=job_id, error=str(e))
-            
-        return uploaded_urls
+
+        return manifest
+
+    def _entry(self, relative_path: str, s3_key: str, size: int, content_hash: str) -> Dict:
+        return {
+            "path": relative_path,
+            "key": s3_key,
+            # Public URL Generation
+            "url": f'https://{self.bucket}.s3.{self.region}.amazonaws.com/{s3_key}',
+            "size": size,
+            "sha256": content_hash,
+            "deduplicated": False
+        }
+
+    def upload_stream(self, job_id: str, relative_path: str, fileobj, size: int,
+                      scope: Optional[str] = None) -> Optional[Dict]:
+        """
+        Uploads one output file from a forward-only stream (e.g. a tar member).
+
+        The stream is read exactly once; the size and SHA-256 are computed on
+        the fly, so content deduplication only applies to later uploads.
+        Returns the manifest entry, or None for empty or failed uploads.
+        """
+        if size == 0:
+            return None
+        if not self.bucket:
+            logger.warning("Skipping upload: No bucket configured", job_id=job_id)
+            return None
+
+        s3_key = f'outputs/{job_id}/{relative_path}'
+        reader = _HashingReader(fileobj)
+        try:
+            self.transfer.upload(reader, self.bucket, s3_key).result()
+        except Exception as e:
+            logger.error("Failed to upload output file", job_id=job_id, file=relative_path, error=str(e))
+            return None
+
+        entry = self._entry(relative_path, s3_key, reader.size, reader.hexdigest())
+        self._remember(scope, entry)
+        return entry
+
+    def _sha256(self, filepath: str) -> str:
+        digest = hashlib.sha256()
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(self.HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _lookup(self, scope: Optional[str], content_hash: str) -> Optional[Dict]:
+        with self._known_lock:
+            entry = self._known_objects.get((scope, content_hash))
+            if entry is not None:
+                self._known_objects.move_to_end((scope, content_hash))
+            return entry
+
+    def _remember(self, scope: Optional[str], entry: Dict):
+        with self._known_lock:
+            self._known_objects[(scope, entry["sha256"])] = entry
+            while len(self._known_objects) > config.OUTPUT_DEDUP_CACHE_SIZE:
+                self._known_objects.popitem(last=False)
+
+
+class _HashingReader:
+    """Non-seekable reader that hashes and counts bytes as they pass through.
+
+    Exposing only read() makes s3transfer use its non-seekable upload path,
+    which buffers one part at a time instead of seeking in the source.
+    """
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, amount: int = -1) -> bytes:
+        data = self._fileobj.read(amount)
+        self._digest.update(data)
+        self.size += len(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
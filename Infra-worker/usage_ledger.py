@@ -0,0 +1,41 @@
+import threading
+from typing import Callable, Hashable, Tuple
+
+
+class UsageLedger:
+    """
+    Splits the resource counters of a shared container between its invocations.
+
+    Each time an invocation joins or leaves, the counters are read and their
+    growth since the previous read is divided equally among the invocations
+    that were running in that interval. An invocation's usage is the sum of
+    its shares, so the usage reported for all invocations adds up to what
+    the container consumed while any of them ran.
+    """
+    def __init__(self, read_counters: Callable[[], Tuple[int, ...]]):
+        self.read_counters = read_counters
+        self._active = {}
+        self._last = None
+        self._lock = threading.Lock()
+
+    def join(self, key: Hashable):
+        with self._lock:
+            self._settle()
+            self._active[key] = None
+
+    def leave(self, key: Hashable) -> Tuple[int, ...]:
+        """Stop attributing to key and return its accumulated usage."""
+        with self._lock:
+            if key not in self._active:
+                return tuple(0 for _ in self._last or ())
+            self._settle()
+            usage = self._active.pop(key)
+        return tuple(int(value) for value in usage or [0] * len(self._last))
+
+    def _settle(self):
+        current = self.read_counters()
+        if self._last is not None and self._active:
+            share = [max(0, now - before) / len(self._active) for now, before in zip(current, self._last)]
+            for key, usage in self._active.items():
+                self._active[key] = share if usage is None else [a + b for a, b in zip(usage, share)]
+        self._last = current
@@ -385,7 +385,7 @@ func main() {
         statusCode: statusCode,
         responseTime: endTime - startTime,
         memoryUsed: result.peakMemoryBytes ? Math.round(result.peakMemoryBytes / 1024 / 1024) + ' MB' : 'N/A',
-        output: result.stdout || result.body || (typeof result === 'string' ? result : JSON.stringify(result, null, 2)),
+        output: result.result ?? result.resultRef?.url ?? (result.stdout || result.body || (typeof result === 'string' ? result : JSON.stringify(result, null, 2))),
         metrics: {
           cpu: 0,
           memory: result.peakMemoryBytes || 0,
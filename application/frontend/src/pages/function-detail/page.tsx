@@ -330,7 +330,7 @@ export default function FunctionDetailPage() {
         status: isSuccess ? 'success' : 'error',
         success: isSuccess,
         statusCode: result.statusCode || (result.exitCode === 0 ? 200 : 500),
-        body: result.stdout || result.body,
+        body: result.result ?? result.resultRef?.url ?? (result.stdout || result.body),
         output: JSON.stringify(result, null, 2),
         executionTime,
         responseTime: result.durationMs || executionTime,